@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+# Tiempo máximo (segundos) que una respuesta cacheada puede servirse sin reconstruirse.
+# Acota la desactualización entre varios procesos/réplicas, que no comparten invalidaciones.
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+# Respuestas cacheadas en total, de todos los tenants (LRU): el tenant llega en un header público
+CATALOG_CACHE_MAX_ENTRIES = int(os.getenv("CATALOG_CACHE_MAX_ENTRIES", "1024"))
+# Tokens de sesión ya verificados que se recuerdan por proceso (LRU)
+AUTH_TOKEN_CACHE_MAX = int(os.getenv("AUTH_TOKEN_CACHE_MAX", "1024"))
+
+
+class CatalogCache:
+    """
+    Caché en proceso de respuestas del catálogo (menú, opciones, configuración) ya serializadas a JSON.
+
+    Cada tenant tiene un contador de versión que las rutas de escritura incrementan con `invalidate()`.
+    Las entradas guardan la versión con la que se construyeron, así una lectura que terminó después
+    de una escritura nunca vuelve a servirse. Cada entrada lleva además un ETag fuerte calculado una
+    sola vez sobre el cuerpo, válido entre procesos (el contador de versión es local a cada uno).
+    Todas las entradas comparten un solo LRU por (tenant, clave) con tope total; solo las escrituras
+    (autenticadas) crean contadores de versión, así un tenant inventado no deja nada en memoria.
+    """
+
+    def __init__(self, ttl: float = CATALOG_CACHE_TTL, max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._versions = {}       # tenant_id -> int (solo tenants con alguna escritura)
+        self._entries = OrderedDict()  # (tenant_id, key) -> (version, expires_at, body, etag)
+
+    def version(self, tenant_id: str) -> int:
+        with self._lock:
+            return self._versions.get(tenant_id, 0)
+
+    def invalidate(self, tenant_id: str):
+        with self._lock:
+            self._versions[tenant_id] = self._versions.get(tenant_id, 0) + 1
+            for clave in [c for c in self._entries if c[0] == tenant_id]:
+                del self._entries[clave]
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+    def get(self, tenant_id: str, key: Hashable) -> Optional[Tuple[bytes, str]]:
+        clave = (tenant_id, key)
+        with self._lock:
+            entry = self._entries.get(clave)
+            if entry is None:
+                return None
+            version, expires_at, body, etag = entry
+            if version != self._versions.get(tenant_id, 0) or expires_at < time.monotonic():
+                del self._entries[clave]
+                return None
+            self._entries.move_to_end(clave)
+            return body, etag
+
+    def set(self, tenant_id: str, key: Hashable, body: bytes, version: int) -> str:
+        etag = self.make_etag(body)
+        clave = (tenant_id, key)
+        with self._lock:
+            if version != self._versions.get(tenant_id, 0):
+                return etag  # Hubo una escritura mientras se construía: no guardar
+            self._entries[clave] = (version, time.monotonic() + self.ttl, body, etag)
+            self._entries.move_to_end(clave)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag
+
+    def get_or_build(self, tenant_id: str, key: Hashable, builder: Callable[[], bytes]) -> Tuple[bytes, str]:
+        cached = self.get(tenant_id, key)
+        if cached is not None:
+            return cached
+        version = self.version(tenant_id)
+        body = builder()
+        return body, self.set(tenant_id, key, body, version)
+
+
+class AuthCache:
+    """
+    Caché en proceso de la autenticación del panel, para que validar una petición sea una búsqueda en dict.
+
+    - Tokens JWT ya verificados -> (tenant, scope, exp), en un LRU acotado. Una entrada deja de servir
+      al vencer el token; los tokens inválidos no se guardan (siempre pasan por jwt.decode).
+    - Hash de la contraseña de admin por tenant, ligado a la versión del tenant en la caché del catálogo:
+      las escrituras de configuración ya llaman `catalog_cache.invalidate()`, y el TTL acota cuánto
+      tarda en verse un cambio hecho por otro proceso.
+    """
+
+    def __init__(self, catalog: CatalogCache, max_tokens: int = AUTH_TOKEN_CACHE_MAX, ttl: float = CATALOG_CACHE_TTL):
+        self.catalog = catalog
+        self.max_tokens = max_tokens
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tokens = OrderedDict()  # token -> (tenant_id, scope, exp)
+        self._hashes = {}             # tenant_id -> (version, expires_at, hash)
+
+    def get_token(self, token: str) -> Optional[Tuple[str, Optional[str]]]:
+        with self._lock:
+            entry = self._tokens.get(token)
+            if entry is None:
+                return None
+            tenant_id, scope, exp = entry
+            if exp is not None and exp <= time.time():
+                del self._tokens[token]
+                return None
+            self._tokens.move_to_end(token)
+            return tenant_id, scope
+
+    def set_token(self, token: str, tenant_id: str, scope: Optional[str], exp: Optional[float]):
+        with self._lock:
+            self._tokens[token] = (tenant_id, scope, exp)
+            self._tokens.move_to_end(token)
+            while len(self._tokens) > self.max_tokens:
+                self._tokens.popitem(last=False)
+
+    def get_admin_hash(self, tenant_id: str) -> Optional[str]:
+        version = self.catalog.version(tenant_id)
+        with self._lock:
+            entry = self._hashes.get(tenant_id)
+            if entry is None or entry[0] != version or entry[1] < time.monotonic():
+                return None
+            return entry[2]
+
+    def set_admin_hash(self, tenant_id: str, password_hash: str, version: int):
+        if version != self.catalog.version(tenant_id):
+            return  # Cambió la configuración mientras se leía
+        with self._lock:
+            self._hashes[tenant_id] = (version, time.monotonic() + self.ttl, password_hash)
+
+
+catalog_cache = CatalogCache()
+auth_cache = AuthCache(catalog_cache)
@@ -1,6 +1,12 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, desc, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import or_, desc, func, text, insert, select, tuple_, update
+from pydantic import ValidationError
 import models, schemas
+from cache import auth_cache, catalog_cache
+from events import order_events
+from shortlinks import shortlink_resolver
 import secrets
 import string
 import hashlib
@@ -20,32 +26,32 @@ def _reset_sequence(db: Session, table_name: str):
             db.rollback()
             print(f"⚠️ Error reseteando secuencia {table_name}: {e}")
 
-def _generar_codigo_unico(db: Session, tenant_id: str, length=6):
+# Intentos de INSERT con un código nuevo antes de rendirse. Con 36^6 códigos por tenant un choque ya es
+# improbable; varios seguidos indican otro problema de integridad.
+CODIGO_INTENTOS = 5
+
+def _codigo_aleatorio(length=6):
     alphabet = string.ascii_uppercase + string.digits
-    while True:
-        codigo = ''.join(secrets.choice(alphabet) for _ in range(length))
-        exists = db.query(models.Orden).filter(
-            models.Orden.tenant_id == tenant_id,
-            models.Orden.codigo_seguimiento == codigo
-        ).first()
-        if not exists:
-            return codigo
+    return ''.join(secrets.choice(alphabet) for _ in range(length))
 
 def hash_password(password: str):
     return hashlib.sha256(password.encode()).hexdigest()
 
 # --- MENU ---
-def get_menu(db: Session, tenant_id: str, solo_activos: bool = True, search_term: str = None):
-    query = db.query(models.Menu).filter(models.Menu.tenant_id == tenant_id)
+def _select_menu(tenant_id: str, solo_activos: bool = True, search_term: str = None):
+    query = select(models.Menu).where(models.Menu.tenant_id == tenant_id)
     
     if solo_activos:
-        query = query.filter(models.Menu.is_active == 1)
+        query = query.where(models.Menu.is_active == 1)
         
     if search_term:
         term = f"%{search_term}%"
-        query = query.filter(or_(models.Menu.nombre.like(term), models.Menu.descripcion.like(term)))
+        query = query.where(or_(models.Menu.nombre.like(term), models.Menu.descripcion.like(term)))
         
-    return query.order_by(models.Menu.id).all()
+    return query.order_by(models.Menu.id)
+
+def get_menu(db: Session, tenant_id: str, solo_activos: bool = True, search_term: str = None):
+    return db.execute(_select_menu(tenant_id, solo_activos, search_term)).scalars().all()
 
 def create_platillo(db: Session, tenant_id: str, platillo: schemas.MenuCreate):
     # Isolated Upsert: Solo actualizamos si el ID existe PARA ESTE TENANT
@@ -76,6 +82,7 @@ def create_platillo(db: Session, tenant_id: str, platillo: schemas.MenuCreate):
     except Exception as e:
         db.rollback()
         raise e
+    catalog_cache.invalidate(tenant_id)
     return db_platillo
 
 def update_platillo(db: Session, tenant_id: str, platillo_id: int, platillo: schemas.MenuCreate):
@@ -92,6 +99,7 @@ def update_platillo(db: Session, tenant_id: str, platillo_id: int, platillo: sch
         
         db.commit()
         db.refresh(db_platillo)
+        catalog_cache.invalidate(tenant_id)
     return db_platillo
 
 def delete_platillo(db: Session, tenant_id: str, platillo_id: int):
@@ -102,6 +110,7 @@ def delete_platillo(db: Session, tenant_id: str, platillo_id: int):
     if db_platillo:
         db.delete(db_platillo)
         db.commit()
+        catalog_cache.invalidate(tenant_id)
         return True
     return False
 
@@ -113,12 +122,14 @@ def toggle_platillo_visibility(db: Session, tenant_id: str, platillo_id: int, is
     if db_platillo:
         db_platillo.is_active = is_active
         db.commit()
+        catalog_cache.invalidate(tenant_id)
         return True
     return False
 
 def update_all_platillos_visibility(db: Session, tenant_id: str, is_active: int):
     db.query(models.Menu).filter(models.Menu.tenant_id == tenant_id).update({models.Menu.is_active: is_active})
     db.commit()
+    catalog_cache.invalidate(tenant_id)
     return True
 
 # --- GRUPOS DE OPCIONES ---
@@ -152,6 +163,7 @@ def create_grupo_opciones(db: Session, tenant_id: str, grupo: schemas.GrupoOpcio
     except Exception as e:
         db.rollback()
         raise e
+    catalog_cache.invalidate(tenant_id)
     return db_grupo
 
 def update_grupo_opciones(db: Session, tenant_id: str, grupo_id: int, grupo: schemas.GrupoOpcionesCreate):
@@ -170,6 +182,7 @@ def update_grupo_opciones(db: Session, tenant_id: str, grupo_id: int, grupo: sch
         
         db.commit()
         db.refresh(db_grupo)
+        catalog_cache.invalidate(tenant_id)
     return db_grupo
 
 def delete_grupo_opciones(db: Session, tenant_id: str, grupo_id: int):
@@ -180,10 +193,111 @@ def delete_grupo_opciones(db: Session, tenant_id: str, grupo_id: int):
     if db_grupo:
         db.delete(db_grupo)
         db.commit()
+        catalog_cache.invalidate(tenant_id)
         return True
     return False
 
+# --- IMPORTACIÓN MASIVA (UPSERT EN LOTE) ---
+def _insert_dialecto(db: Session, model):
+    """INSERT con soporte ON CONFLICT según el motor; None si el motor no lo tiene."""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert(model)
+
+def _bulk_upsert(db: Session, tenant_id: str, model, schema, filas, table_name: str):
+    """
+    Aplica una lista de altas/actualizaciones con la misma semántica que el POST individual
+    (upsert por id dentro del tenant; si el id es de otro tenant se asigna uno nuevo), pero en una
+    sola transacción: dos SELECT para resolver ids, un INSERT ... ON CONFLICT por grupo de columnas
+    enviadas y un INSERT multi-fila para las altas sin id. Devuelve un reporte por fila.
+    """
+    reporte = [{"indice": i, "id": None, "estado": "error", "detalle": None} for i in range(len(filas))]
+
+    validas = []  # (indice, objeto schema)
+    for i, fila in enumerate(filas):
+        try:
+            validas.append((i, schema(**fila)))
+        except ValidationError as e:
+            reporte[i]["detalle"] = "; ".join(
+                f"{'.'.join(str(l) for l in err['loc'])}: {err['msg']}" for err in e.errors()
+            )
+
+    ids_pedidos = {obj.id for _, obj in validas if obj.id is not None}
+    propios, ajenos = set(), set()
+    if ids_pedidos:
+        for row_id, row_tenant in db.query(model.id, model.tenant_id).filter(model.id.in_(ids_pedidos)):
+            (propios if row_tenant == tenant_id else ajenos).add(row_id)
+
+    # Último gana: si un id viene repetido en el lote, las filas anteriores se omiten
+    ultima_por_id = {obj.id: i for i, obj in validas if obj.id is not None and obj.id not in ajenos}
+    con_id, sin_id = [], []
+    for i, obj in validas:
+        if obj.id in ajenos:
+            obj.id = None  # Colisión con otro tenant: la DB asigna el siguiente libre
+        if obj.id is None:
+            sin_id.append((i, obj))
+        elif ultima_por_id[obj.id] != i:
+            reporte[i].update(id=obj.id, estado="omitido", detalle="id repetido en el lote")
+        else:
+            con_id.append((i, obj))
+
+    stmt_base = _insert_dialecto(db, model)
+    try:
+        # 1. Filas con id: upsert agrupado por las columnas enviadas (como exclude_unset del PUT)
+        grupos = {}
+        for i, obj in con_id:
+            columnas = frozenset(obj.dict(exclude_unset=True)) - {"id", "tenant_id"}
+            grupos.setdefault(columnas, []).append((i, obj))
+        for columnas, miembros in grupos.items():
+            valores = [{**obj.dict(), "tenant_id": tenant_id} for _, obj in miembros]
+            if stmt_base is None:
+                for v in valores:
+                    db.merge(model(**v))
+            else:
+                stmt = stmt_base.on_conflict_do_update(
+                    index_elements=[model.id],
+                    set_={c: getattr(stmt_base.excluded, c) for c in columnas},
+                    where=(model.tenant_id == tenant_id)
+                )
+                db.execute(stmt, valores)
+            for i, obj in miembros:
+                reporte[i].update(id=obj.id, estado="actualizado" if obj.id in propios else "creado")
+
+        # 2. Filas sin id: una sola sentencia, ids devueltos en el orden de envío
+        if sin_id:
+            valores = [{**obj.dict(exclude={"id"}), "tenant_id": tenant_id} for _, obj in sin_id]
+            nuevos = db.execute(
+                insert(model).returning(model.id, sort_by_parameter_order=True), valores
+            ).scalars().all()
+            for (i, _), nuevo_id in zip(sin_id, nuevos):
+                reporte[i].update(id=nuevo_id, estado="creado")
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if any(obj.id not in propios for _, obj in con_id):
+        _reset_sequence(db, table_name)
+    if con_id or sin_id:
+        catalog_cache.invalidate(tenant_id)
+    return reporte
+
+def bulk_upsert_platillos(db: Session, tenant_id: str, filas):
+    return _bulk_upsert(db, tenant_id, models.Menu, schemas.MenuCreate, filas, "menu")
+
+def bulk_upsert_grupos_opciones(db: Session, tenant_id: str, filas):
+    return _bulk_upsert(db, tenant_id, models.GrupoOpciones, schemas.GrupoOpcionesCreate, filas, "grupos_opciones")
+
 # --- CONFIGURACION ---
+def _admin_password_default():
+    return hash_password(os.getenv("DEFAULT_ADMIN_PASSWORD", "zz"))
+
 def get_configuracion(db: Session, tenant_id: str):
     config = db.query(models.Configuracion).filter(models.Configuracion.tenant_id == tenant_id).first()
     if not config:
@@ -191,7 +305,7 @@ def get_configuracion(db: Session, tenant_id: str):
             tenant_id=tenant_id,
             horario="Lunes a Viernes 9-10", 
             codigos_postales="12345",
-            admin_password=hash_password(os.getenv("DEFAULT_ADMIN_PASSWORD", "zz")),
+            admin_password=_admin_password_default(),
             costo_envio=20.0,
             metodos_pago_activos='{"efectivo": true, "terminal": true}',
             tipos_tarjeta='["Visa", "Mastercard"]',
@@ -213,6 +327,7 @@ def update_configuracion(db: Session, tenant_id: str, config: schemas.Configurac
     
     db.commit()
     db.refresh(db_config)
+    catalog_cache.invalidate(tenant_id)
     return db_config
 
 def verify_admin_password(db: Session, tenant_id: str, password: str):
@@ -221,15 +336,33 @@ def verify_admin_password(db: Session, tenant_id: str, password: str):
     if master_key and password == master_key:
         return True
         
-    config = get_configuracion(db, tenant_id)
-    if config.admin_password:
-        return config.admin_password == hash_password(password)
+    password_hash = get_admin_password_hash(db, tenant_id)
+    if password_hash:
+        return password_hash == hash_password(password)
     return False
 
+def get_admin_password_hash(db: Session, tenant_id: str):
+    """
+    Hash de la contraseña de admin del tenant, cacheado por proceso. Solo lee: si el tenant aún no tiene
+    configuración devuelve el hash por defecto que tendría su fila, sin crearla ni cachearlo (el tenant
+    llega en un header del login público: uno inventado no debe quedar en memoria).
+    """
+    cached = auth_cache.get_admin_hash(tenant_id)
+    if cached is not None:
+        return cached
+    version = catalog_cache.version(tenant_id)
+    fila = db.query(models.Configuracion.admin_password).filter(models.Configuracion.tenant_id == tenant_id).first()
+    if not fila:
+        return _admin_password_default()
+    password_hash = fila.admin_password or ""
+    auth_cache.set_admin_hash(tenant_id, password_hash, version)
+    return password_hash
+
 def change_admin_password(db: Session, tenant_id: str, new_password: str):
     config = get_configuracion(db, tenant_id)
     config.admin_password = hash_password(new_password)
     db.commit()
+    catalog_cache.invalidate(tenant_id)
     return True
 
 # --- SHORT LINKS (Redireccionamiento) ---
@@ -257,11 +390,13 @@ def create_short_link(db: Session, tenant_id: str, link: schemas.ShortLinkCreate
     db.add(db_link)
     db.commit()
     db.refresh(db_link)
+    shortlink_resolver.set(tenant_id, db_link.short_code, db_link.id, db_link.destination_url)
     return db_link
 
 def update_short_link(db: Session, tenant_id: str, link_id: int, link: schemas.ShortLinkCreate):
     db_link = db.query(models.ShortLink).filter(models.ShortLink.id == link_id).first()
     if db_link:
+        codigo_anterior = db_link.short_code
         update_data = link.dict(exclude_unset=True)
         for key, value in update_data.items():
             if key != "tenant_id":
@@ -269,6 +404,8 @@ def update_short_link(db: Session, tenant_id: str, link_id: int, link: schemas.S
         db_link.tenant_id = tenant_id
         db.commit()
         db.refresh(db_link)
+        shortlink_resolver.invalidate(tenant_id, codigo_anterior)
+        shortlink_resolver.set(tenant_id, db_link.short_code, db_link.id, db_link.destination_url)
     return db_link
 
 def delete_short_link(db: Session, tenant_id: str, link_id: int):
@@ -277,16 +414,107 @@ def delete_short_link(db: Session, tenant_id: str, link_id: int):
         models.ShortLink.tenant_id == tenant_id
     ).first()
     if db_link:
+        codigo = db_link.short_code
         db.delete(db_link)
         db.commit()
+        shortlink_resolver.invalidate(tenant_id, codigo)
         return True
     return False
 
+# Formato de cada periodo de las estadísticas por motor: (SQLite strftime, PostgreSQL date_trunc + to_char)
+PERIODOS_CLICS = {
+    "hora": ("%Y-%m-%d %H:00", "hour", "YYYY-MM-DD HH24:00"),
+    "dia": ("%Y-%m-%d", "day", "YYYY-MM-DD"),
+}
+REFERRERS_TOP = 10
+
+def _periodo_fecha(db: Session, columna, intervalo: str):
+    formato_sqlite, unidad, formato_pg = PERIODOS_CLICS[intervalo]
+    if db.bind.dialect.name == "sqlite":
+        return func.strftime(formato_sqlite, columna)
+    return func.to_char(func.date_trunc(unidad, columna), formato_pg)
+
+def get_short_link_stats(db: Session, tenant_id: str, link_id: int, intervalo: str, desde):
+    """
+    Clics del enlace desde `desde`, agrupados por periodo y tipo de dispositivo, más los referrers más
+    frecuentes. Dos consultas agregadas sobre (tenant_id, link_id, fecha); None si el enlace no es del tenant.
+    No incluye los clics que siguen en memoria (a lo más SHORTLINK_FLUSH_SECONDS de retraso).
+    """
+    link = db.execute(
+        select(models.ShortLink.short_code, models.ShortLink.clicks).where(
+            models.ShortLink.id == link_id, models.ShortLink.tenant_id == tenant_id
+        )
+    ).first()
+    if link is None:
+        return None
+
+    clics = models.ShortLinkClick
+    filtro = (clics.tenant_id == tenant_id, clics.link_id == link_id, clics.fecha >= desde)
+    periodo = _periodo_fecha(db, clics.fecha, intervalo).label("periodo")
+    periodos = {}
+    for inicio, agente, n in db.execute(
+        select(periodo, clics.agente, func.count()).where(*filtro).group_by(periodo, clics.agente).order_by(periodo)
+    ):
+        actual = periodos.setdefault(inicio, {"inicio": inicio, "clics": 0, "por_agente": {}})
+        actual["clics"] += n
+        actual["por_agente"][agente] = n
+
+    total = func.count().label("total")
+    referrers = db.execute(
+        select(clics.referrer, total).where(*filtro).group_by(clics.referrer).order_by(desc(total)).limit(REFERRERS_TOP)
+    ).all()
+
+    return schemas.ShortLinkStats(
+        link_id=link_id,
+        short_code=link.short_code,
+        clicks=link.clicks or 0,
+        intervalo=intervalo,
+        desde=desde,
+        periodos=list(periodos.values()),
+        referrers=[{"referrer": referrer, "clics": n} for referrer, n in referrers]
+    )
+
 # --- PEDIDOS ---
-def create_pedido(db: Session, tenant_id: str, orden: schemas.OrdenCreate):
-    codigo = _generar_codigo_unico(db, tenant_id)
-    
-    db_orden = models.Orden(
+def _nombre_base(producto: str) -> str:
+    return producto.split("(")[0].strip().lower()
+
+def _select_platillos_de_items(tenant_id: str, items):
+    """
+    Platillos de las líneas del pedido, en una sola consulta al menú (None si no hay nada que buscar).
+    Se busca por menu_id; los clientes que no lo mandan se resuelven por el nombre base
+    ("Tacos (Sin cebolla)" -> "Tacos").
+    """
+    ids = {i.menu_id for i in items if i.menu_id is not None}
+    nombres = {_nombre_base(i.producto) for i in items if i.menu_id is None}
+    condiciones = []
+    if ids:
+        condiciones.append(models.Menu.id.in_(ids))
+    if nombres:
+        condiciones.append(func.lower(func.trim(models.Menu.nombre)).in_(nombres))
+    if not condiciones:
+        return None
+    return select(models.Menu.id, models.Menu.nombre, models.Menu.printer_target).where(
+        models.Menu.tenant_id == tenant_id, or_(*condiciones)
+    )
+
+def _resolver_platillos(items, filas):
+    """(menu_id, printer_target) de cada línea a partir de las filas de _select_platillos_de_items."""
+    por_id, por_nombre = {}, {}
+    for menu_id, nombre, destino in filas:
+        por_id[menu_id] = (menu_id, destino or "cocina")
+        por_nombre.setdefault((nombre or "").strip().lower(), (menu_id, destino or "cocina"))
+
+    resultado = []
+    for i in items:
+        if i.menu_id is not None:
+            resultado.append(por_id.get(i.menu_id, (None, "cocina")))
+        else:
+            resultado.append(por_nombre.get(_nombre_base(i.producto), (None, "cocina")))
+    return resultado
+
+def _insert_orden(tenant_id: str, orden: schemas.OrdenCreate, codigo: str):
+    # RETURNING: el id y la fecha (server_default) vuelven en el mismo viaje, sin flush ni refresh
+    return insert(models.Orden.__table__).values(
         tenant_id=tenant_id,
         nombre_cliente=orden.nombre_cliente,
         telefono=orden.telefono,
@@ -297,52 +525,156 @@ def create_pedido(db: Session, tenant_id: str, orden: schemas.OrdenCreate):
         paga_con=orden.paga_con,
         codigo_seguimiento=codigo,
         estado="Nuevo"
+    ).returning(models.Orden.__table__.c.id, models.Orden.__table__.c.fecha)
+
+# Un solo INSERT con todas las líneas (insertmanyvalues). Los ids salen del mismo contador en el orden de
+# VALUES, pero RETURNING no garantiza el orden de las filas: quien lo usa los ordena antes de emparejarlos.
+# (sort_by_parameter_order=True lo garantizaría, a costa de un INSERT por línea en SQLite.)
+_insert_detalles = insert(models.OrdenDetalle.__table__).returning(models.OrdenDetalle.__table__.c.id)
+
+def _filas_detalle(tenant_id: str, orden_id: int, orden: schemas.OrdenCreate, platillos):
+    """Parámetros de cada línea del pedido, con el platillo que le resolvió _resolver_platillos."""
+    return [
+        {
+            "tenant_id": tenant_id,
+            "orden_id": orden_id,
+            "producto": item.producto,
+            "cantidad": item.cantidad,
+            "precio_unitario": item.precio_unitario,
+            "menu_id": menu_id,
+            "printer_target": printer_target,
+            "opciones": item.opciones or "[]"
+        }
+        for item, (menu_id, printer_target) in zip(orden.items, platillos)
+    ]
+
+def _insert_historial_inicial(tenant_id: str, orden_id: int, fecha):
+    # Misma fecha que la orden: el "Nuevo" del historial es el momento de la creación
+    return insert(models.HistorialEstado.__table__).values(
+        tenant_id=tenant_id, orden_id=orden_id, nuevo_estado="Nuevo", fecha=fecha
     )
-    db.add(db_orden)
-    db.flush()
-    
-    for item in orden.items:
-        db_detalle = models.OrdenDetalle(
-            tenant_id=tenant_id,
-            orden_id=db_orden.id,
-            producto=item.producto,
-            cantidad=item.cantidad,
-            precio_unitario=item.precio_unitario
-        )
-        db.add(db_detalle)
-        
-    db_historial = models.HistorialEstado(
+
+def _pedido_creado(tenant_id: str, orden: schemas.OrdenCreate, orden_id: int, fecha, codigo: str, detalles, detalle_ids):
+    """La respuesta de create_pedido armada con lo que ya está en memoria, sin releer la orden."""
+    return schemas.Orden(
+        **orden.model_dump(exclude={"items", "tenant_id"}),
         tenant_id=tenant_id,
-        orden_id=db_orden.id, 
-        nuevo_estado="Nuevo"
+        id=orden_id,
+        fecha=fecha,
+        estado="Nuevo",
+        codigo_seguimiento=codigo,
+        detalles=[schemas.OrdenDetalle(id=i, **d) for i, d in zip(detalle_ids, detalles)],
+        historial=[schemas.HistorialEstado(tenant_id=tenant_id, nuevo_estado="Nuevo", fecha=fecha)]
     )
-    db.add(db_historial)
-    
+
+def _publicar_pedido_creado(tenant_id: str, pedido: schemas.Orden):
+    # El evento lleva el pedido completo (con el destino de cada línea): el panel lo muestra e
+    # imprime sin volver a pedirlo.
+    evento = pedido.model_dump(mode="json")
+    evento["orden_id"] = pedido.id
+    order_events.publish(tenant_id, "pedido_creado", evento)
+
+def create_pedido(db: Session, tenant_id: str, orden: schemas.OrdenCreate):
+    """
+    Crea el pedido con un INSERT por tabla (orden, todas sus líneas, historial) y devuelve un
+    schemas.Orden armado en memoria: no hay flush por objeto ni refresh/lazy loads al serializar.
+    """
+    consulta = _select_platillos_de_items(tenant_id, orden.items)
+    filas = db.execute(consulta).all() if consulta is not None else []
+    platillos = _resolver_platillos(orden.items, filas)
+
+    # Sin SELECT previo del código: el índice único (tenant_id, codigo_seguimiento) decide. La orden es la
+    # primera escritura de la transacción, así que ante un choque se descarta entera y se reintenta.
+    for intento in range(CODIGO_INTENTOS):
+        codigo = _codigo_aleatorio()
+        try:
+            orden_id, fecha = db.execute(_insert_orden(tenant_id, orden, codigo)).one()
+            break
+        except IntegrityError:
+            db.rollback()
+            if intento == CODIGO_INTENTOS - 1:
+                raise
+
+    detalles = _filas_detalle(tenant_id, orden_id, orden, platillos)
+    detalle_ids = sorted(db.execute(_insert_detalles, detalles).scalars()) if detalles else []
+    db.execute(_insert_historial_inicial(tenant_id, orden_id, fecha))
     db.commit()
-    db.refresh(db_orden)
-    return db_orden
 
-def get_pedido_by_tracking(db: Session, tenant_id: str, telefono: str, codigo: str):
-    return db.query(models.Orden).options(
+    pedido = _pedido_creado(tenant_id, orden, orden_id, fecha, codigo, detalles, detalle_ids)
+    _publicar_pedido_creado(tenant_id, pedido)
+    return pedido
+
+def _select_pedido_tracking(tenant_id: str, telefono: str, codigo: str):
+    return select(models.Orden).options(
         joinedload(models.Orden.detalles),
         joinedload(models.Orden.historial)
-    ).filter(
+    ).where(
         models.Orden.tenant_id == tenant_id,
         models.Orden.telefono == telefono, 
         models.Orden.codigo_seguimiento == codigo
-    ).first()
+    )
 
-def get_pedidos(db: Session, tenant_id: str, skip: int = 0, limit: int = 100, search_term: str = None):
-    query = db.query(models.Orden).options(
-        joinedload(models.Orden.detalles),
-        joinedload(models.Orden.historial)
-    ).filter(models.Orden.tenant_id == tenant_id).order_by(desc(models.Orden.fecha))
-    
+def get_pedido_by_tracking(db: Session, tenant_id: str, telefono: str, codigo: str):
+    return db.execute(_select_pedido_tracking(tenant_id, telefono, codigo)).unique().scalars().first()
+
+def _filtrar_pedidos(query, tenant_id: str, search_term: str = None):
+    query = query.filter(models.Orden.tenant_id == tenant_id)
     if search_term:
         term = f"%{search_term}%"
         query = query.filter(or_(models.Orden.nombre_cliente.like(term), models.Orden.codigo_seguimiento.like(term)))
-        
-    return query.offset(skip).limit(limit).all()
+    return query
+
+def _select_count_pedidos(tenant_id: str, search_term: str = None):
+    return _filtrar_pedidos(select(func.count(models.Orden.id)), tenant_id, search_term)
+
+def count_pedidos(db: Session, tenant_id: str, search_term: str = None):
+    """Total de pedidos del tenant con un solo SELECT COUNT(*), sin cargar filas."""
+    return db.execute(_select_count_pedidos(tenant_id, search_term)).scalar() or 0
+
+def _select_pedidos(tenant_id: str, skip: int = 0, limit: int = 100, search_term: str = None, before_id: int = None):
+    query = select(models.Orden).options(
+        joinedload(models.Orden.detalles),
+        joinedload(models.Orden.historial)
+    )
+    query = _filtrar_pedidos(query, tenant_id, search_term)
+
+    if before_id is not None:
+        # Paginación keyset sobre (fecha, id): la fecha del cursor se resuelve en la propia DB
+        # para comparar columna contra columna (evita desfases de formato en SQLite).
+        fecha_cursor = select(models.Orden.fecha).where(
+            models.Orden.id == before_id,
+            models.Orden.tenant_id == tenant_id
+        ).scalar_subquery()
+        # Comparación de tupla: el índice (tenant_id, fecha, id) la resuelve como un rango
+        query = query.where(tuple_(models.Orden.fecha, models.Orden.id) < tuple_(fecha_cursor, before_id))
+    elif skip:
+        query = query.offset(skip)
+
+    return query.order_by(desc(models.Orden.fecha), desc(models.Orden.id)).limit(limit)
+
+def get_pedidos(db: Session, tenant_id: str, skip: int = 0, limit: int = 100, search_term: str = None, before_id: int = None):
+    return db.execute(_select_pedidos(tenant_id, skip, limit, search_term, before_id)).unique().scalars().all()
+
+EXPORT_COLUMNAS = [
+    "Orden ID", "Código", "Fecha", "Cliente", "Teléfono", "Dirección", "Referencias",
+    "Estado", "Método Pago", "Paga Con", "Total Orden", "Motivo Cancelación",
+    "Producto", "Cantidad", "Precio Unitario", "Subtotal Producto", "Área"
+]
+
+def iter_filas_exportacion(db: Session, tenant_id: str, search_term: str = None, chunk_size: int = 500):
+    """Genera filas planas (una por producto) leyendo con cursor del lado del servidor en bloques."""
+    O, D = models.Orden, models.OrdenDetalle
+    query = db.query(
+        O.id, O.codigo_seguimiento, O.fecha, O.nombre_cliente, O.telefono, O.direccion, O.referencias,
+        O.estado, O.metodo_pago, O.paga_con, O.total, O.motivo_cancelacion,
+        D.producto, D.cantidad, D.precio_unitario, D.printer_target
+    ).join(D, D.orden_id == O.id)
+    query = _filtrar_pedidos(query, tenant_id, search_term)
+    query = query.order_by(desc(O.fecha), desc(O.id), D.id).yield_per(chunk_size)
+
+    for row in query:
+        cantidad, precio = row.cantidad or 0, row.precio_unitario or 0.0
+        yield (*row[:-1], cantidad * precio, row.printer_target)
 
 def update_estado_pedido(db: Session, tenant_id: str, orden_id: int, nuevo_estado: str, motivo: str = None):
     orden = db.query(models.Orden).filter(
@@ -364,10 +696,87 @@ def update_estado_pedido(db: Session, tenant_id: str, orden_id: int, nuevo_estad
         nuevo_estado=nuevo_estado
     )
     db.add(historial)
+    # Se toma antes del commit, que expira los atributos de la orden
+    evento = {
+        "orden_id": orden.id,
+        "codigo_seguimiento": orden.codigo_seguimiento,
+        "telefono": orden.telefono,
+        "nuevo_estado": nuevo_estado,
+        "motivo_cancelacion": orden.motivo_cancelacion,
+        "total": orden.total,
+    }
     
     db.commit()
+    evento["fecha"] = historial.fecha.isoformat() if historial.fecha else None
+    order_events.publish(tenant_id, "estado_actualizado", evento)
     return True
 
+# Flujo de un pedido: solo se avanza. "Cancelado" sale de cualquier estado que aún no termina.
+FLUJO_ESTADOS = ["Nuevo", "Pendiente", "Preparando", "En Camino", "Entregado"]
+ESTADOS_FINALES = {"Entregado", "Cancelado"}
+
+def estados_previos(nuevo_estado: str):
+    """Estados desde los que se puede pasar a `nuevo_estado` en un cambio por lote (None si no es un destino válido)."""
+    if nuevo_estado == "Cancelado":
+        return [e for e in FLUJO_ESTADOS if e not in ESTADOS_FINALES]
+    if nuevo_estado not in FLUJO_ESTADOS or nuevo_estado == FLUJO_ESTADOS[0]:
+        return None
+    return FLUJO_ESTADOS[:FLUJO_ESTADOS.index(nuevo_estado)]
+
+def update_estado_pedidos(db: Session, tenant_id: str, ids, nuevo_estado: str, motivo: str = None):
+    """
+    Mueve varios pedidos a `nuevo_estado` en una transacción: un UPDATE ... WHERE id IN (...) que además
+    filtra por los estados previos válidos (la validación va en la misma sentencia) y un INSERT con el
+    historial de todos. Devuelve (ids_actualizados, ids_rechazados).
+    """
+    previos = estados_previos(nuevo_estado)
+    ids = list(dict.fromkeys(ids))
+    if previos is None:
+        raise ValueError(f"Estado destino no válido: {nuevo_estado}")
+    if not ids:
+        return [], []
+
+    valores = {"estado": nuevo_estado}
+    if nuevo_estado == "Cancelado":
+        valores["total"] = 0.0
+        valores["motivo_cancelacion"] = motivo
+
+    tabla = models.Orden.__table__
+    actualizadas = db.execute(
+        update(tabla).where(
+            tabla.c.tenant_id == tenant_id,
+            tabla.c.id.in_(ids),
+            func.coalesce(tabla.c.estado, "Nuevo").in_(previos)
+        ).values(**valores).returning(
+            tabla.c.id, tabla.c.codigo_seguimiento, tabla.c.telefono, tabla.c.total, tabla.c.motivo_cancelacion
+        )
+    ).all()
+    if not actualizadas:
+        db.rollback()
+        return [], ids
+
+    historial = models.HistorialEstado.__table__
+    fechas = dict(db.execute(
+        insert(historial).returning(historial.c.orden_id, historial.c.fecha),
+        [{"tenant_id": tenant_id, "orden_id": fila.id, "nuevo_estado": nuevo_estado} for fila in actualizadas]
+    ).all())
+    db.commit()
+
+    for fila in actualizadas:
+        fecha = fechas.get(fila.id)
+        order_events.publish(tenant_id, "estado_actualizado", {
+            "orden_id": fila.id,
+            "codigo_seguimiento": fila.codigo_seguimiento,
+            "telefono": fila.telefono,
+            "nuevo_estado": nuevo_estado,
+            "motivo_cancelacion": fila.motivo_cancelacion,
+            "total": fila.total,
+            "fecha": fecha.isoformat() if fecha else None,
+        })
+
+    hechos = {fila.id for fila in actualizadas}
+    return [i for i in ids if i in hechos], [i for i in ids if i not in hechos]
+
 def update_pago_pedido(db: Session, tenant_id: str, orden_id: int, metodo_pago: str, paga_con: float):
     orden = db.query(models.Orden).filter(
         models.Orden.id == orden_id,
@@ -392,3 +801,45 @@ def delete_pedido(db: Session, tenant_id: str, orden_id: int):
         db.commit()
         return True
     return False
+
+# --- API ASÍNCRONA (DB_ASYNC=1) ---
+# Mismas consultas que las funciones síncronas de arriba (comparten los _select_*), ejecutadas
+# sobre una AsyncSession. Solo cubren las rutas calientes; el resto sigue en el threadpool.
+async def get_menu_async(db: AsyncSession, tenant_id: str, solo_activos: bool = True, search_term: str = None):
+    resultado = await db.execute(_select_menu(tenant_id, solo_activos, search_term))
+    return resultado.scalars().all()
+
+async def get_pedido_by_tracking_async(db: AsyncSession, tenant_id: str, telefono: str, codigo: str):
+    resultado = await db.execute(_select_pedido_tracking(tenant_id, telefono, codigo))
+    return resultado.unique().scalars().first()
+
+async def count_pedidos_async(db: AsyncSession, tenant_id: str, search_term: str = None):
+    return (await db.execute(_select_count_pedidos(tenant_id, search_term))).scalar() or 0
+
+async def get_pedidos_async(db: AsyncSession, tenant_id: str, skip: int = 0, limit: int = 100, search_term: str = None, before_id: int = None):
+    resultado = await db.execute(_select_pedidos(tenant_id, skip, limit, search_term, before_id))
+    return resultado.unique().scalars().all()
+
+async def create_pedido_async(db: AsyncSession, tenant_id: str, orden: schemas.OrdenCreate):
+    consulta = _select_platillos_de_items(tenant_id, orden.items)
+    filas = (await db.execute(consulta)).all() if consulta is not None else []
+    platillos = _resolver_platillos(orden.items, filas)
+
+    for intento in range(CODIGO_INTENTOS):
+        codigo = _codigo_aleatorio()
+        try:
+            orden_id, fecha = (await db.execute(_insert_orden(tenant_id, orden, codigo))).one()
+            break
+        except IntegrityError:
+            await db.rollback()
+            if intento == CODIGO_INTENTOS - 1:
+                raise
+
+    detalles = _filas_detalle(tenant_id, orden_id, orden, platillos)
+    detalle_ids = sorted((await db.execute(_insert_detalles, detalles)).scalars()) if detalles else []
+    await db.execute(_insert_historial_inicial(tenant_id, orden_id, fecha))
+    await db.commit()
+
+    pedido = _pedido_creado(tenant_id, orden, orden_id, fecha, codigo, detalles, detalle_ids)
+    _publicar_pedido_creado(tenant_id, pedido)
+    return pedido
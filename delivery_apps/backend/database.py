@@ -1,23 +1,79 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+# 1 = las rutas calientes usan el engine asíncrono (aiosqlite / asyncpg) en lugar del threadpool
+DB_ASYNC = os.getenv("DB_ASYNC", "0") == "1"
 
-if DATABASE_URL:
-    # Render / Producción → PostgreSQL
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True
+# --- POOL (PostgreSQL) ---
+# Conexiones por proceso: pool_size fijas + max_overflow temporales. Con varios workers,
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW) x workers debe caber en el max_connections del servidor.
+# Con DB_ASYNC=1 cada proceso abre además el pool asíncrono (las demás rutas siguen en el síncrono):
+# (DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW) x workers.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", str(DB_POOL_SIZE)))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", str(DB_MAX_OVERFLOW)))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Segundos antes de reciclar una conexión (los proxies gestionados cortan las inactivas)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Tope por sentencia en ms (0 = sin tope): una consulta atascada no retiene la conexión indefinidamente
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+# --- PRAGMAS (SQLite) ---
+# WAL: las lecturas no bloquean a la escritura ni al revés; busy_timeout: una escritura espera su
+# turno en lugar de fallar con "database is locked"; synchronous=NORMAL es seguro con WAL.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "15000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # Negativo = KiB (64 MiB)
+
+
+def _aplicar_pragmas_sqlite(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    finally:
+        cursor.close()
+
+
+def crear_engine(url: str, pragmas: bool = True):
+    """Engine configurado por variables de entorno según el motor (pool en PostgreSQL, pragmas en SQLite)."""
+    if url.startswith("sqlite"):
+        engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        )
+        if pragmas:
+            event.listen(engine, "connect", _aplicar_pragmas_sqlite)
+        return engine
+
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql"):
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        connect_args=connect_args
     )
-else:
+
+
+if not DATABASE_URL:
     # Local / Railway SQLite → Usar la subcarpeta 'uploads' que es donde está el volumen
     os.makedirs("static/uploads", exist_ok=True)
     DATABASE_URL = "sqlite:///./static/uploads/backend_dona_soco.db"
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False}
-    )
+
+engine = crear_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -28,6 +84,52 @@ SessionLocal = sessionmaker(
 Base = declarative_base()
 
 
+# --- ENGINE ASÍNCRONO (DB_ASYNC=1) ---
+_DRIVERS_ASYNC = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg"}
+
+
+def _url_async(url: str) -> str:
+    esquema, sep, resto = url.partition("://")
+    driver = _DRIVERS_ASYNC.get(esquema.split("+")[0])
+    return f"{driver}{sep}{resto}" if driver else url
+
+
+def crear_engine_async(url: str, pragmas: bool = True):
+    """Variante asíncrona de crear_engine(): mismos pragmas y ajustes, con su propio tamaño de pool."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = _url_async(url)
+    if url.startswith("sqlite"):
+        engine_async = create_async_engine(url, connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000})
+        if pragmas:
+            event.listen(engine_async.sync_engine, "connect", _aplicar_pragmas_sqlite)
+        return engine_async
+
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS and url.startswith("postgresql+asyncpg"):
+        connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    return create_async_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=DB_ASYNC_POOL_SIZE,
+        max_overflow=DB_ASYNC_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        connect_args=connect_args
+    )
+
+
+async_engine = None
+AsyncSessionLocal = None
+
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = crear_engine_async(DATABASE_URL)
+    # expire_on_commit=False: tras el commit los objetos se serializan sin volver a la DB
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Eventos recientes que se conservan por tenant para reanudar un stream tras una reconexión
+EVENTS_HISTORY = int(os.getenv("EVENTS_HISTORY", "500"))
+# Eventos pendientes por suscriptor; un cliente que no lee a este ritmo recibe un "reset"
+EVENTS_QUEUE_MAX = int(os.getenv("EVENTS_QUEUE_MAX", "256"))
+# Segundos sin eventos tras los que se manda un comentario para mantener viva la conexión
+EVENTS_KEEPALIVE = float(os.getenv("EVENTS_KEEPALIVE", "15"))
+
+# (seq, tipo, data_json)
+Evento = Tuple[int, str, str]
+
+
+class OrderEventBus:
+    """
+    Bus en proceso de eventos de pedidos ("pedido_creado", "estado_actualizado") por tenant.
+
+    `publish()` se llama desde las funciones síncronas de crud (threadpool de FastAPI) y entrega
+    el evento a las colas asyncio de cada stream abierto con `call_soon_threadsafe`. Cada evento
+    lleva un id "<arranque>-<seq>": un cliente que se reconecta con su último id recibe solo lo que
+    se perdió; si el id es de otro arranque del proceso o ya salió del historial, recibe "reset"
+    y debe recargar su estado completo.
+
+    El bus vive en el proceso: con varios workers/réplicas del backend cada uno ve solo sus propias
+    escrituras y haría falta un broker compartido (p. ej. LISTEN/NOTIFY de PostgreSQL).
+    """
+
+    def __init__(self, history: int = EVENTS_HISTORY, queue_max: int = EVENTS_QUEUE_MAX):
+        self.history = history
+        self.queue_max = queue_max
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._seq = {}          # tenant_id -> int
+        self._eventos = {}      # tenant_id -> deque[Evento]
+        self._suscriptores = {} # tenant_id -> set[(loop, asyncio.Queue)]
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.boot_id}-{seq}"
+
+    def _parse_event_id(self, last_event_id: Optional[str]) -> Optional[int]:
+        """Devuelve el seq del id si pertenece a este arranque, o None si no sirve para reanudar."""
+        if not last_event_id:
+            return None
+        boot, _, seq = last_event_id.rpartition("-")
+        if boot != self.boot_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    @staticmethod
+    def _entregar(cola: asyncio.Queue, evento: Evento):
+        # Corre dentro del loop del suscriptor
+        try:
+            cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente demasiado lento: se descarta lo pendiente y se le pide recargar
+            while not cola.empty():
+                cola.get_nowait()
+            cola.put_nowait((0, "reset", "{}"))
+
+    def publish(self, tenant_id: str, tipo: str, data: dict):
+        payload = json.dumps(data, default=str)
+        with self._lock:
+            seq = self._seq.get(tenant_id, 0) + 1
+            self._seq[tenant_id] = seq
+            evento = (seq, tipo, payload)
+            self._eventos.setdefault(tenant_id, deque(maxlen=self.history)).append(evento)
+            suscriptores = list(self._suscriptores.get(tenant_id, ()))
+
+        for loop, cola in suscriptores:
+            try:
+                loop.call_soon_threadsafe(self._entregar, cola, evento)
+            except RuntimeError:
+                pass  # El loop del stream ya se cerró; unsubscribe() lo retirará
+
+    def subscribe(self, tenant_id: str, last_event_id: Optional[str] = None):
+        """
+        Registra un stream del tenant. Devuelve (suscripcion, eventos_a_reenviar, reset, cursor).
+        `cursor` es el id desde el que el cliente puede reanudar aunque todavía no haya recibido ningún
+        evento (None si reanuda desde su propio id). Se lee bajo el mismo lock que registra la cola:
+        todo lo publicado después llega por la cola o se reenvía al reconectar con ese id.
+        Debe llamarse desde el event loop que va a consumir la cola.
+        """
+        cola = asyncio.Queue(maxsize=self.queue_max)
+        suscripcion = (asyncio.get_running_loop(), cola)
+        desde = self._parse_event_id(last_event_id)
+
+        with self._lock:
+            self._suscriptores.setdefault(tenant_id, set()).add(suscripcion)
+            eventos = self._eventos.get(tenant_id, ())
+            pendientes: List[Evento] = []
+            reset = False
+            cursor = None
+            if last_event_id:
+                if desde is None:
+                    reset = True
+                else:
+                    pendientes = [e for e in eventos if e[0] > desde]
+                    # Hueco entre lo último que vio el cliente y lo más viejo que se conserva
+                    primero = pendientes[0][0] if pendientes else self._seq.get(tenant_id, 0) + 1
+                    reset = primero > desde + 1
+            if desde is None or reset:
+                cursor = self.event_id(self._seq.get(tenant_id, 0))
+        return suscripcion, pendientes, reset, cursor
+
+    def unsubscribe(self, tenant_id: str, suscripcion):
+        with self._lock:
+            activos = self._suscriptores.get(tenant_id)
+            if activos:
+                activos.discard(suscripcion)
+                if not activos:
+                    del self._suscriptores[tenant_id]
+
+    def format_sse(self, evento: Evento) -> str:
+        seq, tipo, payload = evento
+        if tipo == "reset":
+            return f"event: reset\ndata: {payload}\n\n"
+        return f"id: {self.event_id(seq)}\nevent: {tipo}\ndata: {payload}\n\n"
+
+
+order_events = OrderEventBus()
+
+
+def datos_evento(evento: Evento) -> Dict:
+    return json.loads(evento[2])
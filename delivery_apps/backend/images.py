@@ -0,0 +1,66 @@
+import asyncio
+import hashlib
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+# Ancho máximo (px) de cada variante. "thumb" es la que pintan las tarjetas del menú.
+IMAGE_VARIANTS = {"thumb": 400, "medium": 800, "full": 1600}
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_pool = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # El pool se crea bajo demanda: los workers de uvicorn que nunca reciben subidas no lo arrancan
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def nombre_variante(filename: str, variante: str) -> str:
+    """'tacos-1a2b.webp' -> 'tacos-1a2b.thumb.webp'. La variante "full" es el archivo base."""
+    if variante == "full":
+        return filename
+    base, ext = os.path.splitext(filename)
+    return f"{base}.{variante}{ext}"
+
+
+def nombre_base(original_filename: str, content: bytes) -> str:
+    """Nombre del archivo "full": slug del original + hash del contenido (inmutable, cacheable)."""
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "-", os.path.splitext(original_filename or "")[0]).strip("-") or "img"
+    digest = hashlib.blake2b(content, digest_size=8).hexdigest()
+    return f"{slug}-{digest}.webp"
+
+
+def procesar_imagen(content: bytes, directorio: str, filename: str) -> Dict[str, str]:
+    """
+    Decodifica la imagen y escribe una variante WebP por cada tamaño de IMAGE_VARIANTS.
+    Corre en un proceso aparte (CPU pura), nunca en el event loop.
+    """
+    from PIL import Image
+
+    rutas = {v: os.path.join(directorio, nombre_variante(filename, v)) for v in IMAGE_VARIANTS}
+    # Mismo contenido = mismo nombre: si ya se procesó, no hay nada que hacer
+    if all(os.path.exists(r) for r in rutas.values()):
+        return {v: os.path.basename(r) for v, r in rutas.items()}
+
+    img = Image.open(io.BytesIO(content))
+    if img.mode in ("RGBA", "P"):
+        img = img.convert("RGB")
+
+    for variante, ancho in IMAGE_VARIANTS.items():
+        copia = img.copy()
+        copia.thumbnail((ancho, ancho * 4))  # Limita el ancho y conserva la proporción
+        tmp = rutas[variante] + ".tmp"
+        copia.save(tmp, "WEBP", quality=80, method=6)
+        os.replace(tmp, rutas[variante])  # Nunca se sirve un archivo a medio escribir
+    return {v: os.path.basename(r) for v, r in rutas.items()}
+
+
+async def procesar_imagen_async(content: bytes, directorio: str, filename: str) -> Dict[str, str]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), procesar_imagen, content, directorio, filename)
@@ -1,18 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header, UploadFile, File, Request
+from fastapi import FastAPI, Depends, HTTPException, status, Header, UploadFile, File, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from pydantic import TypeAdapter
+from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
+import asyncio
 import os
+import csv
+import io
 import mimetypes
 import shutil
+import tempfile
 
-import crud, models, schemas
-from database import SessionLocal, engine, get_db
+import crud, images, migrations, schemas
+from cache import auth_cache, catalog_cache
+from events import EVENTS_KEEPALIVE, datos_evento, order_events
+from shortlinks import shortlink_resolver
+from web_assets import web_assets
+from database import DB_ASYNC, AsyncSessionLocal, SessionLocal, engine, get_db
 
 # --- CONFIGURACIÓN JWT ---
 # Usamos la misma API_SECRET_KEY para firmar los tokens
@@ -22,9 +32,13 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24 horas
 
 security = HTTPBearer(auto_error=False)
 
-def create_access_token(data: dict):
+EXPORT_TOKEN_EXPIRE_MINUTES = 5 # Enlaces de descarga de un solo uso práctico
+PEDIDOS_LOTE_MAX = 500 # Pedidos por cambio de estado en lote (PUT /pedidos/estado)
+SHORTLINK_STATS_DIAS_MAX = 366 # Ventana máxima de GET /shortlinks/{id}/stats
+
+def create_access_token(data: dict, expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + timedelta(minutes=expires_minutes)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=ALGORITHM)
 
@@ -59,6 +73,18 @@ async def get_tenant_id(x_tenant_id: str = Header(..., alias="X-Tenant-ID")):
         )
     return x_tenant_id
 
+def _verificar_token(token: str):
+    """(tenant, scope) de un JWT válido, o None. Los ya verificados salen del LRU sin volver a decodificar."""
+    verificado = auth_cache.get_token(token)
+    if verificado is not None:
+        return verificado
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    auth_cache.set_token(token, payload.get("sub"), payload.get("scope"), payload.get("exp"))
+    return payload.get("sub"), payload.get("scope")
+
 async def verify_api_key(
     x_api_key: Optional[str] = Header(None, alias="X-API-KEY"),
     auth: Optional[HTTPAuthorizationCredentials] = Depends(security),
@@ -75,15 +101,14 @@ async def verify_api_key(
 
     # Opción 2: Validar contra Bearer Token (JWT)
     if auth and auth.scheme == "Bearer":
-        token = auth.credentials
-        try:
-            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
-            token_tenant = payload.get("sub")
-            if token_tenant == tenant_id:
+        verificado = _verificar_token(auth.credentials)
+        if verificado:
+            token_tenant, scope = verificado
+            # Los tokens con 'scope' (ej. descargas) no sirven como sesión
+            if token_tenant == tenant_id and not scope:
                 return True
-            print(f"ALERTA SEGURIDAD: Token de tenant '{token_tenant}' usado para '{tenant_id}'")
-        except JWTError:
-            pass
+            if token_tenant != tenant_id:
+                print(f"ALERTA SEGURIDAD: Token de tenant '{token_tenant}' usado para '{tenant_id}'")
 
     print(f"ALERTA SEGURIDAD: Acceso rechazado. Tenant: {tenant_id}")
     raise HTTPException(
@@ -91,71 +116,16 @@ async def verify_api_key(
         detail="No autorizado: Se requiere API_KEY válida o Token de sesión"
     )
 
-# Inicialización de Base de Datos
-models.Base.metadata.create_all(bind=engine)
+# --- ESQUEMA DE BASE DE DATOS ---
+# Migraciones versionadas (migrations.py): con el esquema al día es una sola consulta.
+# Con MIGRATE_ON_STARTUP=0 se corren en el despliegue (`python migrations.py`) y los workers solo arrancan.
+if os.getenv("MIGRATE_ON_STARTUP", "1") == "1":
+    migrations.migrar()
+elif not migrations.esquema_al_dia():
+    print("⚠️ Esquema de base de datos desactualizado: ejecuta `python migrations.py`")
 
-# --- MIGRACIÓN MANUAL (Asegurar columnas nuevas) ---
-def ensure_columns():
-    from sqlalchemy import text, inspect
-    inspector = inspect(engine)
-    
-    with engine.connect() as conn:
-        # 1. Columnas generales del menú
-        try:
-            menu_columns = [c['name'] for c in inspector.get_columns("menu")]
-            cols_to_add = {
-                "is_configurable": "INTEGER DEFAULT 0",
-                "is_configurable_salsa": "INTEGER DEFAULT 0",
-                "piezas": "INTEGER DEFAULT 1",
-                "printer_target": "VARCHAR DEFAULT 'cocina'",
-                "grupos_opciones_ids": "TEXT DEFAULT '[]'",
-                "categoria_id": "VARCHAR"
-            }
-            for col, type_def in cols_to_add.items():
-                if col not in menu_columns:
-                    conn.execute(text(f"ALTER TABLE menu ADD COLUMN {col} {type_def}"))
-                    conn.commit()
-        except Exception: pass
-        
-        # 2. Multi-tenancy: tenant_id en todas las tablas
-        tables = ["menu", "grupos_opciones", "configuracion", "ordenes", "orden_detalle", "historial_estados"]
-        for table in tables:
-            try:
-                columns = [c['name'] for c in inspector.get_columns(table)]
-                if "tenant_id" not in columns:
-                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN tenant_id VARCHAR"))
-                    # Poblar con valor por defecto solo si se acaba de crear la columna
-                    conn.execute(text(f"UPDATE {table} SET tenant_id = 'dona_soco' WHERE tenant_id IS NULL"))
-                    conn.commit()
-                    print(f"DEBUG: Columna 'tenant_id' añadida y poblada en {table}")
-            except Exception as e:
-                print(f"ERROR MIGRACION {table}: {e}")
-                try: conn.rollback()
-                except Exception: pass
-
-        # 3. Columnas extras en configuración
-        try:
-            config_cols = [c['name'] for c in inspector.get_columns("configuracion")]
-            if "categorias_disponibles" not in config_cols:
-                conn.execute(text("ALTER TABLE configuracion ADD COLUMN categorias_disponibles TEXT DEFAULT '[]'"))
-                conn.commit()
-        except Exception: pass
-
-        # 4. Migración de ShortLinks (Quitar unicidad global, poner por tenant)
-        if engine.name == "postgresql":
-            try:
-                # Intentar borrar la restricción global antigua si existe
-                conn.execute(text("ALTER TABLE short_links DROP CONSTRAINT IF EXISTS short_links_short_code_key"))
-                # Intentar borrar el índice único si se creó como índice
-                conn.execute(text("DROP INDEX IF EXISTS ix_short_links_short_code"))
-                conn.commit()
-                print("DEBUG: Restricciones de ShortLink actualizadas en PostgreSQL")
-            except Exception as e:
-                print(f"DEBUG: Nota migración ShortLink: {e}")
-                try: conn.rollback()
-                except: pass
-
-ensure_columns()
+# Enlaces cortos en memoria y contadores de clics escritos por lotes (shortlinks.py)
+shortlink_resolver.iniciar()
 
 app = FastAPI(title="Delivery Multi-tenant API")
 
@@ -175,9 +145,10 @@ async def add_security_headers(request, call_next):
     response.headers["Cross-Origin-Opener-Policy"] = "same-origin"
     response.headers["Cross-Origin-Embedder-Policy"] = "require-corp"
     
-    # Prevenir cacheo de archivos de ejecución
+    # Prevenir cacheo de archivos de ejecución, salvo los del build web: web_assets ya fija su
+    # política (index.html se revalida, los versionados son inmutables)
     if request.url.path.endswith((".js", ".wasm", ".zip", ".html")):
-        response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
+        response.headers.setdefault("Cache-Control", "no-cache, no-store, must-revalidate")
     return response
 
 app.add_middleware(
@@ -186,21 +157,90 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "ETag"],
 )
 
 # --- RUTAS DE API ---
 
+# Serializadores del catálogo: la caché guarda el JSON ya generado, los hits no tocan SQLAlchemy ni Pydantic
+_menu_adapter = TypeAdapter(List[schemas.Menu])
+_grupos_adapter = TypeAdapter(List[schemas.GrupoOpciones])
+_config_adapter = TypeAdapter(schemas.Configuracion)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _cached_catalog_response(request: Request, tenant_id: str, key: tuple, adapter: TypeAdapter, loader):
+    """
+    Sirve el JSON cacheado del tenant; solo en un fallo abre sesión, consulta y serializa.
+    Si el cliente ya tiene esa versión (If-None-Match) responde 304 sin cuerpo.
+    """
+    def build():
+        db = SessionLocal()
+        try:
+            data = adapter.validate_python(loader(db), from_attributes=True)
+            return adapter.dump_json(data)
+        finally:
+            db.close()
+
+    body, etag = catalog_cache.get_or_build(tenant_id, key, build)
+    return _catalog_response(request, body, etag)
+
+def _catalog_response(request: Request, body: bytes, etag: str):
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def _consultar(convertir, consulta, consulta_async=None):
+    """
+    Ejecuta una consulta de crud y convierte el resultado antes de cerrar la sesión.
+    Con DB_ASYNC=1 usa la variante asíncrona en el event loop; si no, la síncrona en el threadpool.
+    """
+    if DB_ASYNC and consulta_async is not None:
+        async with AsyncSessionLocal() as db:
+            return convertir(await consulta_async(db))
+
+    def correr():
+        db = SessionLocal()
+        try:
+            return convertir(consulta(db))
+        finally:
+            db.close()
+    return await run_in_threadpool(correr)
+
+async def _cached_catalog_response_async(request: Request, tenant_id: str, key: Optional[tuple], adapter: TypeAdapter, loader, loader_async):
+    """
+    Como _cached_catalog_response, pero un hit no ocupa hilo y un fallo consulta con _consultar.
+    Con `key` None la respuesta no se guarda (sigue llevando ETag).
+    """
+    cached = catalog_cache.get(tenant_id, key) if key is not None else None
+    if cached is None:
+        version = catalog_cache.version(tenant_id)
+        body = await _consultar(
+            lambda rows: adapter.dump_json(adapter.validate_python(rows, from_attributes=True)),
+            loader, loader_async
+        )
+        etag = catalog_cache.set(tenant_id, key, body, version) if key is not None else catalog_cache.make_etag(body)
+        cached = body, etag
+    return _catalog_response(request, *cached)
+
+def _orden_schema(orden):
+    return schemas.Orden.model_validate(orden)
+
 @app.get("/shortlinks/resolve/{code}")
-def resolve_short_link(
+async def resolve_short_link(
     code: str,
-    db: Session = Depends(get_db),
     tenant_id: str = Depends(get_tenant_id)
 ):
     """Consulta la URL de destino para un código corto en el tenant actual."""
-    link = crud.get_short_link_by_code(db, tenant_id, code)
-    if not link:
+    destino = await shortlink_resolver.resolver(tenant_id, code)
+    if destino is None:
         raise HTTPException(status_code=404, detail="Código no encontrado para este negocio")
-    return {"url": link.destination_url}
+    return {"url": destino[1]}
 
 @app.get("/shortlinks", response_model=List[schemas.ShortLink], dependencies=[Depends(verify_api_key)])
 def read_short_links(
@@ -228,23 +268,52 @@ def delete_short_link(
         raise HTTPException(status_code=404, detail="Enlace no encontrado")
     return {"ok": True}
 
+@app.get("/shortlinks/{link_id}/stats", response_model=schemas.ShortLinkStats, dependencies=[Depends(verify_api_key)])
+def read_short_link_stats(
+    link_id: int,
+    intervalo: str = "dia",
+    dias: int = 30,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Clics del enlace en los últimos `dias`, por `intervalo` (hora | dia) y tipo de dispositivo, con sus referrers."""
+    if intervalo not in crud.PERIODOS_CLICS:
+        raise HTTPException(status_code=400, detail="intervalo debe ser 'hora' o 'dia'")
+    if not 1 <= dias <= SHORTLINK_STATS_DIAS_MAX:
+        raise HTTPException(status_code=400, detail=f"dias debe estar entre 1 y {SHORTLINK_STATS_DIAS_MAX}")
+    desde = datetime.now(timezone.utc) - timedelta(days=dias)
+    stats = crud.get_short_link_stats(db, tenant_id, link_id, intervalo, desde)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="Enlace no encontrado")
+    return stats
+
 @app.get("/r/{tenant_id}/{code}")
-async def public_redirect(tenant_id: str, code: str, db: Session = Depends(get_db)):
-    """Redirección pública rápida mediante HTTP 302."""
-    link = crud.get_short_link_by_code(db, tenant_id, code)
-    if not link:
+async def public_redirect(request: Request, tenant_id: str, code: str):
+    """Redirección pública rápida mediante HTTP 302 (resuelta desde memoria; el clic se cuenta por lotes)."""
+    destino = await shortlink_resolver.resolver(tenant_id, code)
+    if destino is None:
         # Si no existe el link, mandarlo al home del tenant (opcional)
         return JSONResponse({"detail": "Enlace no encontrado"}, status_code=404)
-    return RedirectResponse(url=link.destination_url, status_code=302)
+    link_id, url = destino
+    shortlink_resolver.registrar_click(
+        tenant_id, link_id, request.headers.get("referer"), request.headers.get("user-agent")
+    )
+    return RedirectResponse(url=url, status_code=302)
 
 @app.get("/menu", response_model=List[schemas.Menu])
-def read_menu(
+async def read_menu(
+    request: Request,
     solo_activos: bool = True, 
     search: Optional[str] = None, 
-    db: Session = Depends(get_db),
     tenant_id: str = Depends(get_tenant_id)
 ):
-    return crud.get_menu(db, tenant_id, solo_activos, search)
+    # Las búsquedas no se cachean: el cliente filtra el menú en local y cada texto sería otra entrada
+    key = ("menu", solo_activos) if not search else None
+    return await _cached_catalog_response_async(
+        request, tenant_id, key, _menu_adapter,
+        lambda db: crud.get_menu(db, tenant_id, solo_activos, search),
+        lambda db: crud.get_menu_async(db, tenant_id, solo_activos, search)
+    )
 
 @app.post("/menu", response_model=schemas.Menu, dependencies=[Depends(verify_api_key)])
 def create_menu_item(
@@ -259,6 +328,19 @@ def create_menu_item(
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
 
+@app.post("/menu/bulk", response_model=List[schemas.ResultadoImportacion], dependencies=[Depends(verify_api_key)])
+def bulk_menu_items(
+    items: List[Dict[str, Any]],
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Alta/actualización de muchos platillos en una transacción. Cada fila se valida por separado."""
+    try:
+        return crud.bulk_upsert_platillos(db, tenant_id, items)
+    except Exception as e:
+        print(f"ERROR CRÍTICO EN IMPORTACIÓN DE MENÚ: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
 @app.put("/menu/{item_id}", response_model=schemas.Menu, dependencies=[Depends(verify_api_key)])
 def update_menu_item(
     item_id: int, 
@@ -284,10 +366,13 @@ def delete_menu_item(
 
 @app.get("/opciones", response_model=List[schemas.GrupoOpciones])
 def read_grupos_opciones(
-    db: Session = Depends(get_db),
+    request: Request,
     tenant_id: str = Depends(get_tenant_id)
 ):
-    return crud.get_grupos_opciones(db, tenant_id)
+    return _cached_catalog_response(
+        request, tenant_id, ("opciones",), _grupos_adapter,
+        lambda db: crud.get_grupos_opciones(db, tenant_id)
+    )
 
 @app.post("/opciones", response_model=schemas.GrupoOpciones, dependencies=[Depends(verify_api_key)])
 def create_grupo_opciones(
@@ -297,6 +382,18 @@ def create_grupo_opciones(
 ):
     return crud.create_grupo_opciones(db, tenant_id, grupo)
 
+@app.post("/opciones/bulk", response_model=List[schemas.ResultadoImportacion], dependencies=[Depends(verify_api_key)])
+def bulk_grupos_opciones(
+    grupos: List[Dict[str, Any]],
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    try:
+        return crud.bulk_upsert_grupos_opciones(db, tenant_id, grupos)
+    except Exception as e:
+        print(f"ERROR CRÍTICO EN IMPORTACIÓN DE GRUPOS: {e}")
+        raise HTTPException(status_code=500, detail=f"Error interno: {str(e)}")
+
 @app.put("/opciones/{grupo_id}", response_model=schemas.GrupoOpciones, dependencies=[Depends(verify_api_key)])
 def update_grupo_opciones(
     grupo_id: int, 
@@ -322,10 +419,13 @@ def delete_grupo_opciones(
 
 @app.get("/configuracion", response_model=schemas.Configuracion)
 def read_config(
-    db: Session = Depends(get_db),
+    request: Request,
     tenant_id: str = Depends(get_tenant_id)
 ):
-    return crud.get_configuracion(db, tenant_id)
+    return _cached_catalog_response(
+        request, tenant_id, ("configuracion",), _config_adapter,
+        lambda db: crud.get_configuracion(db, tenant_id)
+    )
 
 @app.put("/configuracion", response_model=schemas.Configuracion, dependencies=[Depends(verify_api_key)])
 def update_config(
@@ -336,34 +436,220 @@ def update_config(
     return crud.update_configuracion(db, tenant_id, config)
 
 @app.post("/pedidos", response_model=schemas.Orden)
-def create_pedido(
+async def create_pedido(
     orden: schemas.OrdenCreate, 
-    db: Session = Depends(get_db),
     tenant_id: str = Depends(get_tenant_id)
 ):
-    return crud.create_pedido(db, tenant_id, orden)
+    return await _consultar(
+        _orden_schema,
+        lambda db: crud.create_pedido(db, tenant_id, orden),
+        lambda db: crud.create_pedido_async(db, tenant_id, orden)
+    )
 
 @app.get("/pedidos/seguimiento", response_model=schemas.Orden)
-def track_pedido(
+async def track_pedido(
     telefono: str, 
     codigo: str, 
-    db: Session = Depends(get_db),
     tenant_id: str = Depends(get_tenant_id)
 ):
-    orden = crud.get_pedido_by_tracking(db, tenant_id, telefono, codigo)
+    orden = await _consultar(
+        lambda o: _orden_schema(o) if o else None,
+        lambda db: crud.get_pedido_by_tracking(db, tenant_id, telefono, codigo),
+        lambda db: crud.get_pedido_by_tracking_async(db, tenant_id, telefono, codigo)
+    )
     if not orden:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     return orden
 
 @app.get("/pedidos", response_model=List[schemas.Orden], dependencies=[Depends(verify_api_key)])
-def read_pedidos(
+async def read_pedidos(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    search: Optional[str] = None, 
+    before_id: Optional[int] = None,
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """Página de pedidos (keyset con `before_id`). El total filtrado viaja en el header X-Total-Count."""
+    def pagina(db):
+        total = crud.count_pedidos(db, tenant_id, search)
+        return total, crud.get_pedidos(db, tenant_id, skip, limit, search, before_id) if limit > 0 else []
+
+    async def pagina_async(db):
+        total = await crud.count_pedidos_async(db, tenant_id, search)
+        return total, await crud.get_pedidos_async(db, tenant_id, skip, limit, search, before_id) if limit > 0 else []
+
+    total, pedidos = await _consultar(
+        lambda r: (r[0], [_orden_schema(o) for o in r[1]]), pagina, pagina_async
+    )
+    response.headers["X-Total-Count"] = str(total)
+    return pedidos
+
+@app.get("/pedidos/count", dependencies=[Depends(verify_api_key)])
+def count_pedidos(
     search: Optional[str] = None, 
     db: Session = Depends(get_db),
     tenant_id: str = Depends(get_tenant_id)
 ):
-    return crud.get_pedidos(db, tenant_id, skip, limit, search)
+    return {"total": crud.count_pedidos(db, tenant_id, search)}
+
+@app.get("/pedidos/eventos")
+async def stream_eventos_pedidos(
+    request: Request,
+    telefono: Optional[str] = None,
+    codigo: Optional[str] = None,
+    last_event_id: Optional[str] = None,
+    last_event_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    x_api_key: Optional[str] = Header(None, alias="X-API-KEY"),
+    auth: Optional[HTTPAuthorizationCredentials] = Depends(security),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """
+    Stream SSE con los eventos de pedidos del tenant ("pedido_creado", "estado_actualizado").
+    Con `telefono` y `codigo` solo llegan los del pedido que se está siguiendo y, como en
+    /pedidos/seguimiento, no se pide sesión: es lo que usa la vista de seguimiento del cliente.
+    El stream de todo el tenant (panel) requiere API_KEY o JWT.
+    Acepta el último id visto (header Last-Event-ID o query) para reanudar sin perder eventos.
+    """
+    if not (telefono and codigo):
+        await verify_api_key(x_api_key, auth, tenant_id)
+
+    def corresponde(evento) -> bool:
+        if evento[1] == "reset" or not (telefono or codigo):
+            return True
+        data = datos_evento(evento)
+        return data.get("telefono") == telefono and data.get("codigo_seguimiento") == codigo
+
+    async def stream():
+        # Se suscribe dentro del generador: si nunca arranca, no queda una cola huérfana
+        suscripcion, pendientes, reset, cursor = order_events.subscribe(tenant_id, last_event_header or last_event_id)
+        try:
+            # Con el cursor, un cliente que se cae antes de su primer evento reanuda sin perder lo publicado
+            yield f"retry: 3000\nid: {cursor}\n\n" if cursor else "retry: 3000\n\n"
+            if reset:
+                yield order_events.format_sse((0, "reset", "{}"))
+            for evento in pendientes:
+                if corresponde(evento):
+                    yield order_events.format_sse(evento)
+            cola = suscripcion[1]
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(cola.get(), timeout=EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if corresponde(evento):
+                    yield order_events.format_sse(evento)
+        finally:
+            order_events.unsubscribe(tenant_id, suscripcion)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/pedidos/export/token", dependencies=[Depends(verify_api_key)])
+def create_export_token(tenant_id: str = Depends(get_tenant_id)):
+    """Token de corta duración para abrir /pedidos/export directamente desde el navegador (sin headers)."""
+    token = create_access_token({"sub": tenant_id, "scope": "export"}, expires_minutes=EXPORT_TOKEN_EXPIRE_MINUTES)
+    return {"token": token, "expires_in": EXPORT_TOKEN_EXPIRE_MINUTES * 60}
+
+def _verify_export_token(tenant: str, token: str):
+    try:
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
+        if payload.get("sub") == tenant and payload.get("scope") == "export":
+            return tenant
+    except JWTError:
+        pass
+    raise HTTPException(status_code=401, detail="Enlace de descarga inválido o expirado")
+
+def _formatear_celda(value):
+    return value.isoformat(sep=" ") if isinstance(value, datetime) else value
+
+def _stream_csv(tenant_id: str, search: Optional[str], chunk_rows: int = 500):
+    # Sesión propia: el generador vive más que la petición original
+    db = SessionLocal()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(crud.EXPORT_COLUMNAS)
+        for i, row in enumerate(crud.iter_filas_exportacion(db, tenant_id, search), start=1):
+            writer.writerow([_formatear_celda(v) for v in row])
+            if i % chunk_rows == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue().encode("utf-8")
+    finally:
+        db.close()
+
+def _stream_xlsx(tenant_id: str, search: Optional[str], chunk_bytes: int = 64 * 1024):
+    from openpyxl import Workbook
+
+    db = SessionLocal()
+    # Modo write-only: las filas van a disco, no se mantiene el libro en memoria
+    with tempfile.TemporaryFile() as tmp:
+        try:
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet("Detalle de Ordenes")
+            ws.append(crud.EXPORT_COLUMNAS)
+            for row in crud.iter_filas_exportacion(db, tenant_id, search):
+                ws.append([_formatear_celda(v) for v in row])
+            wb.save(tmp)
+        finally:
+            db.close()
+        tmp.seek(0)
+        while chunk := tmp.read(chunk_bytes):
+            yield chunk
+
+@app.get("/pedidos/export")
+def export_pedidos(
+    tenant: str,
+    token: str,
+    formato: str = "csv",
+    search: Optional[str] = None
+):
+    """Reporte de pedidos (una fila por producto) transmitido por bloques en CSV o XLSX."""
+    tenant_id = _verify_export_token(tenant, token)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    if formato == "xlsx":
+        filename = f"reporte_{timestamp}.xlsx"
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        content = _stream_xlsx(tenant_id, search)
+    elif formato == "csv":
+        filename = f"reporte_{timestamp}.csv"
+        media_type = "text/csv; charset=utf-8"
+        content = _stream_csv(tenant_id, search)
+    else:
+        raise HTTPException(status_code=400, detail="Formato no soportado (csv | xlsx)")
+
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.put("/pedidos/estado", response_model=schemas.ResultadoEstadoLote, dependencies=[Depends(verify_api_key)])
+def update_estado_lote(
+    lote: schemas.EstadoLote,
+    db: Session = Depends(get_db),
+    tenant_id: str = Depends(get_tenant_id)
+):
+    """
+    Cambia el estado de varios pedidos en una transacción. Solo se avanza en el flujo
+    (Nuevo → Preparando → En Camino → Entregado) o se cancela uno que no ha terminado;
+    los que no pueden hacer la transición vuelven en `rechazados`.
+    """
+    if crud.estados_previos(lote.nuevo_estado) is None:
+        raise HTTPException(status_code=400, detail=f"Estado destino no válido: {lote.nuevo_estado}")
+    if lote.nuevo_estado == "Cancelado" and not (lote.motivo and lote.motivo.strip()):
+        raise HTTPException(status_code=400, detail="Se requiere un motivo para cancelar")
+    if len(lote.ids) > PEDIDOS_LOTE_MAX:
+        raise HTTPException(status_code=400, detail=f"Máximo {PEDIDOS_LOTE_MAX} pedidos por lote")
+    actualizados, rechazados = crud.update_estado_pedidos(db, tenant_id, lote.ids, lote.nuevo_estado, lote.motivo)
+    return {"actualizados": actualizados, "rechazados": rechazados}
 
 @app.put("/pedidos/{orden_id}/estado", dependencies=[Depends(verify_api_key)])
 def update_estado(
@@ -450,9 +736,6 @@ async def upload_file(
     file: UploadFile = File(...),
     tenant_id: str = Depends(get_tenant_id)
 ):
-    from PIL import Image
-    import io
-    
     # 1. Asegurar directorio del tenant
     tenant_upload_dir = os.path.join(UPLOAD_DIR, tenant_id)
     os.makedirs(tenant_upload_dir, exist_ok=True)
@@ -460,22 +743,18 @@ async def upload_file(
     # 2. Leer contenido
     content = await file.read()
     
-    # 3. Generar nombre con extensión .webp
-    base_name = os.path.splitext(file.filename)[0]
-    filename = f"{base_name}.webp"
-    file_location = os.path.join(tenant_upload_dir, filename)
+    # 3. Nombre con hash del contenido: cada versión de la imagen tiene su propia URL
+    filename = images.nombre_base(file.filename, content)
     
     try:
-        # 4. Abrir imagen desde memoria y convertir a WebP
-        img = Image.open(io.BytesIO(content))
-        if img.mode in ("RGBA", "P"):
-            img = img.convert("RGB")
-            
-        img.save(file_location, "WEBP", quality=80, method=6)
-        return {"filename": filename}
+        # 4. Decodificar y generar thumb/medium/full en el pool de procesos (no bloquea el loop)
+        variantes = await images.procesar_imagen_async(content, tenant_upload_dir, filename)
+        return {"filename": filename, "variants": variantes}
     except Exception as e:
         print(f"Error procesando imagen para tenant {tenant_id}: {e}")
-        with open(file_location, "wb+") as file_object:
+        # Sin variantes: se guarda tal cual con el nombre de siempre
+        filename = f"{os.path.splitext(file.filename)[0]}.webp"
+        with open(os.path.join(tenant_upload_dir, filename), "wb+") as file_object:
             file_object.write(content)
         return {"filename": filename}
 
@@ -488,6 +767,11 @@ async def delete_file(
     # Solo eliminar si existe y es un archivo (evita errores con lost+found o subcarpetas)
     if os.path.exists(file_location) and os.path.isfile(file_location):
         os.remove(file_location)
+        # Borrar también sus variantes (thumb/medium), si las tiene
+        for variante in images.IMAGE_VARIANTS:
+            ruta_variante = os.path.join(UPLOAD_DIR, tenant_id, images.nombre_variante(filename, variante))
+            if os.path.isfile(ruta_variante):
+                os.remove(ruta_variante)
         return {"ok": True, "message": f"Archivo {filename} eliminado para {tenant_id}"}
     raise HTTPException(status_code=404, detail="Archivo no encontrado o es un directorio protegido")
 
@@ -540,53 +824,32 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # Montar archivos estáticos del API (para imágenes subidas)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+# Build web de Flet: indexado una vez al arrancar, con variantes comprimidas y ETag por contenido
+web_assets.iniciar()
+
 @app.get("/")
-async def read_root():
-    if os.path.exists("web/index.html"):
-        return FileResponse(
-            "web/index.html",
-            headers={
-                "Cross-Origin-Opener-Policy": "same-origin",
-                "Cross-Origin-Embedder-Policy": "require-corp",
-                "Cache-Control": "no-cache, no-store, must-revalidate"
-            }
-        )
+async def read_root(request: Request):
+    response = web_assets.index(request)
+    if response is not None:
+        return response
     return {"message": "API de delivery apps by Ivam3byCinderella funcionando"}
 
 @app.get("/{full_path:path}")
-async def catch_all(full_path: str):
+async def catch_all(full_path: str, request: Request):
     # 1. Rutas de API y Estáticos del Backend
     if full_path.startswith(("menu", "opciones", "configuracion", "pedidos", "admin/", "upload", "static", "shortlinks")):
         return JSONResponse({"detail": "Not Found"}, status_code=404)
 
-    # 2. Intentar servir archivos estáticos reales del build de Flet (js, css, wasm, etc)
-    file_path = os.path.join("web", full_path)
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        media_type, _ = mimetypes.guess_type(file_path)
-        if file_path.endswith(".js"): media_type = "application/javascript"
-        elif file_path.endswith(".wasm"): media_type = "application/wasm"
-        
-        return FileResponse(
-            file_path, 
-            media_type=media_type,
-            headers={
-                "Cross-Origin-Opener-Policy": "same-origin",
-                "Cross-Origin-Embedder-Policy": "require-corp"
-            }
-        )
+    # 2. Archivos reales del build de Flet (js, wasm, etc.): búsqueda en el índice, sin tocar el disco
+    response = web_assets.respuesta(request, full_path)
+    if response is not None:
+        return response
 
     # 3. REDIRECCIÓN SPA (CRÍTICO): Para cualquier otra ruta (ej: /seguimiento, /admin, /carrito), 
     # incluso si el navegador la pide directamente tras un reload, servimos el index.html.
     # El enrutador interno de Flet leerá la URL y cargará la vista correcta.
-    index_path = "web/index.html"
-    if os.path.exists(index_path):
-        return FileResponse(
-            index_path,
-            headers={
-                "Cross-Origin-Opener-Policy": "same-origin",
-                "Cross-Origin-Embedder-Policy": "require-corp",
-                "Cache-Control": "no-cache, no-store, must-revalidate"
-            }
-        )
+    response = web_assets.index(request)
+    if response is not None:
+        return response
 
     return JSONResponse({"detail": "Frontend not found"}, status_code=404)
@@ -0,0 +1,201 @@
+"""
+Migraciones versionadas del esquema.
+
+Cada migración corre una sola vez por base de datos y queda registrada en la tabla `schema_version`.
+Con el esquema al día, `migrar()` es una sola consulta: no inspecciona tablas ni ejecuta DDL.
+
+    python migrations.py          # aplica las pendientes (paso de despliegue, fuera del proceso web)
+    python migrations.py --estado # muestra las aplicadas y las pendientes
+
+Las migraciones anteriores a esta tabla eran idempotentes (revisan columnas antes de alterarlas),
+así que en una base existente se aplican sin efecto y solo quedan registradas.
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+import models
+from database import engine
+
+schema_version = Table(
+    "schema_version", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("nombre", String),
+    Column("aplicada", DateTime),
+)
+
+# Clave del advisory lock de PostgreSQL: varios workers arrancando a la vez no migran en paralelo
+_PG_LOCK_ID = 81_254_001
+
+
+def _columnas(conn, tabla):
+    return {c["name"] for c in inspect(conn).get_columns(tabla)}
+
+
+def _agregar_columnas(conn, tabla, columnas):
+    existentes = _columnas(conn, tabla)
+    for col, type_def in columnas.items():
+        if col not in existentes:
+            conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN {col} {type_def}"))
+
+
+# --- MIGRACIONES ---
+def _m001_columnas_menu(conn):
+    _agregar_columnas(conn, "menu", {
+        "is_configurable": "INTEGER DEFAULT 0",
+        "is_configurable_salsa": "INTEGER DEFAULT 0",
+        "piezas": "INTEGER DEFAULT 1",
+        "printer_target": "VARCHAR DEFAULT 'cocina'",
+        "grupos_opciones_ids": "TEXT DEFAULT '[]'",
+        "categoria_id": "VARCHAR"
+    })
+
+
+def _m002_tenant_id(conn):
+    for tabla in ["menu", "grupos_opciones", "configuracion", "ordenes", "orden_detalle", "historial_estados"]:
+        if "tenant_id" not in _columnas(conn, tabla):
+            conn.execute(text(f"ALTER TABLE {tabla} ADD COLUMN tenant_id VARCHAR"))
+            # Poblar con valor por defecto solo si se acaba de crear la columna
+            conn.execute(text(f"UPDATE {tabla} SET tenant_id = 'dona_soco' WHERE tenant_id IS NULL"))
+
+
+def _m003_categorias_configuracion(conn):
+    _agregar_columnas(conn, "configuracion", {"categorias_disponibles": "TEXT DEFAULT '[]'"})
+
+
+def _m004_shortlinks_por_tenant(conn):
+    # Quitar la unicidad global de short_code (ahora es única por tenant)
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE short_links DROP CONSTRAINT IF EXISTS short_links_short_code_key"))
+        conn.execute(text("DROP INDEX IF EXISTS ix_short_links_short_code"))
+
+
+def _m005_detalle_platillo(conn):
+    # Sin DEFAULT: las líneas viejas quedan en NULL y el panel resuelve su destino por nombre
+    _agregar_columnas(conn, "orden_detalle", {"menu_id": "INTEGER", "printer_target": "VARCHAR", "opciones": "TEXT"})
+
+
+# Índices que existían en models cuando se escribió 006. Lista fija: los que se declaren después
+# los crea su propia migración (p. ej. 007, 009), así 006 hace lo mismo en cualquier base.
+# ix_ordenes_codigo_seguimiento no está: 007 lo reemplaza por ux_ordenes_tenant_codigo.
+_INDICES_M006 = {
+    "ix_menu_id", "ix_menu_nombre", "ix_menu_tenant_id", "ix_menu_tenant_activo_id",
+    "ix_grupos_opciones_id", "ix_grupos_opciones_nombre", "ix_grupos_opciones_tenant_id",
+    "ix_configuracion_tenant_id",
+    "ix_short_links_id", "ix_short_links_short_code", "ix_short_links_tenant_id",
+    "ix_ordenes_id", "ix_ordenes_tenant_id", "ix_ordenes_tenant_fecha_id",
+    "ix_orden_detalle_id", "ix_orden_detalle_orden_id", "ix_orden_detalle_tenant_id",
+    "ix_historial_estados_id", "ix_historial_estados_orden_id", "ix_historial_estados_tenant_id",
+}
+
+
+def _m006_indices(conn):
+    # Índices declarados en models sobre tablas ya existentes (create_all solo indexa las que crea).
+    # Va después de 004: recrea ix_short_links_short_code, ya sin unicidad.
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in _INDICES_M006:
+                index.create(bind=conn, checkfirst=True)
+
+
+def _m007_codigo_por_tenant(conn):
+    # El código de seguimiento deja de ser único global: pasa a serlo por tenant
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("ALTER TABLE ordenes DROP CONSTRAINT IF EXISTS ordenes_codigo_seguimiento_key"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_ordenes_codigo_seguimiento"))
+    for index in models.Orden.__table__.indexes:
+        if index.name == "ux_ordenes_tenant_codigo":
+            index.create(bind=conn, checkfirst=True)
+
+
+def _m008_clicks_shortlinks(conn):
+    _agregar_columnas(conn, "short_links", {"clicks": "INTEGER DEFAULT 0"})
+
+
+def _m009_clicks_detalle(conn):
+    # Tabla nueva: create_all la crea al correr esta migración pendiente; esto solo la asegura
+    models.ShortLinkClick.__table__.create(bind=conn, checkfirst=True)
+
+
+# (versión, nombre, función). Solo se agregan al final; nunca se reordenan ni se editan las aplicadas.
+MIGRACIONES = [
+    (1, "columnas_menu", _m001_columnas_menu),
+    (2, "tenant_id", _m002_tenant_id),
+    (3, "categorias_configuracion", _m003_categorias_configuracion),
+    (4, "shortlinks_por_tenant", _m004_shortlinks_por_tenant),
+    (5, "detalle_platillo", _m005_detalle_platillo),
+    (6, "indices_consultas", _m006_indices),
+    (7, "codigo_por_tenant", _m007_codigo_por_tenant),
+    (8, "clicks_shortlinks", _m008_clicks_shortlinks),
+    (9, "clicks_detalle", _m009_clicks_detalle),
+]
+VERSION_ACTUAL = MIGRACIONES[-1][0]
+
+
+def _aplicadas(conn):
+    if not inspect(conn).has_table("schema_version"):
+        return set()
+    return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+def esquema_al_dia() -> bool:
+    """Una sola consulta: ¿están aplicadas todas las migraciones?"""
+    try:
+        with engine.connect() as conn:
+            return conn.execute(select(schema_version.c.version).where(schema_version.c.version == VERSION_ACTUAL)).first() is not None
+    except Exception:
+        return False  # La tabla aún no existe
+
+
+def migrar(verbose: bool = True) -> int:
+    """Crea las tablas que falten y aplica las migraciones pendientes, cada una en su transacción."""
+    if esquema_al_dia():
+        return 0
+
+    aplicadas = 0
+    with engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _PG_LOCK_ID})
+            conn.commit()
+        try:
+            models.Base.metadata.create_all(bind=conn)
+            schema_version.create(bind=conn, checkfirst=True)
+            conn.commit()
+
+            # Se relee dentro del lock: otro proceso pudo haber migrado mientras esperábamos
+            hechas = _aplicadas(conn)
+            for version, nombre, funcion in MIGRACIONES:
+                if version in hechas:
+                    continue
+                try:
+                    funcion(conn)
+                    conn.execute(schema_version.insert().values(version=version, nombre=nombre, aplicada=datetime.utcnow()))
+                    conn.commit()
+                    aplicadas += 1
+                    if verbose:
+                        print(f"DEBUG: Migración {version:03d} {nombre} aplicada")
+                except Exception:
+                    conn.rollback()
+                    print(f"❌ ERROR MIGRACION {version:03d} {nombre}")
+                    raise
+        finally:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _PG_LOCK_ID})
+                conn.commit()
+    return aplicadas
+
+
+def estado():
+    with engine.connect() as conn:
+        hechas = _aplicadas(conn)
+    for version, nombre, _ in MIGRACIONES:
+        print(f"{'✔' if version in hechas else '·'} {version:03d} {nombre}")
+
+
+if __name__ == "__main__":
+    if "--estado" in sys.argv:
+        estado()
+    else:
+        n = migrar()
+        print(f"Esquema al día (versión {VERSION_ACTUAL}, {n} migraciones aplicadas ahora)")
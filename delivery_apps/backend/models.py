@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text, UniqueConstraint
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, Float, DateTime, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -23,6 +23,9 @@ class Menu(Base):
     printer_target = Column(String, default="cocina")
     grupos_opciones_ids = Column(Text, default="[]")
 
+    # get_menu: WHERE tenant_id = ? AND is_active = 1 ORDER BY id
+    __table_args__ = (Index("ix_menu_tenant_activo_id", "tenant_id", "is_active", "id"),)
+
 class GrupoOpciones(Base):
     __tablename__ = "grupos_opciones"
     
@@ -57,9 +60,26 @@ class ShortLink(Base):
     tenant_id = Column(String, index=True, default="dona_soco")
     short_code = Column(String, index=True)
     destination_url = Column(String)
+    clicks = Column(Integer, default=0)  # Acumulado por shortlinks.flush(), no por clic
 
     __table_args__ = (UniqueConstraint('tenant_id', 'short_code', name='_tenant_short_code_uc'),)
 
+class ShortLinkClick(Base):
+    # Solo se agregan filas (por lotes desde shortlinks.flush); sin FK: el historial sobrevive al enlace
+    __tablename__ = "short_link_clicks"
+
+    id = Column(Integer, primary_key=True)
+    tenant_id = Column(String)
+    link_id = Column(Integer)
+    fecha = Column(DateTime(timezone=True))  # Momento del clic, no de la escritura
+    referrer = Column(String, nullable=True)
+    agente = Column(String)  # movil | escritorio | bot | desconocido
+
+    __table_args__ = (
+        # Estadísticas: WHERE tenant_id = ? AND link_id = ? AND fecha >= ?
+        Index("ix_short_link_clicks_link_fecha", "tenant_id", "link_id", "fecha"),
+    )
+
 class Orden(Base):
     __tablename__ = "ordenes"
 
@@ -74,21 +94,34 @@ class Orden(Base):
     paga_con = Column(Float, nullable=True)
     fecha = Column(DateTime(timezone=True), server_default=func.now())
     estado = Column(String, default="Nuevo")
-    codigo_seguimiento = Column(String, unique=True, index=True)
+    codigo_seguimiento = Column(String)
     motivo_cancelacion = Column(String, nullable=True)
 
     detalles = relationship("OrdenDetalle", back_populates="orden")
-    historial = relationship("HistorialEstado", back_populates="orden")
+    # Orden de inserción: el último elemento es el estado vigente (el seguimiento lo compara con los eventos)
+    historial = relationship("HistorialEstado", back_populates="orden", order_by="HistorialEstado.id")
+
+    __table_args__ = (
+        # get_pedidos / exportación: WHERE tenant_id = ? ORDER BY fecha DESC, id DESC (keyset sobre fecha, id)
+        Index("ix_ordenes_tenant_fecha_id", "tenant_id", "fecha", "id"),
+        # Códigos únicos por tenant: create_pedido inserta sin consultar antes y reintenta si choca.
+        # También resuelve el seguimiento (tenant_id, codigo_seguimiento).
+        Index("ux_ordenes_tenant_codigo", "tenant_id", "codigo_seguimiento", unique=True),
+    )
 
 class OrdenDetalle(Base):
     __tablename__ = "orden_detalle"
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(String, index=True, default="dona_soco")
-    orden_id = Column(Integer, ForeignKey("ordenes.id"))
+    orden_id = Column(Integer, ForeignKey("ordenes.id"), index=True)
     producto = Column(String)
     cantidad = Column(Integer)
     precio_unitario = Column(Float)
+    # Copiados del platillo al crear el pedido: imprimir y reportar no dependen del menú actual
+    menu_id = Column(Integer, nullable=True)
+    printer_target = Column(String, nullable=True)
+    opciones = Column(Text, default="[]") # JSON: [{"grupo": ..., "selecciones": {opción: cantidad}}]
 
     orden = relationship("Orden", back_populates="detalles")
 
@@ -97,7 +130,7 @@ class HistorialEstado(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(String, index=True, default="dona_soco")
-    orden_id = Column(Integer, ForeignKey("ordenes.id"))
+    orden_id = Column(Integer, ForeignKey("ordenes.id"), index=True)
     nuevo_estado = Column(String)
     fecha = Column(DateTime(timezone=True), server_default=func.now())
 
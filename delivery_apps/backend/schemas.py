@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any
 from datetime import datetime
 
 # --- SCHEMAS DE MENU ---
@@ -43,12 +43,21 @@ class GrupoOpciones(GrupoOpcionesBase):
     class Config:
         from_attributes = True
 
+# --- SCHEMAS DE IMPORTACIÓN MASIVA ---
+class ResultadoImportacion(BaseModel):
+    indice: int               # Posición de la fila en el lote recibido
+    id: Optional[int] = None
+    estado: str               # creado | actualizado | omitido | error
+    detalle: Optional[str] = None
+
 # --- SCHEMAS DE ORDEN ---
 class OrdenDetalleBase(BaseModel):
     tenant_id: Optional[str] = None
     producto: str
     cantidad: int
     precio_unitario: float
+    menu_id: Optional[int] = None
+    opciones: Optional[str] = "[]" # JSON list string
 
 class OrdenDetalleCreate(OrdenDetalleBase):
     # Para recibir detalles extras desde el frontend si es necesario concatenar antes
@@ -58,6 +67,7 @@ class OrdenDetalleCreate(OrdenDetalleBase):
 class OrdenDetalle(OrdenDetalleBase):
     id: int
     orden_id: int
+    printer_target: Optional[str] = None
     class Config:
         from_attributes = True
 
@@ -97,6 +107,15 @@ class PagoUpdate(BaseModel):
     metodo_pago: str
     paga_con: float
 
+class EstadoLote(BaseModel):
+    ids: List[int]
+    nuevo_estado: str
+    motivo: Optional[str] = None  # Obligatorio para "Cancelado"
+
+class ResultadoEstadoLote(BaseModel):
+    actualizados: List[int]
+    rechazados: List[int]  # No existen en el tenant o su estado actual no permite la transición
+
 # --- SCHEMAS DE CONFIGURACION ---
 class ConfiguracionBase(BaseModel):
     tenant_id: Optional[str] = None
@@ -131,9 +150,28 @@ class ShortLinkCreate(ShortLinkBase):
 
 class ShortLink(ShortLinkBase):
     id: int
+    clicks: Optional[int] = 0
     class Config:
         from_attributes = True
 
+class ShortLinkPeriodo(BaseModel):
+    inicio: str  # "2024-05-01" (día) o "2024-05-01 13:00" (hora), en UTC
+    clics: int
+    por_agente: Dict[str, int]  # movil | escritorio | bot | desconocido
+
+class ShortLinkReferrer(BaseModel):
+    referrer: Optional[str] = None  # None = directo (QR, app, enlace pegado)
+    clics: int
+
+class ShortLinkStats(BaseModel):
+    link_id: int
+    short_code: str
+    clicks: int  # Total histórico del enlace
+    intervalo: str
+    desde: datetime
+    periodos: List[ShortLinkPeriodo]
+    referrers: List[ShortLinkReferrer]
+
 # --- SCHEMAS DE AUTH/ADMIN ---
 class LoginRequest(BaseModel):
     password: str
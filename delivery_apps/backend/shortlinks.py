@@ -0,0 +1,204 @@
+"""
+Resolución de enlaces cortos (/r/{tenant}/{code}) desde memoria y registro de clics por lotes.
+
+Los códigos se precargan al arrancar en un solo LRU por (tenant, código) con tope total: el tenant
+viene de la URL pública, así que ni un tenant inventado ni miles de códigos al azar hacen crecer la
+memoria. También se recuerdan los códigos que no existen (una ráfaga sobre un QR mal impreso no llega a
+la DB), pero solo en tenants que tienen enlaces. crud actualiza el LRU al crear, editar o borrar un
+enlace; con varios procesos, el TTL acota cuánto tarda en verse un cambio ajeno.
+
+Cada clic suma al contador del enlace y deja un evento (momento, referrer, tipo de dispositivo) en un
+buffer circular de SHORTLINK_BUFFER_MAX eventos. Un hilo los escribe cada SHORTLINK_FLUSH_SECONDS en una
+transacción: un UPDATE por lote para los contadores y un INSERT multi-fila en short_link_clicks (y al
+terminar el proceso). Si el buffer se llena antes de escribirse se descartan los eventos más viejos; el
+contador no se pierde. Redirigir nunca espera a la DB salvo el primer acceso a un código que no está en
+memoria, y esa consulta corre en el threadpool, no en el event loop.
+"""
+import atexit
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from sqlalchemy import bindparam, func, insert, select, update
+from starlette.concurrency import run_in_threadpool
+
+import models
+from database import SessionLocal
+
+# Códigos recordados en total, de todos los tenants (LRU)
+SHORTLINK_CACHE_MAX = int(os.getenv("SHORTLINK_CACHE_MAX", "10000"))
+SHORTLINK_CACHE_TTL = float(os.getenv("SHORTLINK_CACHE_TTL", "300"))
+# Cada cuántos segundos se escriben los clics acumulados
+SHORTLINK_FLUSH_SECONDS = float(os.getenv("SHORTLINK_FLUSH_SECONDS", "10"))
+# Eventos de clic en memoria entre escrituras (al llenarse se descartan los más viejos)
+SHORTLINK_BUFFER_MAX = int(os.getenv("SHORTLINK_BUFFER_MAX", "10000"))
+
+_BOT = re.compile(r"bot|crawl|spider|slurp|preview|facebookexternalhit|whatsapp|telegram|curl|wget|python-", re.IGNORECASE)
+_MOVIL = re.compile(r"mobile|android|iphone|ipad|ipod", re.IGNORECASE)
+
+# (link_id, destination_url); link_id None = el código no existe en el tenant
+Destino = Tuple[Optional[int], Optional[str]]
+
+
+def clase_agente(user_agent: Optional[str]) -> str:
+    if not user_agent:
+        return "desconocido"
+    if _BOT.search(user_agent):
+        return "bot"  # Incluye las vistas previas de WhatsApp/Telegram al compartir el enlace
+    return "movil" if _MOVIL.search(user_agent) else "escritorio"
+
+
+def referrer_limpio(referrer: Optional[str]) -> Optional[str]:
+    """Origen y ruta del referrer, sin query string (fbclid, tokens): agrupa mejor y no guarda datos ajenos."""
+    if not referrer:
+        return None  # Un QR escaneado llega sin referrer
+    partes = urlsplit(referrer)
+    if not partes.netloc:
+        return None
+    return f"{partes.scheme}://{partes.netloc}{partes.path}"[:255]
+
+
+class ShortLinkResolver:
+    def __init__(self, max_entradas: int = SHORTLINK_CACHE_MAX, ttl: float = SHORTLINK_CACHE_TTL):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._links = OrderedDict()        # (tenant_id, code) -> (expires_at, link_id, url)
+        self._tenants = set()              # Tenants con al menos un enlace conocido
+        self._clicks: Dict[int, int] = {}  # link_id -> clics sin escribir
+        self._eventos = deque(maxlen=SHORTLINK_BUFFER_MAX)  # (fecha, tenant_id, link_id, referrer, agente)
+        self._descartados = 0
+
+    # --- CACHÉ DE CÓDIGOS ---
+    def get(self, tenant_id: str, code: str) -> Optional[Destino]:
+        clave = (tenant_id, code)
+        with self._lock:
+            entrada = self._links.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] < time.monotonic():
+                del self._links[clave]
+                return None
+            self._links.move_to_end(clave)
+            return entrada[1], entrada[2]
+
+    def set(self, tenant_id: str, code: str, link_id: Optional[int], url: Optional[str]):
+        clave = (tenant_id, code)
+        with self._lock:
+            if link_id is not None:
+                self._tenants.add(tenant_id)
+            elif tenant_id not in self._tenants:
+                return  # Fallo en un tenant sin enlaces (o inventado): no ocupa memoria
+            self._links[clave] = (time.monotonic() + self.ttl, link_id, url)
+            self._links.move_to_end(clave)
+            while len(self._links) > self.max_entradas:
+                self._links.popitem(last=False)
+
+    def invalidate(self, tenant_id: str, code: str):
+        with self._lock:
+            self._links.pop((tenant_id, code), None)
+
+    def _cargar(self, tenant_id: str, code: str) -> Destino:
+        db = SessionLocal()
+        try:
+            fila = db.execute(
+                select(models.ShortLink.id, models.ShortLink.destination_url).where(
+                    models.ShortLink.tenant_id == tenant_id,
+                    models.ShortLink.short_code == code
+                )
+            ).first()
+        finally:
+            db.close()
+        destino = (fila.id, fila.destination_url) if fila else (None, None)
+        self.set(tenant_id, code, *destino)
+        return destino
+
+    async def resolver(self, tenant_id: str, code: str) -> Optional[Destino]:
+        """(link_id, url) del código, o None si no existe. Solo un fallo de caché consulta la DB (en el threadpool)."""
+        destino = self.get(tenant_id, code)
+        if destino is None:
+            destino = await run_in_threadpool(self._cargar, tenant_id, code)
+        return destino if destino[0] is not None else None
+
+    def precargar(self):
+        db = SessionLocal()
+        try:
+            filas = db.execute(select(
+                models.ShortLink.tenant_id, models.ShortLink.short_code,
+                models.ShortLink.id, models.ShortLink.destination_url
+            )).all()
+        finally:
+            db.close()
+        for tenant_id, code, link_id, url in filas:
+            self.set(tenant_id, code, link_id, url)
+        return len(filas)
+
+    # --- CLICS ---
+    def registrar_click(self, tenant_id: str, link_id: int, referrer: Optional[str] = None, user_agent: Optional[str] = None):
+        """Cuenta el clic en memoria; no toca la DB."""
+        evento = (datetime.now(timezone.utc), tenant_id, link_id, referrer_limpio(referrer), clase_agente(user_agent))
+        with self._lock:
+            self._clicks[link_id] = self._clicks.get(link_id, 0) + 1
+            if len(self._eventos) == self._eventos.maxlen:
+                self._descartados += 1
+            self._eventos.append(evento)
+
+    def flush(self):
+        """Escribe contadores y eventos acumulados en una transacción. Si falla, se conservan para el siguiente intento."""
+        with self._lock:
+            pendientes, self._clicks = self._clicks, {}
+            eventos, self._eventos = list(self._eventos), deque(maxlen=SHORTLINK_BUFFER_MAX)
+            descartados, self._descartados = self._descartados, 0
+        if descartados:
+            print(f"⚠️ {descartados} eventos de clic descartados: buffer lleno (SHORTLINK_BUFFER_MAX={SHORTLINK_BUFFER_MAX})")
+        if not pendientes and not eventos:
+            return 0
+        tabla = models.ShortLink.__table__
+        db = SessionLocal()
+        try:
+            if pendientes:
+                db.execute(
+                    update(tabla)
+                    .where(tabla.c.id == bindparam("link_id"))
+                    .values(clicks=func.coalesce(tabla.c.clicks, 0) + bindparam("n")),
+                    [{"link_id": link_id, "n": n} for link_id, n in pendientes.items()]
+                )
+            if eventos:
+                db.execute(insert(models.ShortLinkClick.__table__), [
+                    {"fecha": fecha, "tenant_id": tenant_id, "link_id": link_id, "referrer": referrer, "agente": agente}
+                    for fecha, tenant_id, link_id, referrer, agente in eventos
+                ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"ERROR: No se pudieron guardar los clics de enlaces cortos: {e}")
+            with self._lock:
+                for link_id, n in pendientes.items():
+                    self._clicks[link_id] = self._clicks.get(link_id, 0) + n
+                # Los no escritos van primero; si no caben todos, se descartan los más viejos
+                self._eventos = deque(eventos + list(self._eventos), maxlen=SHORTLINK_BUFFER_MAX)
+            return 0
+        finally:
+            db.close()
+        return len(eventos)
+
+    def _ciclo_flush(self):
+        while True:
+            time.sleep(SHORTLINK_FLUSH_SECONDS)
+            self.flush()
+
+    def iniciar(self):
+        try:
+            print(f"DEBUG: {self.precargar()} enlaces cortos precargados")
+        except Exception as e:
+            print(f"⚠️ No se pudieron precargar los enlaces cortos: {e}")
+        threading.Thread(target=self._ciclo_flush, name="shortlinks-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+
+shortlink_resolver = ShortLinkResolver()
@@ -0,0 +1,60 @@
+"""
+Pruebas del bus de eventos de pedidos (events.py).
+
+    cd backend && python -m pytest -q test_events.py
+"""
+import asyncio
+
+from events import OrderEventBus
+
+
+def _suscribir(bus, tenant_id, last_event_id=None):
+    # subscribe() necesita un event loop corriendo (la cola queda ligada a él)
+    async def correr():
+        suscripcion, pendientes, reset, cursor = bus.subscribe(tenant_id, last_event_id)
+        bus.unsubscribe(tenant_id, suscripcion)
+        return pendientes, reset, cursor
+    return asyncio.run(correr())
+
+
+def test_reconexion_sin_eventos_recibidos_reenvia_lo_publicado():
+    bus = OrderEventBus()
+    _, _, cursor = _suscribir(bus, "t1")
+    assert cursor == bus.event_id(0)
+
+    # El cliente se cae antes de su primer evento; mientras tanto entra un pedido
+    bus.publish("t1", "pedido_creado", {"id": 1})
+
+    pendientes, reset, cursor = _suscribir(bus, "t1", cursor)
+    assert [e[1] for e in pendientes] == ["pedido_creado"]
+    assert reset is False
+    assert cursor is None  # Reanuda desde su propio id
+
+
+def test_cursor_inicial_apunta_al_ultimo_evento_del_tenant():
+    bus = OrderEventBus()
+    bus.publish("t1", "pedido_creado", {"id": 1})
+    bus.publish("t1", "estado_actualizado", {"id": 1})
+    bus.publish("t2", "pedido_creado", {"id": 2})
+
+    pendientes, reset, cursor = _suscribir(bus, "t1")
+    assert (pendientes, reset, cursor) == ([], False, bus.event_id(2))
+
+    bus.publish("t1", "pedido_creado", {"id": 3})
+    pendientes, _, _ = _suscribir(bus, "t1", cursor)
+    assert [e[0] for e in pendientes] == [3]
+
+
+def test_id_de_otro_arranque_pide_reset_y_entrega_cursor_nuevo():
+    bus = OrderEventBus()
+    bus.publish("t1", "pedido_creado", {"id": 1})
+
+    pendientes, reset, cursor = _suscribir(bus, "t1", "otroarranque-5")
+    assert (pendientes, reset, cursor) == ([], True, bus.event_id(1))
+
+
+def test_format_sse_lleva_el_id_del_evento():
+    bus = OrderEventBus()
+    bus.publish("t1", "pedido_creado", {"id": 1})
+    pendientes, _, _ = _suscribir(bus, "t1", bus.event_id(0))
+    assert bus.format_sse(pendientes[0]).startswith(f"id: {bus.event_id(1)}\nevent: pedido_creado\n")
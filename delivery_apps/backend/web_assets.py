@@ -0,0 +1,187 @@
+"""
+Servidor del build web de Flet (WEB_DIR) para el backend.
+
+El directorio se indexa una sola vez al arrancar: tipo MIME, tamaño y un ETag fuerte calculado sobre el
+contenido de cada archivo. Por petición solo hay una búsqueda en dict; no se consulta el disco salvo
+para transmitir el archivo.
+
+Compresión: se usan las variantes .br/.gz que ya existan junto al archivo (p. ej. generadas en el build)
+y, con WEB_PRECOMPRESS=1, las que falten se generan en memoria en un hilo de fondo (gzip siempre,
+Brotli si el módulo `brotli` está instalado). Mientras tanto se sirve el archivo sin comprimir.
+
+Caché del navegador:
+- index.html: `no-cache` (se revalida con el ETag en cada visita; apunta al resto del build).
+- Archivos con hash o versión en el nombre: un año, `immutable`.
+- Resto: `no-cache` con ETag (una revalidación 304, sin volver a descargar), o `max-age` con
+  WEB_ASSETS_MAX_AGE > 0 si se acepta servir una versión vieja ese tiempo tras un despliegue.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin él solo se sirve gzip
+    brotli = None
+
+WEB_DIR = os.getenv("WEB_DIR", "web")
+WEB_PRECOMPRESS = os.getenv("WEB_PRECOMPRESS", "1") == "1"
+WEB_ASSETS_MAX_AGE = int(os.getenv("WEB_ASSETS_MAX_AGE", "0"))
+WEB_BROTLI_QUALITY = int(os.getenv("WEB_BROTLI_QUALITY", "9"))
+
+# Extensiones que vale la pena comprimir ("" = sin extensión, p. ej. assets/NOTICES)
+COMPRIMIBLES = {".js", ".mjs", ".wasm", ".json", ".css", ".html", ".txt", ".symbols", ".otf", ".ttf", ".svg", ".map", ".bin", ".d.ts", ""}
+# main.3f2a9c1e.js, chunk-5d41402abc4b2a76.js, micropip-0.8.0-py3-none-any.whl
+_NOMBRE_VERSIONADO = re.compile(r"([.-][0-9a-f]{8,}\.|\.whl$)", re.IGNORECASE)
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+# CanvasKit / Pyodide necesitan aislamiento de origen (SharedArrayBuffer)
+CABECERAS_AISLAMIENTO = {
+    "Cross-Origin-Opener-Policy": "same-origin",
+    "Cross-Origin-Embedder-Policy": "require-corp",
+}
+_MEDIA_TYPES = {".js": "application/javascript", ".mjs": "application/javascript", ".wasm": "application/wasm"}
+# Orden de preferencia cuando el cliente acepta varias
+_CODIFICACIONES = (("br", ".br"), ("gzip", ".gz"))
+
+
+class Asset:
+    __slots__ = ("ruta", "media_type", "etag", "stat", "cache_control", "variantes")
+
+    def __init__(self, ruta, media_type, etag, stat, cache_control):
+        self.ruta = ruta
+        self.media_type = media_type
+        self.etag = etag
+        self.stat = stat
+        self.cache_control = cache_control
+        self.variantes: Dict[str, bytes] = {}  # "br" | "gzip" -> cuerpo comprimido
+
+
+def _extension(nombre: str) -> str:
+    if nombre.endswith(".d.ts"):
+        return ".d.ts"
+    return os.path.splitext(nombre)[1].lower()
+
+
+def _acepta(accept_encoding: str) -> set:
+    """Codificaciones aceptadas por el cliente (las que no traen q=0)."""
+    aceptadas = set()
+    for parte in accept_encoding.split(","):
+        nombre, _, params = parte.partition(";")
+        try:
+            if params.strip().startswith("q=") and float(params.strip()[2:]) == 0:
+                continue
+        except ValueError:
+            pass
+        aceptadas.add(nombre.strip().lower())
+    return aceptadas
+
+
+def _etag_coincide(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidatos = [c.strip().removeprefix("W/") for c in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos
+
+
+class WebAssets:
+    def __init__(self, directorio: str = WEB_DIR):
+        self.directorio = directorio
+        self._assets: Dict[str, Asset] = {}
+
+    def indexar(self):
+        assets = {}
+        if os.path.isdir(self.directorio):
+            for raiz, _, archivos in os.walk(self.directorio):
+                for nombre in archivos:
+                    if nombre.endswith((".br", ".gz")) and os.path.exists(os.path.join(raiz, nombre[:-3])):
+                        continue  # Variante precomprimida: se adjunta a su original
+                    ruta = os.path.join(raiz, nombre)
+                    relativa = os.path.relpath(ruta, self.directorio).replace(os.sep, "/")
+                    assets[relativa] = self._crear_asset(ruta, relativa)
+        self._assets = assets
+        print(f"DEBUG: {len(assets)} archivos web indexados desde {self.directorio}")
+
+    def _crear_asset(self, ruta: str, relativa: str) -> Asset:
+        with open(ruta, "rb") as f:
+            digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+        nombre = os.path.basename(relativa)
+        media_type = _MEDIA_TYPES.get(_extension(nombre)) or mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+        if relativa == "index.html":
+            cache_control = CACHE_REVALIDAR
+        elif _NOMBRE_VERSIONADO.search(nombre):
+            cache_control = CACHE_INMUTABLE
+        elif WEB_ASSETS_MAX_AGE > 0:
+            cache_control = f"public, max-age={WEB_ASSETS_MAX_AGE}"
+        else:
+            cache_control = CACHE_REVALIDAR
+        asset = Asset(ruta, media_type, f'"{digest}"', os.stat(ruta), cache_control)
+        for codificacion, sufijo in _CODIFICACIONES:
+            if os.path.exists(ruta + sufijo):
+                with open(ruta + sufijo, "rb") as f:
+                    asset.variantes[codificacion] = f.read()
+        return asset
+
+    def comprimir(self):
+        """Genera en memoria las variantes que no vinieron precomprimidas en el build."""
+        for asset in list(self._assets.values()):
+            if _extension(asset.ruta) not in COMPRIMIBLES or asset.stat.st_size < 1024:
+                continue
+            faltan = [c for c, _ in _CODIFICACIONES if c not in asset.variantes and (c != "br" or brotli)]
+            if not faltan:
+                continue
+            with open(asset.ruta, "rb") as f:
+                datos = f.read()
+            variantes = dict(asset.variantes)
+            for codificacion in faltan:
+                if codificacion == "br":
+                    cuerpo = brotli.compress(datos, quality=WEB_BROTLI_QUALITY)
+                else:
+                    cuerpo = gzip.compress(datos, compresslevel=9, mtime=0)
+                if len(cuerpo) < len(datos) * 0.9:  # Solo si ahorra algo
+                    variantes[codificacion] = cuerpo
+            asset.variantes = variantes  # Reemplazo atómico: las peticiones ven el dict viejo o el nuevo
+
+    def iniciar(self):
+        self.indexar()
+        if WEB_PRECOMPRESS and self._assets:
+            threading.Thread(target=self.comprimir, name="web-precompress", daemon=True).start()
+
+    def respuesta(self, request: Request, ruta: str) -> Optional[Response]:
+        """Respuesta para `ruta` (relativa al build) o None si no es un archivo del build."""
+        asset = self._assets.get(ruta)
+        if asset is None:
+            return None
+
+        codificacion = None
+        if asset.variantes and not request.headers.get("range"):
+            aceptadas = _acepta(request.headers.get("accept-encoding", ""))
+            codificacion = next((c for c, _ in _CODIFICACIONES if c in asset.variantes and c in aceptadas), None)
+
+        # Cada codificación es una representación distinta: su propio ETag fuerte
+        etag = asset.etag if codificacion is None else f'{asset.etag[:-1]}-{codificacion}"'
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control, **CABECERAS_AISLAMIENTO}
+        if asset.variantes:
+            headers["Vary"] = "Accept-Encoding"
+
+        if _etag_coincide(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if codificacion is not None:
+            headers["Content-Encoding"] = codificacion
+            return Response(content=asset.variantes[codificacion], media_type=asset.media_type, headers=headers)
+        # stat_result ya conocido: FileResponse no vuelve a consultar el disco antes de transmitir
+        return FileResponse(asset.ruta, media_type=asset.media_type, headers=headers, stat_result=asset.stat)
+
+    def index(self, request: Request) -> Optional[Response]:
+        return self.respuesta(request, "index.html")
+
+
+web_assets = WebAssets()
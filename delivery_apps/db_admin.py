@@ -55,6 +55,14 @@ class DBManager:
             print(f"    ⚠️ Detalle error: {r.text}")
         return r.status_code == 200
 
+    def bulk_items(self, items: List[Dict[str, Any]]):
+        """Upsert de todo el lote en una transacción. Devuelve el reporte por fila o None."""
+        r = self.client.post("/menu/bulk", json=items, timeout=120.0)
+        if r.status_code != 200:
+            print(f"    ⚠️ Detalle error: {r.text}")
+            return None
+        return r.json()
+
     # --- UPLOAD ---
     def upload_image(self, file_path: str):
         """Sube una imagen al servidor y devuelve el nombre guardado."""
@@ -108,6 +116,13 @@ class DBManager:
         r = self.client.put(f"/opciones/{group_id}", json=data)
         return r.status_code == 200
 
+    def bulk_groups(self, groups: List[Dict[str, Any]]):
+        r = self.client.post("/opciones/bulk", json=groups, timeout=120.0)
+        if r.status_code != 200:
+            print(f"    ⚠️ Detalle error: {r.text}")
+            return None
+        return r.json()
+
     def delete_group(self, group_id: int):
         r = self.client.delete(f"/opciones/{group_id}")
         return r.status_code == 200
@@ -147,6 +162,13 @@ class DBManager:
         r = self.client.delete(f"/shortlinks/{link_id}")
         return r.status_code == 200
 
+    def get_short_link_stats(self, link_id: int, intervalo: str = "dia", dias: int = 30):
+        r = self.client.get(f"/shortlinks/{link_id}/stats", params={"intervalo": intervalo, "dias": dias})
+        if r.status_code != 200:
+            print(f"❌ Error del API ({r.status_code}): {r.text}")
+            return None
+        return r.json()
+
     def purge_root_webp(self):
         r = self.client.post("/admin/maintenance/purge-root-webp")
         return r.json()
@@ -308,6 +330,10 @@ class AdminShell(cmd.Cmd):
         # 2. Obtener lista de imágenes usadas en el menú
         menu = self.mgr.get_all_menu()
         used_images = {item.get("imagen") for item in menu if item.get("imagen")}
+        # Las variantes (thumb/medium) de una imagen en uso también se conservan
+        used_images |= {
+            f"{os.path.splitext(img)[0]}.{v}.webp" for img in list(used_images) for v in ("thumb", "medium")
+        }
         
         # 3. Identificar archivos a eliminar
         to_delete = []
@@ -375,6 +401,19 @@ class AdminShell(cmd.Cmd):
         except Exception as e:
             print(f"❌ Error crítico durante el backup: {e}")
 
+    def _imprimir_reporte(self, reporte, lote, etiqueta):
+        """Muestra el resultado por fila devuelto por los endpoints /bulk."""
+        if reporte is None:
+            print(f" ❌ Error importando {len(lote)} registros (no se aplicó ningún cambio).")
+            return
+        iconos = {"creado": "✅", "actualizado": "🔄", "omitido": "⏭️ ", "error": "❌"}
+        for r in reporte:
+            nombre = lote[r["indice"]].get("nombre", "?")
+            linea = f" {iconos.get(r['estado'], '•')} {etiqueta} '{nombre}' (ID: {r['id'] or 'auto'}) {r['estado']}."
+            if r.get("detalle"):
+                linea += f" {r['detalle']}"
+            print(linea)
+
     def do_importar(self, arg):
         """Importa/Sincroniza TODO desde un JSON (Menú, Configuración, Grupos): importar [archivo.json]"""
         if not arg:
@@ -406,6 +445,7 @@ class AdminShell(cmd.Cmd):
                 
                 print(f"📦 Grupos actuales en DB: {len(group_id_map)}")
                 
+                lote_grupos = []
                 for g in data["grupos_extras"]:
                     name_clean = g['nombre'].strip().lower()
                     try:
@@ -426,28 +466,13 @@ class AdminShell(cmd.Cmd):
                     if item_id:
                         g_payload["id"] = item_id
 
-                    target_id = None
-                    if item_id and item_id in group_id_map:
-                        target_id = item_id
-                    elif name_clean in group_name_map:
-                        target_id = group_name_map[name_clean]
-                    
-                    if target_id:
-                        if self.mgr.update_group(target_id, g['nombre'], ops, m, o):
-                            print(f" 🔄 Grupo '{g['nombre']}' (ID: {target_id}) actualizado.")
-                        else:
-                            print(f" ❌ Error actualizando grupo '{g['nombre']}'.")
-                    else:
-                        # Para creación, usamos el payload que puede incluir el ID
-                        # Pero el método create_group actual no acepta el payload completo
-                        # Vamos a usar una versión que sí lo haga si es necesario, 
-                        # o simplemente dejar que el manager lo maneje.
-                        # El manager actual: create_group(self, nombre, opciones, multiple=0, obligatorio=0)
-                        # Necesito actualizar el manager también.
-                        if self.mgr.create_group(g['nombre'], ops, m, o, item_id):
-                            print(f" ✅ Grupo '{g['nombre']}' (ID: {item_id or 'auto'}) creado.")
-                        else:
-                            print(f" ❌ Error creando grupo '{g['nombre']}'.")
+                    # Si ya existe por nombre (y no por ID) se manda su ID para que el servidor lo actualice
+                    if not (item_id and item_id in group_id_map) and name_clean in group_name_map:
+                        g_payload["id"] = group_name_map[name_clean]
+                    lote_grupos.append(g_payload)
+
+                # Un solo request y una sola transacción para todo el lote
+                self._imprimir_reporte(self.mgr.bulk_groups(lote_grupos), lote_grupos, "Grupo")
 
             # 3. IMPORTAR MENU
             items_to_import = []
@@ -470,6 +495,7 @@ class AdminShell(cmd.Cmd):
                 print(f"📦 Registros actuales en DB para este tenant: {len(menu_id_map)}")
                 print(f"📥 Procesando {len(items_to_import)} platillos del JSON...")
                 
+                lote_menu = []
                 for item in items_to_import:
                     nombre_clean = item['nombre'].strip().lower()
                     try:
@@ -500,22 +526,12 @@ class AdminShell(cmd.Cmd):
                     if "is_configurable_salsa" not in item_clean: item_clean["is_configurable_salsa"] = 0
                     if "descuento" not in item_clean: item_clean["descuento"] = 0.0
                     
-                    target_id = None
-                    if item_id and item_id in menu_id_map:
-                        target_id = item_id
-                    elif nombre_clean in menu_name_map:
-                        target_id = menu_name_map[nombre_clean]
-
-                    if target_id:
-                        if self.mgr.update_item(target_id, item_clean):
-                            print(f" 🔄 {item_clean['nombre']} (ID: {target_id}) actualizado.")
-                        else:
-                            print(f" ❌ Error actualizando {item_clean['nombre']}.")
-                    else:
-                        if self.mgr.create_item(item_clean):
-                            print(f" ✅ {item_clean['nombre']} (ID: {item_id or 'auto'}) creado.")
-                        else:
-                            print(f" ❌ Error creando {item_clean['nombre']}.")
+                    # Si ya existe por nombre (y no por ID) se manda su ID para que el servidor lo actualice
+                    if not (item_id and item_id in menu_id_map) and nombre_clean in menu_name_map:
+                        item_clean["id"] = menu_name_map[nombre_clean]
+                    lote_menu.append(item_clean)
+
+                self._imprimir_reporte(self.mgr.bulk_items(lote_menu), lote_menu, "Platillo")
             
             print("🏁 Importación finalizada.")
         except Exception as e:
@@ -701,10 +717,10 @@ class AdminShell(cmd.Cmd):
         if not links:
             print("📭 No hay enlaces configurados.")
             return
-        print(f"{ 'ID':<5} | {'Código':<15} | {'URL de Destino'}")
-        print("-" * 75)
+        print(f"{ 'ID':<5} | {'Código':<15} | {'Clics':<7} | {'URL de Destino'}")
+        print("-" * 85)
         for l in links:
-            print(f"{l['id']:<5} | {l['short_code']:<15} | {l['destination_url']}")
+            print(f"{l['id']:<5} | {l['short_code']:<15} | {l.get('clicks') or 0:<7} | {l['destination_url']}")
 
     def do_addlink(self, arg):
         """Crea o actualiza un enlace de redirección: addlink codigo url"""
@@ -749,6 +765,34 @@ class AdminShell(cmd.Cmd):
         else:
             print(f"❌ No se encontró ningún enlace con el código o ID: {arg}")
 
+    def do_linkstats(self, arg):
+        """Clics de un enlace por día u hora: linkstats [id|codigo] [dia|hora] [dias]"""
+        parts = arg.split()
+        if not parts:
+            print("❌ Uso: linkstats [id|codigo] [dia|hora] [dias]")
+            return
+        target_id = int(parts[0]) if parts[0].isdigit() else next(
+            (l['id'] for l in self.mgr.get_short_links() if l.get('short_code') == parts[0]), None
+        )
+        if target_id is None:
+            print(f"❌ No se encontró ningún enlace con el código o ID: {parts[0]}")
+            return
+        intervalo = parts[1] if len(parts) > 1 else "dia"
+        dias = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 30
+        stats = self.mgr.get_short_link_stats(target_id, intervalo, dias)
+        if not stats:
+            return
+        print(f"📊 '{stats['short_code']}': {stats['clicks']} clics en total")
+        if not stats['periodos']:
+            print(f"📭 Sin clics en los últimos {dias} días.")
+        for p in stats['periodos']:
+            agentes = ", ".join(f"{k}: {v}" for k, v in sorted(p['por_agente'].items()))
+            print(f"  {p['inicio']:<16} | {p['clics']:<6} | {agentes}")
+        if stats['referrers']:
+            print("🔗 Referrers:")
+            for r in stats['referrers']:
+                print(f"  {r['clics']:<6} {r['referrer'] or '(directo / QR)'}")
+
     def do_backup(self, arg):
         """Genera un backup local total en JSON: backup [nombre_archivo]"""
         filename = arg if arg else "backup_full.json"
@@ -1,35 +1,243 @@
+"""
+Servidor del build web (build/web) con fallback SPA, para producción.
+
+    python serve_spa.py [PUERTO]          # sirve build/web (puerto 8000 por defecto)
+    python serve_spa.py --precomprimir    # escribe las variantes .gz (y .br con `brotli`) junto al build
+
+- Un hilo por conexión: un cliente lento no detiene a los demás.
+- El directorio se indexa una vez al arrancar (tipo MIME, tamaño, ETag por contenido): por petición
+  solo hay una búsqueda en dict. Las rutas de la app (/seguimiento, /admin...) reciben index.html;
+  un archivo con extensión que no existe recibe 404.
+- Transmisión con sendfile (sin copiar al espacio de Python) y soporte de Range.
+- Variantes .br/.gz precomprimidas del disco; las que falten se generan en memoria en segundo plano.
+- index.html se revalida siempre; los archivos con hash o versión en el nombre son inmutables; el
+  resto se revalida con ETag (304 sin volver a descargar) o usa SPA_MAX_AGE segundos.
+"""
+import gzip
+import hashlib
 import http.server
-import socketserver
+import mimetypes
 import os
+import re
 import sys
+import threading
+from urllib.parse import unquote, urlsplit
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin él solo se sirve gzip
+    brotli = None
 
 # Configuración
-PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+PORT = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 8000
 DIRECTORY = "build/web"
+MAX_AGE = int(os.getenv("SPA_MAX_AGE", "0"))
+LOG = os.getenv("SPA_LOG", "0") == "1"
+
+COMPRIMIBLES = {".js", ".mjs", ".wasm", ".json", ".css", ".html", ".txt", ".symbols", ".otf", ".ttf", ".svg", ".map", ".bin", ""}
+NOMBRE_VERSIONADO = re.compile(r"([.-][0-9a-f]{8,}\.|\.whl$)", re.IGNORECASE)
+TIPOS = {".js": "application/javascript", ".mjs": "application/javascript", ".wasm": "application/wasm"}
+CODIFICACIONES = (("br", ".br"), ("gzip", ".gz"))
+RANGO = re.compile(r"bytes=(\d*)-(\d*)$")
+
+# ruta relativa -> dict(ruta, tipo, tamano, etag, cache, variantes)
+INDICE = {}
+
+
+def cache_control(relativa):
+    if relativa == "index.html":
+        return "no-cache"
+    if NOMBRE_VERSIONADO.search(os.path.basename(relativa)):
+        return "public, max-age=31536000, immutable"
+    return f"public, max-age={MAX_AGE}" if MAX_AGE > 0 else "no-cache"
+
+
+def indexar():
+    for raiz, _, archivos in os.walk(DIRECTORY):
+        for nombre in archivos:
+            ruta = os.path.join(raiz, nombre)
+            if nombre.endswith((".br", ".gz")) and os.path.exists(ruta[:-3]):
+                continue  # Variante de otro archivo
+            relativa = os.path.relpath(ruta, DIRECTORY).replace(os.sep, "/")
+            with open(ruta, "rb") as f:
+                etag = '"' + hashlib.blake2b(f.read(), digest_size=16).hexdigest() + '"'
+            variantes = {}
+            for codificacion, sufijo in CODIFICACIONES:
+                if os.path.exists(ruta + sufijo):
+                    with open(ruta + sufijo, "rb") as f:
+                        variantes[codificacion] = f.read()
+            extension = os.path.splitext(nombre)[1].lower()
+            INDICE[relativa] = {
+                "ruta": ruta,
+                "tipo": TIPOS.get(extension) or mimetypes.guess_type(nombre)[0] or "application/octet-stream",
+                "tamano": os.path.getsize(ruta),
+                "etag": etag,
+                "cache": cache_control(relativa),
+                "variantes": variantes,
+            }
+
+
+def comprimir(datos, codificacion):
+    if codificacion == "br":
+        return brotli.compress(datos, quality=11 if len(datos) < 4 * 1024 * 1024 else 9)
+    return gzip.compress(datos, compresslevel=9, mtime=0)
+
+
+def variantes_faltantes(entrada):
+    if os.path.splitext(entrada["ruta"])[1].lower() not in COMPRIMIBLES or entrada["tamano"] < 1024:
+        return []
+    return [c for c, _ in CODIFICACIONES if c not in entrada["variantes"] and (c != "br" or brotli)]
+
+
+def comprimir_en_memoria():
+    for entrada in list(INDICE.values()):
+        faltan = variantes_faltantes(entrada)
+        if not faltan:
+            continue
+        with open(entrada["ruta"], "rb") as f:
+            datos = f.read()
+        variantes = dict(entrada["variantes"])
+        for codificacion in faltan:
+            cuerpo = comprimir(datos, codificacion)
+            if len(cuerpo) < len(datos) * 0.9:
+                variantes[codificacion] = cuerpo
+        entrada["variantes"] = variantes  # Reemplazo atómico para los hilos que están sirviendo
+
+
+def precomprimir_en_disco():
+    """Escribe las variantes junto a cada archivo: el servidor (y nginx con gzip_static) las toma tal cual."""
+    escritas = 0
+    for entrada in INDICE.values():
+        with open(entrada["ruta"], "rb") as f:
+            datos = f.read()
+        for codificacion in variantes_faltantes(entrada):
+            cuerpo = comprimir(datos, codificacion)
+            if len(cuerpo) < len(datos) * 0.9:
+                with open(entrada["ruta"] + dict(CODIFICACIONES)[codificacion], "wb") as f:
+                    f.write(cuerpo)
+                escritas += 1
+    print(f"{escritas} variantes comprimidas escritas en {DIRECTORY}")
+
 
-class SPARequestHandler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=DIRECTORY, **kwargs)
+def acepta(accept_encoding):
+    aceptadas = set()
+    for parte in accept_encoding.split(","):
+        nombre, _, params = parte.partition(";")
+        try:
+            if params.strip().startswith("q=") and float(params.strip()[2:]) == 0:
+                continue
+        except ValueError:
+            pass
+        aceptadas.add(nombre.strip().lower())
+    return aceptadas
+
+
+class SPARequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive: el build son decenas de archivos
+    timeout = 60  # Una conexión inactiva no retiene su hilo indefinidamente
+
+    def log_message(self, format, *args):
+        if LOG:
+            super().log_message(format, *args)
+
+    def do_HEAD(self):
+        self.servir(con_cuerpo=False)
 
     def do_GET(self):
-        # Intentar obtener el archivo solicitado
-        path = self.translate_path(self.path)
-        
-        # Si el archivo no existe y no tiene extensión (es una ruta de la app)
-        # o si simplemente no existe, servimos index.html
-        if not os.path.exists(path) or os.path.isdir(path):
-            print(f"DEBUG: Ruta '{self.path}' no encontrada, sirviendo index.html")
-            self.path = "/index.html"
-            
-        return super().do_GET()
+        self.servir(con_cuerpo=True)
+
+    def servir(self, con_cuerpo):
+        relativa = unquote(urlsplit(self.path).path).lstrip("/")
+        entrada = INDICE.get(relativa)
+        if entrada is None:
+            if "." in relativa.rsplit("/", 1)[-1]:
+                return self.responder_vacio(404)
+            # Ruta de la app: el enrutador de Flet la resuelve desde index.html
+            entrada = INDICE["index.html"]
+
+        rango = self.headers.get("Range")
+        codificacion = None
+        if entrada["variantes"] and not rango:
+            aceptadas = acepta(self.headers.get("Accept-Encoding", ""))
+            codificacion = next((c for c, _ in CODIFICACIONES if c in entrada["variantes"] and c in aceptadas), None)
+        etag = entrada["etag"] if codificacion is None else entrada["etag"][:-1] + f'-{codificacion}"'
+
+        cabeceras = {
+            "ETag": etag,
+            "Cache-Control": entrada["cache"],
+            # CanvasKit / Pyodide necesitan aislamiento de origen
+            "Cross-Origin-Opener-Policy": "same-origin",
+            "Cross-Origin-Embedder-Policy": "require-corp",
+        }
+        if entrada["variantes"]:
+            cabeceras["Vary"] = "Accept-Encoding"
+
+        no_match = self.headers.get("If-None-Match")
+        if no_match and (etag in [c.strip().removeprefix("W/") for c in no_match.split(",")] or no_match.strip() == "*"):
+            return self.responder_vacio(304, cabeceras)
+
+        if codificacion is not None:
+            cuerpo = entrada["variantes"][codificacion]
+            cabeceras["Content-Encoding"] = codificacion
+            self.enviar_cabeceras(200, entrada["tipo"], len(cuerpo), cabeceras)
+            if con_cuerpo:
+                self.wfile.write(cuerpo)
+            return
+
+        inicio, fin, estado = 0, entrada["tamano"] - 1, 200
+        if rango:
+            m = RANGO.match(rango.strip())
+            if not m or (not m.group(1) and not m.group(2)):
+                return self.responder_vacio(416, {"Content-Range": f"bytes */{entrada['tamano']}"})
+            if m.group(1):
+                inicio = int(m.group(1))
+                fin = min(int(m.group(2)), fin) if m.group(2) else fin
+            else:
+                inicio = max(0, entrada["tamano"] - int(m.group(2)))  # bytes=-N: los últimos N
+            if inicio > fin:
+                return self.responder_vacio(416, {"Content-Range": f"bytes */{entrada['tamano']}"})
+            estado = 206
+            cabeceras["Content-Range"] = f"bytes {inicio}-{fin}/{entrada['tamano']}"
+        cabeceras["Accept-Ranges"] = "bytes"
+
+        self.enviar_cabeceras(estado, entrada["tipo"], fin - inicio + 1, cabeceras)
+        if con_cuerpo and fin >= inicio:
+            with open(entrada["ruta"], "rb") as f:
+                # sendfile: del page cache del kernel al socket, sin pasar por Python
+                self.connection.sendfile(f, offset=inicio, count=fin - inicio + 1)
+
+    def enviar_cabeceras(self, estado, tipo, longitud, cabeceras):
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(longitud))
+        for nombre, valor in cabeceras.items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+
+    def responder_vacio(self, estado, cabeceras=None):
+        self.send_response(estado)
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
 
 # Asegurar que el directorio existe antes de empezar
-if not os.path.exists(DIRECTORY):
+if not os.path.exists(os.path.join(DIRECTORY, "index.html")):
     print(f"ERROR: El directorio {DIRECTORY} no existe. Asegúrate de ejecutar 'flet build web' primero.")
     sys.exit(1)
 
-print(f"Servidor SPA iniciado en el puerto {PORT} sirviendo {DIRECTORY}")
-with socketserver.TCPServer(("", PORT), SPARequestHandler) as httpd:
+indexar()
+
+if "--precomprimir" in sys.argv:
+    precomprimir_en_disco()
+    sys.exit(0)
+
+threading.Thread(target=comprimir_en_memoria, daemon=True).start()
+
+print(f"Servidor SPA iniciado en el puerto {PORT} sirviendo {DIRECTORY} ({len(INDICE)} archivos)")
+with http.server.ThreadingHTTPServer(("", PORT), SPARequestHandler) as httpd:
+    httpd.daemon_threads = True
     try:
         httpd.serve_forever()
     except KeyboardInterrupt:
@@ -1,7 +1,8 @@
 # src/views/carrito.py
 import flet as ft
+import asyncio
 import json
-from database import get_configuracion, get_grupos_opciones
+from database import get_configuracion_async, get_grupos_opciones_async
 
 def create_carrito_view(page: ft.Page, show_snackbar_func, nav):
     """
@@ -103,7 +104,7 @@ def create_carrito_view(page: ft.Page, show_snackbar_func, nav):
                     ),
                     ft.FilledButton(
                         content=ft.Text("Continuar a checkout"), 
-                        on_click=lambda e: _iniciar_proceso_checkout(page, show_snackbar_func, nav),
+                        on_click=lambda e: page.run_task(_iniciar_proceso_checkout, page, show_snackbar_func, nav),
                         style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE)
                     )
                 ],
@@ -180,7 +181,7 @@ def _abrir_dialogo_comentario(e, item_id, page, show_snackbar_func, render_callb
     dlg.open = True
     page.update()
 
-def _iniciar_proceso_checkout(page: ft.Page, show_snackbar_func, nav):
+async def _iniciar_proceso_checkout(page: ft.Page, show_snackbar_func, nav):
     """
     Inicia el flujo de checkout. Verifica items configurables (guisos y salsas).
     """
@@ -197,7 +198,8 @@ def _iniciar_proceso_checkout(page: ft.Page, show_snackbar_func, nav):
     to_configure_guisos = [it for it in items if it.get("is_configurable")]
     to_configure_salsas = [it for it in items if it.get("is_configurable_salsa")]
     
-    config = get_configuracion()
+    # Configuración y grupos de opciones son independientes: se piden a la vez
+    config, all_groups = await asyncio.gather(get_configuracion_async(), get_grupos_opciones_async())
     
     def get_activos(key):
         if config and config[key]:
@@ -211,8 +213,7 @@ def _iniciar_proceso_checkout(page: ft.Page, show_snackbar_func, nav):
     salsas_activas = get_activos('salsas_disponibles')
     
     # --- PROCESO DE GRUPOS DINÁMICOS ---
-    all_groups = get_grupos_opciones() # List of dicts {id, nombre, opciones, ...}
-    
+    # all_groups: List of dicts {id, nombre, opciones, ...}
     # cola de pasos de configuración
     # Cada paso es una tupla: (grupo_obj, items_afectados)
     pasos_dinamicos = []
@@ -273,6 +274,12 @@ def _iniciar_proceso_checkout(page: ft.Page, show_snackbar_func, nav):
     # Iniciar flujo
     ejecutar_paso_dinamico(0)
 
+def _registrar_opciones(item, grupo, counters):
+    """Guarda la selección de un grupo en forma estructurada (además del texto de "details")."""
+    opciones = [o for o in item.get("opciones", []) if o["grupo"] != grupo]
+    opciones.append({"grupo": grupo, "selecciones": {op: c for op, c in counters.items() if c > 0}})
+    item["opciones"] = opciones
+
 def _mostrar_dialogo_generico(page, titulo_grupo, opciones_disponibles, items_to_configure, current_index, show_snackbar_func, final_callback):
     """
     Diálogo genérico para configurar opciones extras (ej: Termino, Verduras).
@@ -351,6 +358,7 @@ def _mostrar_dialogo_generico(page, titulo_grupo, opciones_disponibles, items_to
                 item["_guiso_pieces_needed"] = max(0, item["_guiso_pieces_needed"] - negativas)
 
         res_str = f"{titulo_grupo}: " + ", ".join(detalles_list)
+        _registrar_opciones(item, titulo_grupo, counters)
         
         if item.get("details"):
             item["details"] = f"{item['details']} | {res_str}"
@@ -434,6 +442,7 @@ def _mostrar_dialogo_guisos(page, items_to_configure, current_index, guisos_disp
         for g, c in counters.items():
             if c > 0: detalles_list.append(f"{g} x{c}")
         item["details"] = ", ".join(detalles_list)
+        _registrar_opciones(item, "Guisos", counters)
         dlg.open = False
         page.update()
         _mostrar_dialogo_guisos(page, items_to_configure, current_index + 1, guisos_disponibles, show_snackbar_func, final_callback)
@@ -510,6 +519,7 @@ def _mostrar_dialogo_salsas(page, items_to_configure, current_index, salsas_disp
         for s, c in counters.items():
             if c > 0: detalles_list.append(f"{s} x{c}")
         salsa_str = "Salsas: " + ", ".join(detalles_list)
+        _registrar_opciones(item, "Salsas", counters)
         if item.get("details"):
             item["details"] = f"{item['details']} | {salsa_str}"
         else:
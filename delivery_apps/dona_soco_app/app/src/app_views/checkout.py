@@ -1,10 +1,8 @@
 import flet as ft
-from database import guardar_pedido, get_configuracion
+from database import guardar_pedido_async, get_configuracion, get_async_http_client
 from app_views.menu import cargar_menu
-from components.notifier import init_pubsub # Importar notifier
 import asyncio
 import re
-import httpx
 
 def create_checkout_view(page: ft.Page, show_snackbar, nav):
     """Pantalla donde el usuario ingresa sus datos de envío antes de confirmar el pedido."""
@@ -44,13 +42,12 @@ def create_checkout_view(page: ft.Page, show_snackbar, nav):
 
         try:
             query = f"{calle_field.value}, {cp_field.value}, Mexico"
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://nominatim.openstreetmap.org/search",
-                    params={"q": query, "format": "json", "limit": 1},
-                    headers={"User-Agent": "DonaSocoApp/1.0"}
-                )
-                data = response.json()
+            response = await get_async_http_client().get(
+                "https://nominatim.openstreetmap.org/search",
+                params={"q": query, "format": "json", "limit": 1},
+                headers={"User-Agent": "DonaSocoApp/1.0"}
+            )
+            data = response.json()
 
             if data and len(data) > 0:
                 calle_field.helper = "Dirección localizada ✔"
@@ -270,15 +267,9 @@ def create_checkout_view(page: ft.Page, show_snackbar, nav):
             metodo = metodo_pago_group.value
             paga_con = float(paga_con_field.value) if metodo == "efectivo" else 0.0
             
-            exito, codigo_seguimiento = guardar_pedido(nombre, telefono, direccion_completa, referencias, total_final_confirm, items, metodo, paga_con)
-
-            if exito:
-                # Enviar notificación en tiempo real a los admins
-                try:
-                    pubsub = init_pubsub(page)
-                    pubsub.send_all("nuevo_pedido")
-                except Exception as e:
-                    print(f"Error enviando notificacion: {e}")
+            exito, codigo_seguimiento = await guardar_pedido_async(nombre, telefono, direccion_completa, referencias, total_final_confirm, items, metodo, paga_con)
+
+            # El aviso a los admins lo publica el backend al crear el pedido (/pedidos/eventos)
 
             dlg_content = ft.Column([
                     ft.Text("Tu pedido ha sido enviado correctamente."),
@@ -1,198 +1,276 @@
 # app/src/app_views/menu.py
+import asyncio
+import json
+import unicodedata
 import flet as ft
-from config import IMAGES_URL
-from database import obtener_menu, get_configuracion
+from database import obtener_menu_async, get_configuracion_async, url_imagen
+
+# Espera (segundos) tras la última tecla antes de filtrar el menú
+BUSQUEDA_DEBOUNCE = 0.25
+
+def _normalizar(texto):
+    """Minúsculas y sin acentos: 'Jalapeño' -> 'jalapeno'."""
+    descompuesto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).casefold()
+
+def _tokens_platillo(platillo):
+    return _normalizar(f"{platillo.get('nombre', '')} {platillo.get('descripcion') or ''}").split()
+
+def _coincide(tokens_platillo, tokens_busqueda):
+    # Cada palabra buscada debe ser el inicio de alguna palabra del platillo ("tac" -> "tacos")
+    return all(any(t.startswith(b) for t in tokens_platillo) for b in tokens_busqueda)
 
 def cargar_menu(page: ft.Page):
     """Carga y muestra los platillos del menú con pestañas por categoría."""
     
     user_cart = page.session.cart
-    main_content = ft.Container(expand=True)
+    main_content = ft.Container(
+        content=ft.ProgressRing(), alignment=ft.Alignment(0, 0), expand=True
+    )
     
     # Estado del filtro actual
     current_category = None # None significa 'Todos'
+    config_actual = {}
+    ultima_busqueda = 0
+    # Catálogo activo, cargado una sola vez: [(platillo, tokens normalizados)]
+    indice_menu = []
+    platillos_por_id = {}
 
-    def update_menu_list(search_term="", category=None):
-        nonlocal current_category
-        current_category = category
-        
-        platillos_all = obtener_menu(solo_activos=True, search_term=search_term)
-        
-        # Filtrado por categoría
-        if category:
-            platillos = [p for p in platillos_all if p.get('categoria_id') == category]
-        else:
-            platillos = platillos_all
+    # Caché de controles: id -> tarjeta ya construida. Filtrar solo cambia `visible` y
+    # redimensionar solo toca las propiedades de layout, así Flet manda diffs pequeños
+    # y las imágenes no se vuelven a cargar.
+    tarjetas = {}
+    layout_actual = None
+
+    menu_grid = ft.GridView(
+        expand=True,
+        max_extent=250,
+        spacing=10, run_spacing=10, padding=10
+    )
 
-        platillos.sort(key=lambda x: x.get('descuento', 0) or 0, reverse=True)
+    texto_horario = ft.Text("", size=12, text_align="center", color=ft.Colors.BLACK)
+    sin_servicio = ft.Container(
+        content=ft.Column([
+            ft.Icon(ft.Icons.INFO_OUTLINED, size=40, color=ft.Colors.GREY_500),
+            ft.Text("Sin servicio", weight="bold", color=ft.Colors.BLACK),
+            texto_horario,
+        ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, alignment=ft.MainAxisAlignment.CENTER),
+        alignment=ft.Alignment(0, 0), expand=True, visible=False
+    )
 
-        # Responsive: Ratio y Columnas
+    def calcular_layout():
+        # Responsive: Ratio, Columnas y alto de imagen
         if page.width < 600:
-            current_ratio = 0.65  # Mucho más alto para móviles (evita encimado radicalmente)
-            columns = 2
-            img_height = 80       # Imagen más pequeña en móvil
-        else:
-            current_ratio = 0.8   # Ajustado para evitar superposición en Web/PC
-            columns = 0           # Auto
-            img_height = 110      # Imagen normal en web
-
-        if not platillos:
-            config = get_configuracion()
-            horario = config['horario'] if config else "No disponible"
-            main_content.content = ft.Container(
-                content=ft.Column([
-                    ft.Icon(ft.Icons.INFO_OUTLINED, size=40, color=ft.Colors.GREY_500),
-                    ft.Text("Sin servicio", weight="bold", color=ft.Colors.BLACK),
-                    ft.Text(horario, size=12, text_align="center", color=ft.Colors.BLACK),
-                ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, alignment=ft.MainAxisAlignment.CENTER),
-                alignment=ft.Alignment(0, 0), expand=True
+            # Mucho más alto para móviles (evita encimado radicalmente), imagen más pequeña
+            return 0.65, 2, 80
+        # Ajustado para evitar superposición en Web/PC, columnas automáticas
+        return 0.8, 0, 110
+
+    def revision_platillo(platillo):
+        # Solo los campos que se pintan o que viajan al carrito
+        return tuple(platillo.get(k) for k in (
+            'nombre', 'descripcion', 'precio', 'imagen', 'descuento', 'is_configurable',
+            'is_configurable_salsa', 'piezas', 'grupos_opciones_ids'
+        ))
+
+    # --- LÓGICA DE ACCIONES (Añadir / Cantidad) ---
+    def create_action_buttons(p_id, p_nombre, p_precio, p_img, p_is_conf, p_is_conf_salsa, p_pz, p_g_ids, container_ref):
+        qty = user_cart.get_item_quantity(p_id)
+        
+        if qty == 0:
+            # Botón Agregar inicial
+            return ft.IconButton(
+                icon=ft.Icons.ADD_SHOPPING_CART, 
+                icon_size=20,
+                style=ft.ButtonStyle(bgcolor=ft.Colors.ORANGE_50, shape=ft.CircleBorder()),
+                on_click=lambda e: _on_add_first(e, p_id, p_nombre, p_precio, p_img, p_is_conf, p_is_conf_salsa, p_pz, p_g_ids, container_ref)
             )
         else:
-            menu_grid = ft.GridView(
-                expand=True,
-                runs_count=columns,
-                max_extent=250,
-                child_aspect_ratio=current_ratio,
-                spacing=10, run_spacing=10, padding=10
+            # Selector de cantidad - 1 +
+            return ft.Container(
+                bgcolor=ft.Colors.ORANGE_100,
+                border_radius=20,
+                padding=ft.Padding.symmetric(horizontal=5),
+                content=ft.Row([
+                    ft.IconButton(
+                        icon=ft.Icons.REMOVE, 
+                        icon_size=16, 
+                        icon_color=ft.Colors.ORANGE_900,
+                        on_click=lambda e: _on_change_qty(e, p_id, -1, container_ref)
+                    ),
+                    ft.Text(str(qty), weight="bold", size=14, color=ft.Colors.ORANGE_900),
+                    ft.IconButton(
+                        icon=ft.Icons.ADD, 
+                        icon_size=16, 
+                        icon_color=ft.Colors.ORANGE_900,
+                        on_click=lambda e: _on_change_qty(e, p_id, 1, container_ref)
+                    ),
+                ], spacing=0, alignment=ft.MainAxisAlignment.CENTER)
             )
 
-            for platillo in platillos:
-                pid = platillo['id']
-                nombre = platillo['nombre']
-                descripcion = platillo.get('descripcion', "")
-                precio = platillo['precio']
-                imagen = platillo.get('imagen')
-                descuento = platillo.get('descuento', 0)
-                is_configurable = platillo.get('is_configurable', 0)
-                is_configurable_salsa = platillo.get('is_configurable_salsa', 0)
-                piezas = platillo.get('piezas', 1)
-                grupos_opciones_ids = platillo.get('grupos_opciones_ids', "[]")
-
-                precio_final = precio * (1 - descuento / 100) if descuento > 0 else precio
-
-                # --- LÓGICA DE ACCIONES (Añadir / Cantidad) ---
-                def create_action_buttons(p_id, p_nombre, p_precio, p_img, p_is_conf, p_is_conf_salsa, p_pz, p_g_ids, container_ref):
-                    qty = user_cart.get_item_quantity(p_id)
-                    
-                    if qty == 0:
-                        # Botón Agregar inicial
-                        return ft.IconButton(
-                            icon=ft.Icons.ADD_SHOPPING_CART, 
-                            icon_size=20,
-                            style=ft.ButtonStyle(bgcolor=ft.Colors.ORANGE_50, shape=ft.CircleBorder()),
-                            on_click=lambda e: _on_add_first(e, p_id, p_nombre, p_precio, p_img, p_is_conf, p_is_conf_salsa, p_pz, p_g_ids, container_ref)
-                        )
-                    else:
-                        # Selector de cantidad - 1 +
-                        return ft.Container(
-                            bgcolor=ft.Colors.ORANGE_100,
-                            border_radius=20,
-                            padding=ft.Padding.symmetric(horizontal=5),
-                            content=ft.Row([
-                                ft.IconButton(
-                                    icon=ft.Icons.REMOVE, 
-                                    icon_size=16, 
-                                    icon_color=ft.Colors.ORANGE_900,
-                                    on_click=lambda e: _on_change_qty(e, p_id, -1, container_ref)
-                                ),
-                                ft.Text(str(qty), weight="bold", size=14, color=ft.Colors.ORANGE_900),
-                                ft.IconButton(
-                                    icon=ft.Icons.ADD, 
-                                    icon_size=16, 
-                                    icon_color=ft.Colors.ORANGE_900,
-                                    on_click=lambda e: _on_change_qty(e, p_id, 1, container_ref)
-                                ),
-                            ], spacing=0, alignment=ft.MainAxisAlignment.CENTER)
-                        )
+    def _on_add_first(e, item_id, name, price, img, is_conf, is_conf_salsa, pz, g_ids, container_ref):
+        user_cart.add_item(item_id, name, price, img, is_configurable=is_conf, is_configurable_salsa=is_conf_salsa, piezas=pz, grupos_opciones_ids=g_ids)
+        container_ref.content = create_action_buttons(item_id, name, price, img, is_conf, is_conf_salsa, pz, g_ids, container_ref)
+        page.update()
 
-                def _on_add_first(e, item_id, name, price, img, is_conf, is_conf_salsa, pz, g_ids, container_ref):
-                    user_cart.add_item(item_id, name, price, img, is_configurable=is_conf, is_configurable_salsa=is_conf_salsa, piezas=pz, grupos_opciones_ids=g_ids)
-                    container_ref.content = create_action_buttons(item_id, name, price, img, is_conf, is_conf_salsa, pz, g_ids, container_ref)
-                    page.update()
-
-                def _on_change_qty(e, item_id, delta, container_ref):
-                    current_qty = user_cart.get_item_quantity(item_id)
-                    new_qty = current_qty + delta
-                    user_cart.update_quantity(item_id, new_qty)
-                    
-                    p = next((item for item in platillos if item['id'] == item_id), None)
-                    if p:
-                        container_ref.content = create_action_buttons(
-                            item_id, p['nombre'], p['precio'], p.get('imagen'), 
-                            p.get('is_configurable',0), p.get('is_configurable_salsa',0), 
-                            p.get('piezas',1), p.get('grupos_opciones_ids',"[]"),
-                            container_ref
-                        )
-                    page.update()
-
-                p_display = ft.Column([
-                    ft.Text(f"${precio:.0f}", size=10, color=ft.Colors.GREY, 
-                            style=ft.TextStyle(decoration=ft.TextDecoration.LINE_THROUGH), 
-                            visible=descuento > 0),
-                    ft.Text(f"${precio_final:.0f}", weight="bold", size=14, color=ft.Colors.RED_700 if descuento > 0 else ft.Colors.ORANGE_800)
-                ], spacing=0)
-
-                # Lógica para determinar el origen de la imagen
-                if imagen:
-                    if imagen.startswith(("http://", "https://")):
-                        img_src = imagen
-                    elif "." in imagen and not imagen.startswith("/"):
-                        img_src = f"{IMAGES_URL}/{imagen}"
-                    else:
-                        img_src = f"/{imagen}"
-                else:
-                    img_src = "/icon.png"
-
-                # Contenedor para los botones de acción
-                action_area = ft.Container()
-                action_area.content = create_action_buttons(pid, nombre, precio_final, imagen, is_configurable, is_configurable_salsa, piezas, grupos_opciones_ids, action_area)
-
-                menu_grid.controls.append(
-                    ft.Card(
-                        elevation=3,
-                        content=ft.Container(
-                            padding=8,
-                            content=ft.Column(
-                                alignment=ft.MainAxisAlignment.START,
-                                spacing=4,
-                                controls=[
-                                    ft.Container(
-                                        content=ft.Stack([
-                                            ft.Image(src=img_src, fit="cover", width=1000, height=img_height),
-                                            ft.Container(
-                                                content=ft.Text(f"-{descuento:.0f}%", color="white", size=9, weight="bold"),
-                                                bgcolor=ft.Colors.RED, padding=4, border_radius=ft.BorderRadius.only(top_left=8, bottom_right=8),
-                                                visible=descuento > 0
-                                            )
-                                        ]),
-                                        height=img_height, border_radius=8, clip_behavior=ft.ClipBehavior.HARD_EDGE,
-                                    ),
-                                    ft.Text(nombre, weight=ft.FontWeight.BOLD, size=13, max_lines=2, overflow=ft.TextOverflow.ELLIPSIS, color=ft.Colors.BLACK),
-                                    ft.Text(descripcion or "", size=11, color=ft.Colors.GREY_800, max_lines=4, overflow=ft.TextOverflow.ELLIPSIS),
-                                    ft.Container(expand=True),
-                                    ft.Row(
-                                        alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
-                                        vertical_alignment=ft.CrossAxisAlignment.CENTER,
-                                        controls=[
-                                            p_display,
-                                            action_area
-                                        ]
-                                    )
-                                ]
-                            ),
-                        )
-                    )
+    def _on_change_qty(e, item_id, delta, container_ref):
+        current_qty = user_cart.get_item_quantity(item_id)
+        new_qty = current_qty + delta
+        user_cart.update_quantity(item_id, new_qty)
+        
+        p = platillos_por_id.get(item_id)
+        if p:
+            container_ref.content = create_action_buttons(
+                item_id, p['nombre'], p['precio'], p.get('imagen'), 
+                p.get('is_configurable',0), p.get('is_configurable_salsa',0), 
+                p.get('piezas',1), p.get('grupos_opciones_ids',"[]"),
+                container_ref
+            )
+        page.update()
+
+    def construir_tarjeta(platillo, img_height):
+        pid = platillo['id']
+        nombre = platillo['nombre']
+        descripcion = platillo.get('descripcion', "")
+        precio = platillo['precio']
+        imagen = platillo.get('imagen')
+        descuento = platillo.get('descuento', 0)
+        is_configurable = platillo.get('is_configurable', 0)
+        is_configurable_salsa = platillo.get('is_configurable_salsa', 0)
+        piezas = platillo.get('piezas', 1)
+        grupos_opciones_ids = platillo.get('grupos_opciones_ids', "[]")
+
+        precio_final = precio * (1 - descuento / 100) if descuento > 0 else precio
+
+        p_display = ft.Column([
+            ft.Text(f"${precio:.0f}", size=10, color=ft.Colors.GREY, 
+                    style=ft.TextStyle(decoration=ft.TextDecoration.LINE_THROUGH), 
+                    visible=descuento > 0),
+            ft.Text(f"${precio_final:.0f}", weight="bold", size=14, color=ft.Colors.RED_700 if descuento > 0 else ft.Colors.ORANGE_800)
+        ], spacing=0)
+
+        # Lógica para determinar el origen de la imagen
+        if imagen:
+            if imagen.startswith(("http://", "https://")):
+                img_src = imagen
+            elif "." in imagen and not imagen.startswith("/"):
+                img_src = url_imagen(imagen, "thumb")  # Las tarjetas miden a lo más 250 px
+            else:
+                img_src = f"/{imagen}"
+        else:
+            img_src = "/icon.png"
+
+        # Contenedor para los botones de acción
+        action_area = ft.Container()
+        action_area.content = create_action_buttons(pid, nombre, precio_final, imagen, is_configurable, is_configurable_salsa, piezas, grupos_opciones_ids, action_area)
+
+        imagen_ctrl = ft.Image(src=img_src, fit="cover", width=1000, height=img_height)
+        marco_imagen = ft.Container(
+            content=ft.Stack([
+                imagen_ctrl,
+                ft.Container(
+                    content=ft.Text(f"-{descuento:.0f}%", color="white", size=9, weight="bold"),
+                    bgcolor=ft.Colors.RED, padding=4, border_radius=ft.BorderRadius.only(top_left=8, bottom_right=8),
+                    visible=descuento > 0
                 )
-            main_content.content = menu_grid
+            ]),
+            height=img_height, border_radius=8, clip_behavior=ft.ClipBehavior.HARD_EDGE,
+        )
+
+        card = ft.Card(
+            elevation=3,
+            content=ft.Container(
+                padding=8,
+                content=ft.Column(
+                    alignment=ft.MainAxisAlignment.START,
+                    spacing=4,
+                    controls=[
+                        marco_imagen,
+                        ft.Text(nombre, weight=ft.FontWeight.BOLD, size=13, max_lines=2, overflow=ft.TextOverflow.ELLIPSIS, color=ft.Colors.BLACK),
+                        ft.Text(descripcion or "", size=11, color=ft.Colors.GREY_800, max_lines=4, overflow=ft.TextOverflow.ELLIPSIS),
+                        ft.Container(expand=True),
+                        ft.Row(
+                            alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
+                            vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                            controls=[
+                                p_display,
+                                action_area
+                            ]
+                        )
+                    ]
+                ),
+            )
+        )
+        return {"revision": revision_platillo(platillo), "card": card, "imagen": imagen_ctrl, "marco": marco_imagen}
+
+    def aplicar_layout():
+        """Actualiza solo propiedades de layout; no crea controles."""
+        nonlocal layout_actual
+        layout = calcular_layout()
+        if layout == layout_actual:
+            return False
+        layout_actual = layout
+        current_ratio, columns, img_height = layout
+        menu_grid.child_aspect_ratio = current_ratio
+        menu_grid.runs_count = columns
+        for t in tarjetas.values():
+            t["imagen"].height = img_height
+            t["marco"].height = img_height
+        return True
+
+    def sincronizar_tarjetas(platillos_all):
+        """Reutiliza las tarjetas cuyo (id, revisión) no cambió; solo construye las nuevas o editadas."""
+        nonlocal platillos_por_id
+        if layout_actual is None:
+            aplicar_layout()
+        img_height = layout_actual[2]
+        platillos_por_id = {p['id']: p for p in platillos_all}
+        for pid in list(tarjetas):
+            if pid not in platillos_por_id:
+                del tarjetas[pid]
+        for p in platillos_all:
+            t = tarjetas.get(p['id'])
+            if t is None or t["revision"] != revision_platillo(p):
+                tarjetas[p['id']] = construir_tarjeta(p, img_height)
+
+        # Orden fijo (descuento primero); el filtro solo alterna la visibilidad
+        orden = sorted(platillos_all, key=lambda x: x.get('descuento', 0) or 0, reverse=True)
+        menu_grid.controls = [tarjetas[p['id']]["card"] for p in orden]
+
+    def mostrar_platillos(search_term=""):
+        tokens_busqueda = _normalizar(search_term).split()
+        hay_visibles = False
+        for p, tokens in indice_menu:
+            visible = (not current_category or p.get('categoria_id') == current_category) \
+                and _coincide(tokens, tokens_busqueda)
+            tarjetas[p['id']]["card"].visible = visible
+            hay_visibles = hay_visibles or visible
+
+        texto_horario.value = config_actual.get('horario') or "No disponible"
+        sin_servicio.visible = not hay_visibles
+        menu_grid.visible = hay_visibles
         page.update()
 
+    def update_menu_list(search_term="", category=None):
+        nonlocal current_category
+        current_category = category
+        mostrar_platillos(search_term)
+
     def on_page_resize(e):
-        update_menu_list(search_bar.value)
+        if aplicar_layout():
+            page.update()
 
     page.on_resized = on_page_resize
 
-    def handle_search_change(e):
-        update_menu_list(e.control.value, current_category)
+    async def handle_search_change(e):
+        nonlocal ultima_busqueda
+        # Debounce: solo filtra la última tecla si no llegó otra dentro de la ventana
+        ultima_busqueda += 1
+        busqueda = ultima_busqueda
+        await asyncio.sleep(BUSQUEDA_DEBOUNCE)
+        if busqueda != ultima_busqueda:
+            return
+        update_menu_list(search_bar.value, current_category)
 
     search_bar = ft.TextField(
         label="Buscar...", prefix_icon=ft.Icons.SEARCH,
@@ -221,19 +299,30 @@ def cargar_menu(page: ft.Page):
         categorias_row.controls.clear()
         categorias_row.controls.append(build_category_button("Todos", is_all=True))
         
-        config = get_configuracion()
-        if config and config.get("categorias_disponibles"):
-            import json
+        if config_actual.get("categorias_disponibles"):
             try:
-                cats = json.loads(config["categorias_disponibles"])
+                cats = json.loads(config_actual["categorias_disponibles"])
                 for c in cats:
                     categorias_row.controls.append(build_category_button(c))
             except:
                 pass
         page.update()
 
-    update_menu_list()
-    refresh_categories_ui()
+    async def cargar_datos_iniciales():
+        nonlocal config_actual, indice_menu
+        # Menú y configuración son independientes: se piden a la vez
+        platillos_all, config = await asyncio.gather(
+            obtener_menu_async(solo_activos=True), get_configuracion_async()
+        )
+        config_actual = config or {}
+        # La búsqueda filtra en memoria sobre este índice, sin volver a la API
+        indice_menu = [(p, _tokens_platillo(p)) for p in platillos_all]
+        sincronizar_tarjetas(platillos_all)
+        main_content.content = ft.Column([sin_servicio, menu_grid], expand=True, spacing=0)
+        refresh_categories_ui()
+        mostrar_platillos(search_bar.value or "")
+
+    page.run_task(cargar_datos_iniciales)
 
     return ft.Column(
         expand=True,
@@ -1,11 +1,12 @@
 import flet as ft
+import asyncio
 import os
 import json
 import datetime
 from fpdf import FPDF
 from config import COMPANY_NAME
-from components.notifier import init_pubsub, show_notification
-from database import obtener_pedido_por_codigo, get_configuracion, actualizar_pago_pedido, actualizar_estado_pedido
+from components.notifier import show_notification, suscribir_eventos_pedidos
+from database import obtener_pedido_por_codigo_async, get_configuracion_async, actualizar_pago_pedido_async, actualizar_estado_pedido_async
 
 # Adjust path to DB relative to src/views
 # ... (rest of comments)
@@ -13,7 +14,9 @@ from database import obtener_pedido_por_codigo, get_configuracion, actualizar_pa
 def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
     """Pantalla donde el cliente ve y recibe actualizaciones de un pedido específico."""
 
-    pubsub = init_pubsub(page)
+    # Pedido en pantalla y (telefono, codigo) al que está suscrita la sesión
+    pedido_en_pantalla = None
+    pedido_suscrito = None
     
     # --- LÓGICA DE PLATAFORMA ---
     plat = str(page.platform).lower() if page.platform else ""
@@ -227,16 +230,16 @@ def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
     def show_cancel_order(e, pedido):
         reason_field = ft.TextField(label="¿Por qué deseas cancelar?", multiline=True, hint_text="Ej: Me equivoqué de platillo...", text_style=ft.TextStyle(color=ft.Colors.BLACK))
 
-        def confirm_cancel(e):
+        async def confirm_cancel(e):
             if not reason_field.value.strip():
                 reason_field.error_text = "Por favor, ingresa el motivo."
                 reason_field.update()
                 return
             
-            if actualizar_estado_pedido(pedido['id'], "Cancelado", reason_field.value.strip()):
+            if await actualizar_estado_pedido_async(pedido['id'], "Cancelado", reason_field.value.strip()):
                 dlg_cancel.open = False
                 show_notification(page, "Pedido cancelado exitosamente.", ft.Colors.GREEN)
-                buscar_pedidos(None)
+                await buscar_pedidos(None)
             else:
                 show_notification(page, "Error al cancelar el pedido.", ft.Colors.RED)
                 page.update()
@@ -260,27 +263,28 @@ def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
         dlg_cancel.open = True
         page.update()
 
-    config = get_configuracion()
+    # Se llenan en cargar_datos_iniciales(); los diálogos los leen al abrirse
     contactos = {}
-    if config and 'contactos' in config.keys() and config['contactos']:
-        try:
-            contactos = json.loads(config['contactos'])
-        except:
-            pass
-            
     metodos_pago_config = {"efectivo": True, "terminal": True}
-    if config and 'metodos_pago_activos' in config.keys() and config['metodos_pago_activos']:
-        try:
-            metodos_pago_config = json.loads(config['metodos_pago_activos'])
-        except:
-            pass
-
     tipos_tarjeta = []
-    if config and 'tipos_tarjeta' in config.keys() and config['tipos_tarjeta']:
-        try:
-            tipos_tarjeta = json.loads(config['tipos_tarjeta'])
-        except:
-            pass
+
+    def aplicar_configuracion(config):
+        nonlocal contactos, metodos_pago_config, tipos_tarjeta
+        if config and 'contactos' in config.keys() and config['contactos']:
+            try:
+                contactos = json.loads(config['contactos'])
+            except:
+                pass
+        if config and 'metodos_pago_activos' in config.keys() and config['metodos_pago_activos']:
+            try:
+                metodos_pago_config = json.loads(config['metodos_pago_activos'])
+            except:
+                pass
+        if config and 'tipos_tarjeta' in config.keys() and config['tipos_tarjeta']:
+            try:
+                tipos_tarjeta = json.loads(config['tipos_tarjeta'])
+            except:
+                pass
 
     telefono_guardado = getattr(page.session, "telefono_cliente", "")
     telefono_field = ft.TextField(
@@ -334,7 +338,7 @@ def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
 
         group = ft.RadioGroup(content=ft.Column(opciones), on_change=on_method_change)
 
-        def save_payment(e):
+        async def save_payment(e):
             if not group.value:
                 return
             
@@ -351,10 +355,10 @@ def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
                     page.update()
                     return
             
-            if actualizar_pago_pedido(pedido['id'], group.value, paga_con):
+            if await actualizar_pago_pedido_async(pedido['id'], group.value, paga_con):
                 dlg_pay.open = False
                 show_notification(page, "Método de pago actualizado.", ft.Colors.GREEN)
-                buscar_pedidos(None)
+                await buscar_pedidos(None)
             else:
                 show_notification(page, "Error al actualizar.", ft.Colors.RED)
                 page.update()
@@ -381,7 +385,15 @@ def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
         page.update()
 
     def mostrar_pedido(pedido):
+        nonlocal pedido_en_pantalla, pedido_suscrito
+        pedido_en_pantalla = pedido
         resultado_container.controls.clear()
+        if pedido:
+            clave = (pedido.get('telefono'), pedido.get('codigo_seguimiento'))
+            if clave != pedido_suscrito:
+                # El backend filtra el stream: solo llegan los eventos de este pedido
+                pedido_suscrito = clave
+                suscribir_eventos_pedidos(page, recibir_evento, telefono=clave[0], codigo=clave[1])
         if not pedido:
             resultado_container.controls.append(
                 ft.Text("📭 No se encontró ningún pedido con esos datos.", color=ft.Colors.BLACK)
@@ -473,7 +485,7 @@ def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
         )
         page.update()
 
-    def buscar_pedidos(e):
+    async def buscar_pedidos(e):
         tel = telefono_field.value.strip()
         codigo = codigo_field.value.strip().upper()
 
@@ -485,28 +497,45 @@ def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
         setattr(page.session, "telefono_cliente", tel)
         setattr(page.session, "codigo_seguimiento", codigo)
         
-        pedido = obtener_pedido_por_codigo(tel, codigo)
+        pedido = await obtener_pedido_por_codigo_async(tel, codigo)
         mostrar_pedido(pedido)
-    
-    if getattr(page.session, "telefono_cliente", "") and getattr(page.session, "codigo_seguimiento", ""):
-        buscar_pedidos(None)
 
-    def recibir_mensaje(data):
-        tel = telefono_field.value.strip()
-        codigo = codigo_field.value.strip().upper()
-        
-        if not tel or not codigo:
+    async def cargar_datos_iniciales():
+        tel = getattr(page.session, "telefono_cliente", "")
+        codigo = getattr(page.session, "codigo_seguimiento", "")
+        if tel and codigo:
+            # Configuración y pedido guardado son independientes: se piden a la vez
+            config, pedido = await asyncio.gather(
+                get_configuracion_async(), obtener_pedido_por_codigo_async(tel, codigo)
+            )
+            aplicar_configuracion(config)
+            mostrar_pedido(pedido)
+        else:
+            aplicar_configuracion(await get_configuracion_async())
+
+    async def recibir_evento(tipo, datos):
+        if not pedido_en_pantalla:
             return
-        
-        pedido_actual = obtener_pedido_por_codigo(tel, codigo)
-        if pedido_actual and data.get("telefono") == tel and data.get("orden_id") == pedido_actual["id"]:
-            # Sound logic... (simplified for now)
-            pass
+        if tipo == "reset":
+            # Se perdieron eventos (reinicio del backend o desconexión larga): recargar el pedido
+            mostrar_pedido(await obtener_pedido_por_codigo_async(*pedido_suscrito))
+            return
+        if tipo != "estado_actualizado" or datos.get("orden_id") != pedido_en_pantalla["id"]:
+            return
+
+        historial = pedido_en_pantalla.setdefault("historial", [])
+        if historial and pedido_en_pantalla["estado"] == datos["nuevo_estado"] and historial[-1].get("nuevo_estado") == datos["nuevo_estado"]:
+            return  # Cambio hecho desde esta misma pantalla: ya se recargó
 
-            show_notification(page, f"🔔 Tu pedido #{data['orden_id']} ahora está '{data['nuevo_estado']}'", ft.Colors.BLUE)
-            buscar_pedidos(None)
+        # El evento trae todo lo que cambia: se actualiza el pedido sin volver a pedirlo
+        pedido_en_pantalla["estado"] = datos["nuevo_estado"]
+        pedido_en_pantalla["total"] = datos.get("total", pedido_en_pantalla["total"])
+        pedido_en_pantalla["motivo_cancelacion"] = datos.get("motivo_cancelacion")
+        historial.append({"nuevo_estado": datos["nuevo_estado"], "fecha": datos.get("fecha")})
+        show_notification(page, f"🔔 Tu pedido #{datos['orden_id']} ahora está '{datos['nuevo_estado']}'", ft.Colors.BLUE)
+        mostrar_pedido(pedido_en_pantalla)
 
-    pubsub.subscribe(recibir_mensaje)
+    page.run_task(cargar_datos_iniciales)
 
     return ft.Column([
         ft.Text("📲 Seguimiento de tu pedido", size=24, weight="bold", color=ft.Colors.BLACK),
@@ -520,7 +549,7 @@ def seguimiento_view(page: ft.Page, export_file_picker: ft.FilePicker = None):
                 expand=True,
                 style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE)
             ),
-            ft.IconButton(icon=ft.Icons.REFRESH, on_click=lambda _: buscar_pedidos(None), tooltip="Actualizar estado")
+            ft.IconButton(icon=ft.Icons.REFRESH, on_click=buscar_pedidos, tooltip="Actualizar estado")
         ]),
         ft.Divider(),
         resultado_container
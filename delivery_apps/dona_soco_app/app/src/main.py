@@ -38,7 +38,7 @@ def main(page: ft.Page):
     # --- IMPORTACIONES LOCALES (Optimizan el arranque) ---
     import os
     from flet_core import Audio
-    from database import crear_tablas, verificar_admin_login
+    from database import crear_tablas, verificar_admin_login_async
     from app_views.carrito import create_carrito_view
     from app_views.seguimiento import seguimiento_view
     from app_views.menu import cargar_menu
@@ -138,7 +138,7 @@ def main(page: ft.Page):
     async def validar_clave(e=None):
         nonlocal admin_mode
         clave = admin_field.value.strip()
-        if verificar_admin_login(clave, page=page):
+        if await verificar_admin_login_async(clave, page=page):
             admin_mode = True
             close_dialog()
             show_snackbar("Modo administrador activado")
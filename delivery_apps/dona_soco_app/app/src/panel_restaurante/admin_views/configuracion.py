@@ -1,12 +1,13 @@
 import flet as ft
+import asyncio
 import json
 from database import (
-    get_configuracion,
-    update_configuracion,
-    cambiar_admin_password,
-    get_grupos_opciones,
-    create_grupo_opciones,
-    delete_grupo_opciones
+    get_configuracion_async,
+    update_configuracion_async,
+    cambiar_admin_password_async,
+    get_grupos_opciones_async,
+    create_grupo_opciones_async,
+    delete_grupo_opciones_async
 )
 from components.notifier import show_notification
 
@@ -286,9 +287,8 @@ def configuracion_view(page: ft.Page):
     
     lista_grupos_col = ft.Column(spacing=10)
 
-    def cargar_grupos_opciones():
+    def mostrar_grupos_opciones(grupos):
         lista_grupos_col.controls.clear()
-        grupos = get_grupos_opciones(page=page)
         
         for g in grupos:
             # g: id, nombre, opciones (str json), ...
@@ -307,13 +307,16 @@ def configuracion_view(page: ft.Page):
                         ft.Text(g['nombre'], weight="bold", color=ft.Colors.BLACK),
                         ft.Text(ops_str, size=12, color=ft.Colors.GREY_700),
                     ], expand=True),
-                    ft.IconButton(ft.Icons.DELETE, icon_color=ft.Colors.RED, on_click=lambda e, gid=g['id']: borrar_grupo_click(gid))
+                    ft.IconButton(ft.Icons.DELETE, icon_color=ft.Colors.RED, on_click=lambda e, gid=g['id']: page.run_task(borrar_grupo_click, gid))
                 ])
             )
             lista_grupos_col.controls.append(item)
         page.update()
 
-    def agregar_grupo_click(e):
+    async def cargar_grupos_opciones():
+        mostrar_grupos_opciones(await get_grupos_opciones_async(page=page))
+
+    async def agregar_grupo_click(e):
         if not nombre_grupo_field.value or not opciones_grupo_field.value:
             show_notification(page, "Complete todos los campos del grupo", ft.Colors.RED)
             return
@@ -322,17 +325,17 @@ def configuracion_view(page: ft.Page):
         ops_list = [x.strip() for x in opciones_grupo_field.value.split(",") if x.strip()]
         ops_json = json.dumps(ops_list)
         
-        if create_grupo_opciones(nombre_grupo_field.value, ops_json, page=page):
+        if await create_grupo_opciones_async(nombre_grupo_field.value, ops_json, page=page):
             show_notification(page, "Grupo agregado exitosamente", ft.Colors.GREEN_700)
             nombre_grupo_field.value = ""
             opciones_grupo_field.value = ""
-            cargar_grupos_opciones()
+            await cargar_grupos_opciones()
         else:
             show_notification(page, "Error al crear grupo. Verifique permisos o conexión (API 401?)", ft.Colors.RED)
 
-    def borrar_grupo_click(gid):
-        if delete_grupo_opciones(gid, page=page):
-            cargar_grupos_opciones()
+    async def borrar_grupo_click(gid):
+        if await delete_grupo_opciones_async(gid, page=page):
+            await cargar_grupos_opciones()
             show_notification(page, "Grupo eliminado", ft.Colors.ORANGE)
 
     btn_add_grupo = ft.FilledButton("Agregar Grupo", icon=ft.Icons.ADD, on_click=agregar_grupo_click, style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE))
@@ -348,8 +351,7 @@ def configuracion_view(page: ft.Page):
     )
     page.overlay.append(success_dialog)
 
-    def cargar_datos():
-        config = get_configuracion(page=page)
+    def mostrar_datos(config):
         if not config:
             return
 
@@ -417,7 +419,7 @@ def configuracion_view(page: ft.Page):
 
     # --------- RESTO DEL CÓDIGO ORIGINAL (BOTONES INTACTOS) ---------
 
-    def guardar_click(e):
+    async def guardar_click(e):
         pagos_json = json.dumps(
             {"efectivo": pago_efectivo_chk.value, "terminal": pago_terminal_chk.value}
         )
@@ -454,7 +456,7 @@ def configuracion_view(page: ft.Page):
         except:
             c_envio = 20.0
 
-        if update_configuracion(
+        if await update_configuracion_async(
             horario_field.value,
             codigos_postales_field.value,
             pagos_json,
@@ -471,12 +473,12 @@ def configuracion_view(page: ft.Page):
         else:
             show_notification(page, "Error al guardar configuración", ft.Colors.RED)
 
-    def cambiar_pass_click(e):
+    async def cambiar_pass_click(e):
         if new_password_field.value != confirm_password_field.value:
             show_notification(page, "Las contraseñas no coinciden", ft.Colors.RED)
             return
 
-        if cambiar_admin_password(new_password_field.value, page=page):
+        if await cambiar_admin_password_async(new_password_field.value, page=page):
             show_notification(page, "Contraseña actualizada", ft.Colors.GREEN_700)
             new_password_field.value = ""
             confirm_password_field.value = ""
@@ -506,8 +508,15 @@ def configuracion_view(page: ft.Page):
         ),
     )
 
-    cargar_datos()
-    cargar_grupos_opciones() # Cargar al inicio
+    async def cargar_datos_iniciales():
+        # Configuración y grupos de opciones son independientes: se piden a la vez
+        config, grupos = await asyncio.gather(
+            get_configuracion_async(page=page), get_grupos_opciones_async(page=page)
+        )
+        mostrar_datos(config)
+        mostrar_grupos_opciones(grupos)
+
+    page.run_task(cargar_datos_iniciales) # Cargar al inicio
 
     content_container = ft.Container(
         content=ft.Column(
@@ -1,14 +1,11 @@
 import flet as ft
 import json
-from database import obtener_pedidos, obtener_total_pedidos, actualizar_estado_pedido, actualizar_pago_pedido, obtener_datos_exportacion, obtener_menu, get_configuracion
+from database import obtener_pagina_pedidos_async, actualizar_estado_pedido_async, actualizar_estado_pedidos_async, obtener_url_exportacion_async, descargar_exportacion_async, obtener_menu_async, get_configuracion_async
 from config import COMPANY_NAME
-from components.notifier import init_pubsub, play_notification_sound, show_notification # Importar herramientas de notificación
+from components.notifier import play_notification_sound, show_notification, suscribir_eventos_pedidos # Importar herramientas de notificación
 import math
-import csv
 import datetime
-import io
 import os
-import openpyxl
 from fpdf import FPDF
 
 def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
@@ -18,6 +15,14 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
     rows_per_page = 12 
     current_page = 1
     total_pages = 1
+    # Paginación keyset: cursor (id del último pedido de la página anterior) con el que inicia cada página
+    page_cursors = [None]
+    last_id_on_page = None
+    # Pedidos de la página visible y total filtrado: los eventos los actualizan sin volver a pedirlos
+    pedidos_en_pagina = []
+    total_pedidos = 0
+    # Ids marcados para el cambio de estado en lote (se conservan al cambiar de página)
+    seleccionados = set()
     
     search_filter = ft.TextField(
         hint_text="Buscar por Cliente o Código",
@@ -126,83 +131,48 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
 
     async def iniciar_exportacion(extension="csv"):
         print(f"DEBUG: Iniciando exportación {extension}")
-        show_notification(page, f"Generando datos {extension.upper()}...", ft.Colors.BLUE_GREY_700)
+        show_notification(page, f"Generando reporte {extension.upper()}...", ft.Colors.BLUE_GREY_700)
 
         try:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
             search_term = search_filter.value.strip() if search_filter.value else None
+            # El backend arma y transmite el archivo; aquí solo se abre o se descarga la URL
+            url = await obtener_url_exportacion_async(formato=extension, search_term=search_term, page=page)
+            if not url:
+                raise Exception("No se pudo generar el enlace de descarga")
+
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"reporte_{timestamp}.{extension}"
             
-            print("DEBUG: Consultando base de datos...")
-            datos = obtener_datos_exportacion(search_term=search_term, page=page)
-            
-            headers = [
-                "Orden ID", "Código", "Fecha", "Cliente", "Teléfono", "Dirección", "Referencias", 
-                "Estado", "Método Pago", "Paga Con", "Total Orden", "Motivo Cancelación",
-                "Producto", "Cantidad", "Precio Unitario", "Subtotal Producto"
-            ]
-            
-            content_bytes = None
-            file_ext = extension
-            mime = "text/csv"
-
-            if extension == "csv":
-                output = io.StringIO()
-                writer = csv.writer(output)
-                writer.writerow(headers)
-                for row in datos:
-                    writer.writerow(list(row.values()))
-                content_bytes = output.getvalue().encode('utf-8')
-                output.close()
-                file_ext = "csv"
-                mime = "text/csv"
-            elif extension == "xlsm":
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = "Detalle de Ordenes"
-                ws.append(headers)
-                for row in datos:
-                    ws.append(list(row.values()))
-                output = io.BytesIO()
-                wb.save(output)
-                content_bytes = output.getvalue()
-                output.close()
-                file_ext = "xlsx" 
-                mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            # --- SELECTOR DE ESTRATEGIA ---
+            plat = str(page.platform).lower() if page.platform else ""
+            es_web = page.web
             
-            if content_bytes:
-                filename = f"reporte_{timestamp}.{file_ext}"
-                
-                # --- SELECTOR DE ESTRATEGIA ---
-                plat = str(page.platform).lower() if page.platform else ""
-                es_web = page.web
-                
-                # 1. Escritura Directa para Escritorio Nativo
-                if plat in ["windows", "macos", "linux"] and not es_web:
-                    try:
-                        ruta_descargas = os.path.join(os.path.expanduser("~"), "Downloads", filename)
-                        with open(ruta_descargas, "wb") as f:
-                            f.write(content_bytes)
-                        show_notification(page, f"Reporte guardado en Descargas.", ft.Colors.GREEN)
-                        return
-                    except Exception as e:
-                        print(f"DEBUG: Fallo guardado directo en PC: {e}")
-
-                # 2. Descarga Directa para Web (Solución al bloqueo de FilePicker)
-                if es_web:
-                    print("DEBUG: Usando descarga Base64 (Web).")
-                    await descargar_archivo_web(filename, content_bytes, mime)
-                elif plat in ["windows", "macos", "linux"]:
-                    # Fallback FilePicker para escritorio nativo si falló el directo
-                    await file_picker.save_file(
-                        file_name=filename,
-                        allowed_extensions=[file_ext],
-                        src_bytes=content_bytes
-                    )
-                else:
-                    print("DEBUG: Modo Móvil Nativo detectado. Usando Escritura Directa.")
-                    guardar_archivo_android(filename, content_bytes)
+            # 1. Web: el navegador descarga directamente del backend
+            if es_web:
+                await page.launch_url(url, web_popup_window_name="_self")
+                show_notification(page, f"Descarga iniciada: {filename}", ft.Colors.GREEN)
+                return
+
+            # 2. Escritorio / Móvil Nativo: escritura directa por bloques
+            if plat in ["windows", "macos", "linux"]:
+                rutas_a_probar = [os.path.join(os.path.expanduser("~"), "Downloads", filename)]
             else:
-                raise Exception("No se encontraron datos")
+                rutas_a_probar = [os.path.join("/storage/emulated/0/Download", filename)]
+            rutas_a_probar.append(os.path.join(os.getcwd(), filename))
+
+            for ruta in rutas_a_probar:
+                try:
+                    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                except Exception as e:
+                    print(f"DEBUG: Fallo al preparar {ruta}: {e}")
+                    continue
+                if await descargar_exportacion_async(url, ruta):
+                    if plat in ["windows", "macos", "linux"]:
+                        show_notification(page, f"Reporte guardado en {ruta}", ft.Colors.GREEN)
+                    else:
+                        mostrar_exito_android(ruta)
+                    return
+            mostrar_error("No se pudo guardar el archivo. Verifique permisos de almacenamiento.")
 
         except Exception as ex:
             print(f"DEBUG ERROR: {ex}")
@@ -213,12 +183,13 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
         show_notification(page, "Iniciando impresión masiva...", ft.Colors.BLUE)
 
         try:
-            # 1. Obtener mapa de productos para saber destino
-            # Nota: Esto trae todo el menú. En producción optimizar con caché o mapa estático.
-            menu_items = obtener_menu(solo_activos=False, page=page)
-            # Map: "Nombre Producto" -> "cocina" | "foodtruck"
-            # Normalizamos nombres para evitar fallos por espacios
-            product_map = { m['nombre'].strip().lower(): m.get('printer_target', 'cocina') for m in menu_items }
+            # 1. Destino de cada línea: los pedidos llegan con printer_target desde el backend.
+            # Solo si falta (pedidos viejos) se recupera por nombre contra el menú.
+            product_map = {}
+            if any(not item.get('printer_target') for item in pedido.get('detalles', [])):
+                menu_items = await obtener_menu_async(solo_activos=False, page=page)
+                # Map: "Nombre Producto" -> "cocina" | "foodtruck"
+                product_map = { m['nombre'].strip().lower(): m.get('printer_target', 'cocina') for m in menu_items }
             
             # 2. Clasificar items del pedido
             # pedido['detalles'] es la lista de objetos dict con keys: producto, cantidad, precio_unitario
@@ -233,7 +204,7 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
                 nombre_full = item['producto']
                 nombre_base = nombre_full.split("(")[0].strip().lower()
                 
-                target = product_map.get(nombre_base, 'cocina') # Default a cocina si no se encuentra
+                target = item.get('printer_target') or product_map.get(nombre_base, 'cocina') # Default a cocina si no se encuentra
                 
                 if target == 'foodtruck':
                     items_foodtruck.append(item)
@@ -292,7 +263,7 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
 
         try:
             # Obtener configuración para el pie de página
-            config = get_configuracion(page=page)
+            config = await get_configuracion_async(page=page)
             contactos = {}
             if config and 'contactos' in config.keys() and config['contactos']:
                 try:
@@ -407,10 +378,12 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
     async def export_csv_click(e):
         await iniciar_exportacion("csv")
 
-    async def export_xlsm_click(e):
-        await iniciar_exportacion("xlsm")
+    async def export_xlsx_click(e):
+        await iniciar_exportacion("xlsx")
 
     pedidos_data_table = ft.DataTable(
+        show_checkbox_column=True,
+        on_select_all=lambda e: seleccionar_pagina(e),
         heading_row_color=ft.Colors.ORANGE_100,
         heading_row_height=60,
         columns=[
@@ -489,10 +462,10 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
         confirmation_dialog.open = False
         page.update()
 
-    def confirm_status_change(e, pedido_id, new_status, motivo=None):
-        actualizar_estado_pedido(pedido_id, new_status, motivo, page=page)
+    async def confirm_status_change(e, pedido_id, new_status, motivo=None):
+        await actualizar_estado_pedido_async(pedido_id, new_status, motivo, page=page)
         close_confirmation_dialog()
-        cargar_pedidos()
+        await cargar_pedidos()
         show_notification(page, f"Estado actualizado a {new_status}", ft.Colors.GREEN)
 
     confirmation_dialog = ft.AlertDialog(
@@ -505,12 +478,12 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
 
     def open_status_dialog(e, pedido):
         def set_status(status):
-            return lambda e: confirm_status_change(e, pedido['id'], status)
+            return lambda e: page.run_task(confirm_status_change, e, pedido['id'], status)
 
         def show_cancel_reason_dialog(e):
             reason_field = ft.TextField(label="Motivo de cancelación", multiline=True, autofocus=True, text_style=ft.TextStyle(color=ft.Colors.BLACK))
             
-            def confirm_cancel(e):
+            async def confirm_cancel(e):
                 if not reason_field.value or not reason_field.value.strip():
                     reason_field.error_text = "Debes ingresar un motivo"
                     reason_field.update()
@@ -521,7 +494,7 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
                 page.update()
                 
                 # Luego procesar el cambio que cierra el diálogo principal
-                confirm_status_change(None, pedido['id'], "Cancelado", reason_field.value.strip())
+                await confirm_status_change(None, pedido['id'], "Cancelado", reason_field.value.strip())
 
             cancel_dialog = ft.AlertDialog(
                 title=ft.Text("Confirmar Cancelación", color=ft.Colors.BLACK),
@@ -559,88 +532,216 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
         page.update()
 
     txt_page_info = ft.Text("Página 1 de 1", color=ft.Colors.BLACK)
+
+    # --- SELECCIÓN MÚLTIPLE Y CAMBIO DE ESTADO EN LOTE ---
+    def alternar_seleccion(pedido_id):
+        if pedido_id in seleccionados:
+            seleccionados.discard(pedido_id)
+        else:
+            seleccionados.add(pedido_id)
+        pintar_tabla()
+
+    def seleccionar_pagina(e):
+        ids_pagina = {p['id'] for p in pedidos_en_pagina}
+        if ids_pagina and ids_pagina <= seleccionados:
+            seleccionados.difference_update(ids_pagina)
+        else:
+            seleccionados.update(ids_pagina)
+        pintar_tabla()
+
+    def limpiar_seleccion(e=None):
+        seleccionados.clear()
+        pintar_tabla()
+
+    async def aplicar_estado_lote(nuevo_estado, motivo=None):
+        # Una sola petición y una transacción en el backend; la tabla se actualiza en el lugar
+        resultado = await actualizar_estado_pedidos_async(sorted(seleccionados), nuevo_estado, motivo, page=page)
+        if resultado is None:
+            show_notification(page, "No se pudo actualizar el estado de los pedidos.", ft.Colors.RED)
+            return
+
+        actualizados = set(resultado['actualizados'])
+        for p in pedidos_en_pagina:
+            if p['id'] in actualizados:
+                p['estado'] = nuevo_estado
+                if nuevo_estado == "Cancelado":
+                    p['total'] = 0.0
+                    p['motivo_cancelacion'] = motivo
+        seleccionados.clear()
+        pintar_tabla()
+
+        mensaje = f"{len(actualizados)} pedido(s) → {nuevo_estado}"
+        if resultado['rechazados']:
+            mensaje += f" · {len(resultado['rechazados'])} no permitido(s) por su estado actual"
+        show_notification(page, mensaje, ft.Colors.GREEN if actualizados else ft.Colors.ORANGE_800)
+
+    def estado_lote(nuevo_estado):
+        return lambda e: page.run_task(aplicar_estado_lote, nuevo_estado)
+
+    motivo_lote = ft.TextField(label="Motivo de cancelación", multiline=True, text_style=ft.TextStyle(color=ft.Colors.BLACK))
+
+    async def confirmar_cancelacion_lote(e):
+        if not motivo_lote.value or not motivo_lote.value.strip():
+            motivo_lote.error_text = "Debes ingresar un motivo"
+            motivo_lote.update()
+            return
+        cancel_lote_dialog.open = False
+        page.update()
+        await aplicar_estado_lote("Cancelado", motivo_lote.value.strip())
+
+    cancel_lote_dialog = ft.AlertDialog(
+        title=ft.Text("Cancelar pedidos seleccionados", color=ft.Colors.BLACK),
+        content=ft.Container(content=motivo_lote, height=150),
+        actions=[
+            ft.TextButton("Volver", on_click=lambda e: setattr(cancel_lote_dialog, "open", False) or page.update(), style=ft.ButtonStyle(color=ft.Colors.BROWN_700)),
+            ft.FilledButton("Confirmar", on_click=confirmar_cancelacion_lote, style=ft.ButtonStyle(bgcolor=ft.Colors.RED, color=ft.Colors.WHITE))
+        ]
+    )
+    page.overlay.append(cancel_lote_dialog)
+
+    def abrir_cancelacion_lote(e):
+        motivo_lote.value = ""
+        motivo_lote.error_text = None
+        cancel_lote_dialog.open = True
+        page.update()
+
+    txt_seleccion = ft.Text("", weight="bold", color=ft.Colors.BLACK)
+    barra_lote = ft.Row(
+        [
+            txt_seleccion,
+            ft.FilledButton("Preparando", on_click=estado_lote("Preparando"), style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE)),
+            ft.FilledButton("En Camino", on_click=estado_lote("En Camino"), style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE)),
+            ft.FilledButton("Entregado", on_click=estado_lote("Entregado"), style=ft.ButtonStyle(bgcolor=ft.Colors.GREEN_700, color=ft.Colors.WHITE)),
+            ft.FilledButton("Cancelar", on_click=abrir_cancelacion_lote, style=ft.ButtonStyle(bgcolor=ft.Colors.RED, color=ft.Colors.WHITE)),
+            ft.TextButton("Quitar selección", on_click=limpiar_seleccion, style=ft.ButtonStyle(color=ft.Colors.BROWN_700)),
+        ],
+        visible=False, wrap=True, spacing=10
+    )
     
-    def change_page(delta):
+    async def change_page(delta):
         nonlocal current_page
         new_page = current_page + delta
         if 1 <= new_page <= total_pages:
+            if delta > 0:
+                del page_cursors[new_page - 1:]
+                page_cursors.append(last_id_on_page)
             current_page = new_page
-            cargar_pedidos()
-
-    btn_prev = ft.IconButton(icon=ft.Icons.ARROW_BACK, icon_color=ft.Colors.BLACK, on_click=lambda e: change_page(-1))
-    btn_next = ft.IconButton(icon=ft.Icons.ARROW_FORWARD, icon_color=ft.Colors.BLACK, on_click=lambda e: change_page(1))
+            await cargar_pedidos()
+
+    async def reiniciar_paginacion():
+        nonlocal current_page, page_cursors
+        current_page = 1
+        page_cursors = [None]
+        await cargar_pedidos()
+
+    btn_prev = ft.IconButton(icon=ft.Icons.ARROW_BACK, icon_color=ft.Colors.BLACK, on_click=lambda e: page.run_task(change_page, -1))
+    btn_next = ft.IconButton(icon=ft.Icons.ARROW_FORWARD, icon_color=ft.Colors.BLACK, on_click=lambda e: page.run_task(change_page, 1))
+
+    def construir_fila(p):
+        es_cancelado = str(p['estado']).lower() == "cancelado"
+        return ft.DataRow(
+            selected=p['id'] in seleccionados,
+            on_select_change=lambda e, pid=p['id']: alternar_seleccion(pid),
+            cells=[
+                ft.DataCell(ft.Text(str(p['id']), color=ft.Colors.BLACK)),
+                ft.DataCell(ft.Text(p['codigo_seguimiento'], color=ft.Colors.BLACK)),
+                ft.DataCell(ft.Text(p['nombre_cliente'], color=ft.Colors.BLACK)),
+                ft.DataCell(ft.Text(str(p['fecha']), color=ft.Colors.BLACK)),
+                ft.DataCell(ft.Text(f"${p['total']:.2f}", color=ft.Colors.BLACK)),
+                ft.DataCell(ft.Text(str(p['metodo_pago']).capitalize(), color=ft.Colors.BLACK)),
+                ft.DataCell(ft.Text(p['estado'], color=ft.Colors.BLACK)),
+                ft.DataCell(ft.Row([
+                    ft.IconButton(ft.Icons.VISIBILITY, icon_color=ft.Colors.BLUE_GREY_700, on_click=lambda e, p=p: open_details_dialog(e, p)),
+                    ft.IconButton(
+                        ft.Icons.EDIT, 
+                        icon_color=ft.Colors.GREY_400 if es_cancelado else ft.Colors.BLUE_GREY_700, 
+                        disabled=es_cancelado, 
+                        on_click=lambda e, p=p: open_status_dialog(e, p)
+                    ),
+                    ft.IconButton(ft.Icons.PRINT, icon_color=ft.Colors.BLUE, tooltip="Imprimir Tickets (Cocina/Foodtruck)", on_click=print_handler(p)),
+                    ft.IconButton(ft.Icons.PICTURE_AS_PDF, icon_color=ft.Colors.RED_700, on_click=create_pdf_handler(p))
+                ])),
+            ]
+        )
 
-    def cargar_pedidos():
-        nonlocal current_page, total_pages
-        search_term = search_filter.value.strip() if search_filter.value else None
-        
-        total_items = obtener_total_pedidos(search_term=search_term, page=page)
-        
-        total_pages = math.ceil(total_items / rows_per_page) if total_items > 0 else 1
-        current_page = max(1, min(current_page, total_pages))
-        
-        offset = (current_page - 1) * rows_per_page
-        
-        pedidos = obtener_pedidos(limit=rows_per_page, offset=offset, search_term=search_term, page=page)
-        
-        pedidos_data_table.rows.clear()
-        for p in pedidos:
-            es_cancelado = str(p['estado']).lower() == "cancelado"
-            pedidos_data_table.rows.append(
-                ft.DataRow(cells=[
-                    ft.DataCell(ft.Text(str(p['id']), color=ft.Colors.BLACK)),
-                    ft.DataCell(ft.Text(p['codigo_seguimiento'], color=ft.Colors.BLACK)),
-                    ft.DataCell(ft.Text(p['nombre_cliente'], color=ft.Colors.BLACK)),
-                    ft.DataCell(ft.Text(str(p['fecha']), color=ft.Colors.BLACK)),
-                    ft.DataCell(ft.Text(f"${p['total']:.2f}", color=ft.Colors.BLACK)),
-                    ft.DataCell(ft.Text(str(p['metodo_pago']).capitalize(), color=ft.Colors.BLACK)),
-                    ft.DataCell(ft.Text(p['estado'], color=ft.Colors.BLACK)),
-                    ft.DataCell(ft.Row([
-                        ft.IconButton(ft.Icons.VISIBILITY, icon_color=ft.Colors.BLUE_GREY_700, on_click=lambda e, p=p: open_details_dialog(e, p)),
-                        ft.IconButton(
-                            ft.Icons.EDIT, 
-                            icon_color=ft.Colors.GREY_400 if es_cancelado else ft.Colors.BLUE_GREY_700, 
-                            disabled=es_cancelado, 
-                            on_click=lambda e, p=p: open_status_dialog(e, p)
-                        ),
-                        ft.IconButton(ft.Icons.PRINT, icon_color=ft.Colors.BLUE, tooltip="Imprimir Tickets (Cocina/Foodtruck)", on_click=print_handler(p)),
-                        ft.IconButton(ft.Icons.PICTURE_AS_PDF, icon_color=ft.Colors.RED_700, on_click=create_pdf_handler(p))
-                    ])),
-                ])
-            )
+    def pintar_tabla():
+        nonlocal total_pages, last_id_on_page
+        total_pages = math.ceil(total_pedidos / rows_per_page) if total_pedidos > 0 else 1
+        last_id_on_page = pedidos_en_pagina[-1]['id'] if pedidos_en_pagina else None
+        pedidos_data_table.rows = [construir_fila(p) for p in pedidos_en_pagina]
+        txt_seleccion.value = f"{len(seleccionados)} seleccionado(s):"
+        barra_lote.visible = bool(seleccionados)
         txt_page_info.value = f"Página {current_page} de {total_pages}"
         btn_prev.disabled = current_page <= 1
         btn_next.disabled = current_page >= total_pages
         page.update()
 
-    cargar_pedidos()
+    async def cargar_pedidos():
+        nonlocal current_page, page_cursors, pedidos_en_pagina, total_pedidos
+        search_term = search_filter.value.strip() if search_filter.value else None
+        
+        # Una sola petición: la página actual + el total (COUNT en el servidor)
+        pedidos, total_items = await obtener_pagina_pedidos_async(
+            limit=rows_per_page, before_id=page_cursors[current_page - 1], search_term=search_term, page=page
+        )
+        
+        paginas = math.ceil(total_items / rows_per_page) if total_items > 0 else 1
+        if current_page > paginas or (not pedidos and current_page > 1):
+            # La lista se redujo (borrados/filtro): volver al inicio
+            current_page = 1
+            page_cursors = [None]
+            pedidos, total_items = await obtener_pagina_pedidos_async(limit=rows_per_page, search_term=search_term, page=page)
+        
+        pedidos_en_pagina, total_pedidos = pedidos, total_items
+        pintar_tabla()
+
+    def agregar_pedido_nuevo(pedido):
+        """Inserta un pedido recién creado (llegado por evento) sin recargar la tabla."""
+        nonlocal total_pedidos
+        if search_filter.value and search_filter.value.strip():
+            return  # Con filtro activo no se sabe si coincide; se verá al limpiar el filtro
+        if any(p['id'] == pedido['id'] for p in pedidos_en_pagina):
+            return
+        total_pedidos += 1
+        if current_page == 1:
+            pedidos_en_pagina.insert(0, pedido)
+            del pedidos_en_pagina[rows_per_page:]
+        # En páginas posteriores los cursores no cambian (los ids nuevos son mayores); solo el total
+        pintar_tabla()
+
+    def aplicar_cambio_estado(datos):
+        for p in pedidos_en_pagina:
+            if p['id'] == datos.get('orden_id'):
+                if p['estado'] == datos['nuevo_estado'] and p['total'] == datos.get('total', p['total']):
+                    return  # Ya aplicado localmente (p. ej. el eco de un cambio en lote de este panel)
+                p['estado'] = datos['nuevo_estado']
+                p['total'] = datos.get('total', p['total'])
+                p['motivo_cancelacion'] = datos.get('motivo_cancelacion')
+                pintar_tabla()
+                return
+
+    page.run_task(cargar_pedidos)
 
     # --- SUBSCRIPCIÓN A NOTIFICACIONES ---
-    async def on_new_order(message):
-        if message == "nuevo_pedido":
-            # Reproducir sonido
+    async def on_evento_pedido(tipo, datos):
+        if tipo == "reset":
+            # Se perdieron eventos (reinicio del backend o desconexión larga): recargar
+            await cargar_pedidos()
+        elif tipo == "estado_actualizado":
+            # Cambios hechos por el cliente (p. ej. cancelaciones) u otro admin
+            aplicar_cambio_estado(datos)
+        elif tipo == "pedido_creado":
+            # El evento trae el pedido completo, con el destino de impresión de cada línea
             play_notification_sound(page)
-            # Mostrar alerta visual
-            show_notification(page, "🔔 ¡Nuevo Pedido Recibido!", ft.Colors.GREEN_700)
-            
-            # Recargar tabla
-            cargar_pedidos()
-            page.update()
-
-            # Imprimir automaticamente
+            show_notification(page, f"🔔 ¡Nuevo Pedido Recibido! #{datos['id']}", ft.Colors.GREEN_700)
+            agregar_pedido_nuevo(datos)
             try:
-                # Obtener el ultimo pedido para imprimirlo
-                # Asumimos que obtener_pedidos devuelve ordenados por fecha descendente
-                pedidos_recientes = obtener_pedidos(limit=1, page=page)
-                if pedidos_recientes:
-                    ultimo_pedido = pedidos_recientes[0]
-                    # Llamar a la funcion de impresion existente
-                    await imprimir_pedido(ultimo_pedido)
+                await imprimir_pedido(datos)
             except Exception as e:
                 print(f"Error en impresion automatica: {e}")
 
-    pubsub = init_pubsub(page)
-    pubsub.subscribe(on_new_order)
+    # Eventos del backend (GET /pedidos/eventos): sin polling ni PubSub entre sesiones
+    suscribir_eventos_pedidos(page, on_evento_pedido)
 
     content_container = ft.Container(
         padding=20,
@@ -652,15 +753,17 @@ def pedidos_view(page: ft.Page, export_file_picker: ft.FilePicker):
                 ft.Text("Gestión de pedidos", size=20, weight="bold", color=ft.Colors.BLUE_GREY_900),
                 search_filter,
                 ft.Row([
-                    ft.FilledButton("Filtrar", on_click=lambda e: cargar_pedidos(), style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE)),
-                    ft.FilledButton("Limpiar", on_click=lambda e: (setattr(search_filter, "value", ""), cargar_pedidos()), style=ft.ButtonStyle(bgcolor=ft.Colors.RED, color=ft.Colors.WHITE)),
-                    ft.IconButton(ft.Icons.REFRESH, on_click=lambda e: cargar_pedidos(), icon_color=ft.Colors.BLUE_GREY_700, tooltip="Actualizar lista"),
+                    ft.FilledButton("Filtrar", on_click=lambda e: page.run_task(reiniciar_paginacion), style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE)),
+                    ft.FilledButton("Limpiar", on_click=lambda e: (setattr(search_filter, "value", ""), page.run_task(reiniciar_paginacion)), style=ft.ButtonStyle(bgcolor=ft.Colors.RED, color=ft.Colors.WHITE)),
+                    ft.IconButton(ft.Icons.REFRESH, on_click=lambda e: page.run_task(cargar_pedidos), icon_color=ft.Colors.BLUE_GREY_700, tooltip="Actualizar lista"),
                 ], spacing=10),
                 # Botones de exportación
                 ft.Row([
                     ft.FilledButton("CSV", icon=ft.Icons.DOWNLOAD, on_click=export_csv_click, expand=True, style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE)),
-                    ft.FilledButton("Excel", icon=ft.Icons.TABLE_VIEW, on_click=export_xlsm_click, expand=True, style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE))
+                    ft.FilledButton("Excel", icon=ft.Icons.TABLE_VIEW, on_click=export_xlsx_click, expand=True, style=ft.ButtonStyle(bgcolor=ft.Colors.BROWN_700, color=ft.Colors.WHITE))
                 ], spacing=10),
+                # Acciones sobre los pedidos marcados
+                barra_lote,
                 # Área de la tabla
                 ft.Column(
                     [
@@ -1,4 +1,5 @@
 import flet as ft
+from database import escuchar_eventos_pedidos
 
 # Mantiene una referencia global al canal PubSub
 pubsub_channel = None
@@ -10,6 +11,24 @@ def init_pubsub(page: ft.Page):
         pubsub_channel = page.pubsub
     return pubsub_channel
 
+def suscribir_eventos_pedidos(page: ft.Page, on_evento, telefono=None, codigo=None):
+    """
+    Suscribe la sesión al stream de eventos de pedidos del backend.
+    Solo hay una suscripción activa por sesión: la nueva reemplaza a la anterior.
+    """
+    cancelar_eventos_pedidos(page)
+    page.session.eventos_pedidos = page.run_task(
+        escuchar_eventos_pedidos, on_evento, telefono=telefono, codigo=codigo, page=page
+    )
+    # Al cerrarse la sesión se suelta la conexión con el backend
+    page.on_close = lambda e: cancelar_eventos_pedidos(page)
+
+def cancelar_eventos_pedidos(page: ft.Page):
+    tarea = getattr(page.session, "eventos_pedidos", None)
+    if tarea:
+        tarea.cancel()
+        page.session.eventos_pedidos = None
+
 import time
 import threading
 
@@ -10,6 +10,14 @@ TENANT_ID = os.getenv("TENANT_ID", "tortas_las_originales")
 # URL de la API
 API_URL = os.getenv("API_URL", "https://delivery-apps-api.up.railway.app")
 
+# Cliente HTTP compartido (conexiones persistentes hacia la API)
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "20"))
+API_MAX_KEEPALIVE = int(os.getenv("API_MAX_KEEPALIVE", "10"))
+API_KEEPALIVE_EXPIRY = float(os.getenv("API_KEEPALIVE_EXPIRY", "60"))
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))  # Reintentos solo ante fallos de conexión
+API_HTTP2 = os.getenv("API_HTTP2", "1") == "1"
+
 # Seguridad de la API
 API_KEY = os.getenv("API_SECRET_KEY", "")
 
@@ -1,7 +1,17 @@
+import asyncio
 import httpx
+import atexit
+import copy
 import json
 import os
-from config import API_URL, HEADERS, TENANT_ID
+import re
+from config import (
+    API_URL, HEADERS, TENANT_ID, IMAGES_URL, API_TIMEOUT, API_MAX_CONNECTIONS, API_MAX_KEEPALIVE,
+    API_KEEPALIVE_EXPIRY, API_RETRIES, API_HTTP2
+)
+
+# Última respuesta de cada recurso del catálogo: (ruta, params) -> (etag, datos)
+_catalogo_etags = {}
 
 def get_auth_headers(page=None):
     """
@@ -14,11 +24,118 @@ def get_auth_headers(page=None):
         headers["Authorization"] = f"Bearer {auth_token}"
     return headers
 
+# --- IMÁGENES ---
+# Las subidas nuevas se llaman "<slug>-<hash 16 hex>.webp" y traen variantes .thumb/.medium;
+# las anteriores al pipeline solo existen en tamaño completo.
+_IMAGEN_CON_VARIANTES = re.compile(r"-[0-9a-f]{16}\.webp$")
+
+def url_imagen(imagen, variante="full"):
+    """URL de una imagen subida; "thumb" o "medium" si el archivo tiene esas variantes."""
+    if variante != "full" and _IMAGEN_CON_VARIANTES.search(imagen):
+        imagen = f"{imagen[:-len('.webp')]}.{variante}.webp"
+    return f"{IMAGES_URL}/{imagen}"
+
+# --- CLIENTE HTTP COMPARTIDO ---
+# Un solo pool de conexiones por proceso: cada petición reutiliza la conexión TCP/TLS abierta
+# en lugar de negociar un handshake nuevo contra la API.
+_http_client = None
+_async_http_client = None
+_stream_http_client = None
+
+def _usar_http2():
+    if not API_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401 (extra opcional de httpx)
+        return True
+    except ImportError:
+        return False
+
+def _limites():
+    return httpx.Limits(
+        max_connections=API_MAX_CONNECTIONS,
+        max_keepalive_connections=API_MAX_KEEPALIVE,
+        keepalive_expiry=API_KEEPALIVE_EXPIRY
+    )
+
+def get_http_client():
+    """Cliente síncrono compartido (keep-alive, HTTP/2 si está disponible, reintentos de conexión)."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        transport = httpx.HTTPTransport(http2=_usar_http2(), limits=_limites(), retries=API_RETRIES)
+        _http_client = httpx.Client(base_url=API_URL, transport=transport, timeout=API_TIMEOUT)
+    return _http_client
+
+def get_async_http_client():
+    """Gemelo asíncrono de get_http_client() para handlers async de Flet (no bloquea el event loop)."""
+    global _async_http_client
+    if _async_http_client is None or _async_http_client.is_closed:
+        transport = httpx.AsyncHTTPTransport(http2=_usar_http2(), limits=_limites(), retries=API_RETRIES)
+        _async_http_client = httpx.AsyncClient(base_url=API_URL, transport=transport, timeout=API_TIMEOUT)
+    return _async_http_client
+
+def get_stream_http_client():
+    """
+    Cliente aparte para streams de larga duración (eventos SSE): cada sesión abierta mantiene una
+    conexión ocupada y no debe agotar el pool de las peticiones normales.
+    """
+    global _stream_http_client
+    if _stream_http_client is None or _stream_http_client.is_closed:
+        _stream_http_client = httpx.AsyncClient(
+            base_url=API_URL,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=0),
+            # El backend manda un ping cada ~15 s; más de un minuto en silencio es una conexión muerta
+            timeout=httpx.Timeout(API_TIMEOUT, read=60.0)
+        )
+    return _stream_http_client
+
+def cerrar_http_clients():
+    # El cliente asíncrono se cierra solo al terminar su event loop; aquí basta con el síncrono.
+    if _http_client is not None:
+        _http_client.close()
+
+atexit.register(cerrar_http_clients)
+
+def _preparar_catalogo(ruta, params, page):
+    clave = (ruta, tuple(sorted((params or {}).items())))
+    headers = get_auth_headers(page)
+    previo = _catalogo_etags.get(clave)
+    if previo:
+        headers["If-None-Match"] = previo[0]
+    return clave, previo, headers
+
+def _resolver_catalogo(response, clave, previo):
+    if response.status_code == 304 and previo:
+        datos = previo[1]
+    elif response.status_code == 200:
+        datos = response.json()
+        etag = response.headers.get("ETag")
+        if etag:
+            _catalogo_etags[clave] = (etag, datos)
+    else:
+        return None
+    # Copia para que las vistas puedan ordenar/modificar sin alterar lo guardado
+    return copy.deepcopy(datos)
+
+def _get_catalogo(ruta, params=None, page=None, timeout=10.0):
+    """
+    GET condicional para recursos del catálogo. Envía If-None-Match con el último ETag recibido;
+    ante un 304 reutiliza el cuerpo guardado. Devuelve None si la petición falla.
+    """
+    clave, previo, headers = _preparar_catalogo(ruta, params, page)
+    response = get_http_client().get(ruta, params=params, headers=headers, timeout=timeout)
+    return _resolver_catalogo(response, clave, previo)
+
+async def _get_catalogo_async(ruta, params=None, page=None, timeout=10.0):
+    clave, previo, headers = _preparar_catalogo(ruta, params, page)
+    response = await get_async_http_client().get(ruta, params=params, headers=headers, timeout=timeout)
+    return _resolver_catalogo(response, clave, previo)
+
 # --- AUTH ---
 def verificar_admin_login(password, page=None):
     try:
         # Petición inicial de login
-        response = httpx.post(f"{API_URL}/admin/login", json={"password": password}, headers=HEADERS)
+        response = get_http_client().post("/admin/login", json={"password": password}, headers=HEADERS)
         if response.status_code == 200:
             token_data = response.json()
             # Guardamos el JWT en la sesión de Flet (seguro en el navegador)
@@ -33,7 +150,7 @@ def verificar_admin_login(password, page=None):
 def subir_imagen(file_name, file_bytes, page=None):
     try:
         files = {"file": (file_name, file_bytes)}
-        response = httpx.post(f"{API_URL}/upload", files=files, headers=get_auth_headers(page))
+        response = get_http_client().post("/upload", files=files, headers=get_auth_headers(page))
         if response.status_code == 200:
             return response.json().get("filename")
         return None
@@ -42,84 +159,82 @@ def subir_imagen(file_name, file_bytes, page=None):
 
 def cambiar_admin_password(new_password, page=None):
     try:
-        response = httpx.post(f"{API_URL}/admin/change-password", json={"new_password": new_password}, headers=get_auth_headers(page))
+        response = get_http_client().post("/admin/change-password", json={"new_password": new_password}, headers=get_auth_headers(page))
         return response.status_code == 200
     except Exception as e:
         return False
 
 # --- MENU ---
-def agregar_platillo(nombre, descripcion, precio, imagen, descuento=0, is_configurable=0, is_configurable_salsa=0, piezas=1, grupos_opciones_ids="[]", printer_target="cocina", categoria_id=None, page=None):
-    data = {
+def _datos_platillo(nombre, descripcion, precio, imagen, descuento, is_configurable, is_configurable_salsa, piezas, grupos_opciones_ids, printer_target, categoria_id):
+    return {
         "nombre": nombre, "descripcion": descripcion, "precio": precio, "imagen": imagen,
         "descuento": descuento, "is_configurable": is_configurable, "is_configurable_salsa": is_configurable_salsa,
         "piezas": piezas, "grupos_opciones_ids": grupos_opciones_ids, "printer_target": printer_target,
-        "categoria_id": categoria_id, "is_active": 1
+        "categoria_id": categoria_id
     }
+
+def agregar_platillo(nombre, descripcion, precio, imagen, descuento=0, is_configurable=0, is_configurable_salsa=0, piezas=1, grupos_opciones_ids="[]", printer_target="cocina", categoria_id=None, page=None):
+    data = _datos_platillo(nombre, descripcion, precio, imagen, descuento, is_configurable, is_configurable_salsa, piezas, grupos_opciones_ids, printer_target, categoria_id)
+    data["is_active"] = 1
     try:
-        r = httpx.post(f"{API_URL}/menu", json=data, headers=get_auth_headers(page))
+        r = get_http_client().post("/menu", json=data, headers=get_auth_headers(page))
         return r.status_code in [200, 201]
     except Exception as e:
         return False
 
 def actualizar_platillo(platillo_id, nombre, descripcion, precio, imagen, descuento=0, is_configurable=0, is_configurable_salsa=0, piezas=1, grupos_opciones_ids="[]", printer_target="cocina", categoria_id=None, page=None):
-    data = {
-        "nombre": nombre, "descripcion": descripcion, "precio": precio, "imagen": imagen,
-        "descuento": descuento, "is_configurable": is_configurable, "is_configurable_salsa": is_configurable_salsa,
-        "piezas": piezas, "grupos_opciones_ids": grupos_opciones_ids, "printer_target": printer_target,
-        "categoria_id": categoria_id
-    }
+    data = _datos_platillo(nombre, descripcion, precio, imagen, descuento, is_configurable, is_configurable_salsa, piezas, grupos_opciones_ids, printer_target, categoria_id)
     try:
-        r = httpx.put(f"{API_URL}/menu/{platillo_id}", json=data, headers=get_auth_headers(page))
+        r = get_http_client().put(f"/menu/{platillo_id}", json=data, headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
 
 def eliminar_platillo(platillo_id, page=None):
     try:
-        r = httpx.delete(f"{API_URL}/menu/{platillo_id}", headers=get_auth_headers(page))
+        r = get_http_client().delete(f"/menu/{platillo_id}", headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
 
 def get_grupos_opciones(page=None):
     try:
-        response = httpx.get(f"{API_URL}/opciones", headers=get_auth_headers(page))
-        return response.json() if response.status_code == 200 else []
+        return _get_catalogo("/opciones", page=page) or []
     except Exception as e:
         return []
 
 def create_grupo_opciones(nombre, opciones, seleccion_multiple=0, obligatorio=0, page=None):
     data = {"nombre": nombre, "opciones": opciones, "seleccion_multiple": seleccion_multiple, "obligatorio": obligatorio}
     try:
-        r = httpx.post(f"{API_URL}/opciones", json=data, headers=get_auth_headers(page))
+        r = get_http_client().post("/opciones", json=data, headers=get_auth_headers(page))
         return r.status_code in [200, 201]
     except Exception as e:
         return False
 
 def delete_grupo_opciones(grupo_id, page=None):
     try:
-        r = httpx.delete(f"{API_URL}/opciones/{grupo_id}", headers=get_auth_headers(page))
+        r = get_http_client().delete(f"/opciones/{grupo_id}", headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
 
 def actualizar_visibilidad_platillo(platillo_id, is_active, page=None):
     try:
-        r = httpx.put(f"{API_URL}/menu/{platillo_id}/visibilidad", params={"is_active": is_active}, headers=get_auth_headers(page))
+        r = get_http_client().put(f"/menu/{platillo_id}/visibilidad", params={"is_active": is_active}, headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
 
 def ocultar_todos_los_platillos(page=None):
     try:
-        r = httpx.put(f"{API_URL}/admin/menu/visibilidad-global", params={"is_active": 0}, headers=get_auth_headers(page))
+        r = get_http_client().put("/admin/menu/visibilidad-global", params={"is_active": 0}, headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
 
 def mostrar_todos_los_platillos(page=None):
     try:
-        r = httpx.put(f"{API_URL}/admin/menu/visibilidad-global", params={"is_active": 1}, headers=get_auth_headers(page))
+        r = get_http_client().put("/admin/menu/visibilidad-global", params={"is_active": 1}, headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
@@ -128,32 +243,33 @@ def obtener_menu(solo_activos=True, search_term=None, page=None):
     params = {"solo_activos": solo_activos}
     if search_term: params["search"] = search_term
     try:
-        response = httpx.get(f"{API_URL}/menu", params=params, headers=get_auth_headers(page), timeout=10.0)
-        return response.json() if response.status_code == 200 else []
+        return _get_catalogo("/menu", params=params, page=page) or []
     except Exception as e:
         return []
 
 def get_configuracion(page=None):
     try:
-        response = httpx.get(f"{API_URL}/configuracion", headers=get_auth_headers(page))
-        return response.json() if response.status_code == 200 else {}
+        return _get_catalogo("/configuracion", page=page) or {}
     except Exception as e:
         return {}
 
-def update_configuracion(horario, codigos_postales, metodos_pago_activos=None, tipos_tarjeta=None, contactos=None, guisos_disponibles=None, salsas_disponibles=None, costo_envio=20.0, categorias_disponibles=None, page=None):
+def _datos_configuracion(horario, codigos_postales, metodos_pago_activos, tipos_tarjeta, contactos, guisos_disponibles, salsas_disponibles, costo_envio, categorias_disponibles):
     data = {
         "horario": horario, "codigos_postales": codigos_postales, "metodos_pago_activos": metodos_pago_activos,
         "tipos_tarjeta": tipos_tarjeta, "contactos": contactos, "guisos_disponibles": guisos_disponibles,
         "salsas_disponibles": salsas_disponibles, "categorias_disponibles": categorias_disponibles, "costo_envio": costo_envio
     }
-    data = {k: v for k, v in data.items() if v is not None}
+    return {k: v for k, v in data.items() if v is not None}
+
+def update_configuracion(horario, codigos_postales, metodos_pago_activos=None, tipos_tarjeta=None, contactos=None, guisos_disponibles=None, salsas_disponibles=None, costo_envio=20.0, categorias_disponibles=None, page=None):
+    data = _datos_configuracion(horario, codigos_postales, metodos_pago_activos, tipos_tarjeta, contactos, guisos_disponibles, salsas_disponibles, costo_envio, categorias_disponibles)
     try:
-        r = httpx.put(f"{API_URL}/configuracion", json=data, headers=get_auth_headers(page))
+        r = get_http_client().put("/configuracion", json=data, headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
 
-def guardar_pedido(nombre, telefono, direccion, referencias, total, items, metodo_pago, paga_con, page=None):
+def _datos_orden(nombre, telefono, direccion, referencias, total, items, metodo_pago, paga_con):
     detalles_backend = []
     for item in items:
         detalles = item.get("details") or item.get("detalles") or ""
@@ -163,14 +279,21 @@ def guardar_pedido(nombre, telefono, direccion, referencias, total, items, metod
         if detalles: extras.append(detalles)
         if comentario: extras.append(f"Nota: {comentario}")
         if extras: nombre_producto += f" ({' | '.join(extras)})"
-        detalles_backend.append({"producto": nombre_producto, "cantidad": item["cantidad"], "precio_unitario": item["precio"]})
+        detalles_backend.append({
+            "producto": nombre_producto, "cantidad": item["cantidad"], "precio_unitario": item["precio"],
+            # El backend copia printer_target del platillo; las opciones viajan también estructuradas
+            "menu_id": item.get("id"), "opciones": json.dumps(item.get("opciones", []), ensure_ascii=False)
+        })
 
-    orden_data = {
+    return {
         "nombre_cliente": nombre, "telefono": telefono, "direccion": direccion, "referencias": referencias,
         "total": total, "metodo_pago": metodo_pago, "paga_con": paga_con, "items": detalles_backend
     }
+
+def guardar_pedido(nombre, telefono, direccion, referencias, total, items, metodo_pago, paga_con, page=None):
+    orden_data = _datos_orden(nombre, telefono, direccion, referencias, total, items, metodo_pago, paga_con)
     try:
-        response = httpx.post(f"{API_URL}/pedidos", json=orden_data, headers=get_auth_headers(page))
+        response = get_http_client().post("/pedidos", json=orden_data, headers=get_auth_headers(page))
         if response.status_code == 200:
             return True, response.json()["codigo_seguimiento"]
         return False, None
@@ -186,7 +309,7 @@ def _formatear_pedido(pedido):
 
 def obtener_pedido_por_codigo(telefono, codigo, page=None):
     try:
-        response = httpx.get(f"{API_URL}/pedidos/seguimiento", params={"telefono": telefono, "codigo": codigo}, headers=get_auth_headers(page))
+        response = get_http_client().get("/pedidos/seguimiento", params={"telefono": telefono, "codigo": codigo}, headers=get_auth_headers(page))
         return _formatear_pedido(response.json()) if response.status_code == 200 else None
     except Exception as e:
         return None
@@ -195,54 +318,350 @@ def obtener_pedidos(limit=100, offset=0, search_term=None, page=None):
     params = {"skip": offset, "limit": limit}
     if search_term: params["search"] = search_term
     try:
-        response = httpx.get(f"{API_URL}/pedidos", params=params, headers=get_auth_headers(page))
+        response = get_http_client().get("/pedidos", params=params, headers=get_auth_headers(page))
         return [_formatear_pedido(p) for p in response.json()] if response.status_code == 200 else []
     except Exception as e:
         return []
 
+def _params_pagina(limit, before_id, search_term):
+    params = {"limit": limit}
+    if before_id is not None: params["before_id"] = before_id
+    if search_term: params["search"] = search_term
+    return params
+
+def _resolver_pagina(response):
+    if response.status_code != 200: return [], 0
+    total = int(response.headers.get("X-Total-Count", 0))
+    return [_formatear_pedido(p) for p in response.json()], total
+
+def obtener_pagina_pedidos(limit=12, before_id=None, search_term=None, page=None):
+    """Una página (keyset) y el total filtrado en una sola petición. Devuelve (pedidos, total)."""
+    try:
+        response = get_http_client().get("/pedidos", params=_params_pagina(limit, before_id, search_term), headers=get_auth_headers(page))
+        return _resolver_pagina(response)
+    except Exception as e:
+        return [], 0
+
 def obtener_total_pedidos(search_term=None, page=None):
-    pedidos = obtener_pedidos(limit=1000, search_term=search_term, page=page)
-    return len(pedidos)
+    params = {"search": search_term} if search_term else {}
+    try:
+        response = get_http_client().get("/pedidos/count", params=params, headers=get_auth_headers(page))
+        return response.json().get("total", 0) if response.status_code == 200 else 0
+    except Exception as e:
+        return 0
 
 def obtener_pedidos_sin_paginacion(search_term=None, page=None):
     return obtener_pedidos(limit=5000, search_term=search_term, page=page)
 
-def obtener_datos_exportacion(search_term=None, page=None):
-    try:
-        response = httpx.get(f"{API_URL}/pedidos", params={"limit": 5000, "search": search_term}, headers=get_auth_headers(page), timeout=30.0)
-        if response.status_code != 200: return []
-        pedidos = response.json()
-        flat_data = []
-        for o in pedidos:
-            for d in o["detalles"]:
-                flat_data.append({
-                    "orden_id": o["id"], "codigo_seguimiento": o["codigo_seguimiento"], "fecha": o["fecha"],
-                    "nombre_cliente": o["nombre_cliente"], "telefono": o["telefono"], "direccion": o["direccion"],
-                    "referencias": o["referencias"], "estado": o["estado"], "metodo_pago": o["metodo_pago"],
-                    "paga_con": o["paga_con"], "total_orden": o["total"], "motivo_cancelacion": o["motivo_cancelacion"],
-                    "producto": d["producto"], "cantidad": d["cantidad"], "precio_unitario": d["precio_unitario"],
-                    "subtotal_producto": d["cantidad"] * d["precio_unitario"]
-                })
-        return flat_data
+def _url_exportacion(token, formato, search_term):
+    params = {"tenant": TENANT_ID, "token": token, "formato": formato}
+    if search_term: params["search"] = search_term
+    return str(httpx.URL(f"{API_URL}/pedidos/export", params=params))
+
+def obtener_url_exportacion(formato="csv", search_term=None, page=None):
+    """URL firmada (expira en minutos) del reporte generado y transmitido por el backend."""
+    try:
+        r = get_http_client().post("/pedidos/export/token", headers=get_auth_headers(page))
+        if r.status_code != 200: return None
+        return _url_exportacion(r.json()["token"], formato, search_term)
     except Exception as e:
-        return []
+        return None
+
+def descargar_exportacion(url, ruta_destino):
+    """Guarda el reporte en disco por bloques (apps nativas), sin cargarlo completo en memoria."""
+    try:
+        with get_http_client().stream("GET", url, timeout=120.0) as response:
+            if response.status_code != 200: return False
+            with open(ruta_destino, "wb") as f:
+                for chunk in response.iter_bytes():
+                    f.write(chunk)
+        return True
+    except Exception as e:
+        return False
 
 def actualizar_estado_pedido(orden_id, nuevo_estado, motivo=None, page=None):
     params = {"nuevo_estado": nuevo_estado}
     if motivo: params["motivo"] = motivo
     try:
-        r = httpx.put(f"{API_URL}/pedidos/{orden_id}/estado", params=params, headers=get_auth_headers(page))
+        r = get_http_client().put(f"/pedidos/{orden_id}/estado", params=params, headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
 
+def actualizar_estado_pedidos(ids, nuevo_estado, motivo=None, page=None):
+    """Cambio de estado en lote. Devuelve {"actualizados": [...], "rechazados": [...]} o None si falló."""
+    data = {"ids": list(ids), "nuevo_estado": nuevo_estado, "motivo": motivo}
+    try:
+        r = get_http_client().put("/pedidos/estado", json=data, headers=get_auth_headers(page))
+        return r.json() if r.status_code == 200 else None
+    except Exception as e:
+        return None
+
 def actualizar_pago_pedido(orden_id, metodo_pago, paga_con, page=None):
     data = {"metodo_pago": metodo_pago, "paga_con": paga_con}
     try:
-        r = httpx.put(f"{API_URL}/pedidos/{orden_id}/pago", json=data, headers=get_auth_headers(page))
+        r = get_http_client().put(f"/pedidos/{orden_id}/pago", json=data, headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+# --- API ASÍNCRONA ---
+# Mismas operaciones sobre get_async_http_client(), para los handlers async de Flet: la espera de red
+# no bloquea el event loop y las lecturas independientes pueden lanzarse juntas con asyncio.gather.
+
+async def verificar_admin_login_async(password, page=None):
+    try:
+        response = await get_async_http_client().post("/admin/login", json={"password": password}, headers=HEADERS)
+        if response.status_code == 200:
+            if page:
+                setattr(page.session, "auth_token", response.json()["access_token"])
+            return True
+        return False
+    except Exception as e:
+        print(f"Error login: {e}")
+        return False
+
+async def subir_imagen_async(file_name, file_bytes, page=None):
+    try:
+        files = {"file": (file_name, file_bytes)}
+        response = await get_async_http_client().post("/upload", files=files, headers=get_auth_headers(page))
+        if response.status_code == 200:
+            return response.json().get("filename")
+        return None
+    except Exception as e:
+        return None
+
+async def cambiar_admin_password_async(new_password, page=None):
+    try:
+        response = await get_async_http_client().post("/admin/change-password", json={"new_password": new_password}, headers=get_auth_headers(page))
+        return response.status_code == 200
+    except Exception as e:
+        return False
+
+async def agregar_platillo_async(nombre, descripcion, precio, imagen, descuento=0, is_configurable=0, is_configurable_salsa=0, piezas=1, grupos_opciones_ids="[]", printer_target="cocina", categoria_id=None, page=None):
+    data = _datos_platillo(nombre, descripcion, precio, imagen, descuento, is_configurable, is_configurable_salsa, piezas, grupos_opciones_ids, printer_target, categoria_id)
+    data["is_active"] = 1
+    try:
+        r = await get_async_http_client().post("/menu", json=data, headers=get_auth_headers(page))
+        return r.status_code in [200, 201]
+    except Exception as e:
+        return False
+
+async def actualizar_platillo_async(platillo_id, nombre, descripcion, precio, imagen, descuento=0, is_configurable=0, is_configurable_salsa=0, piezas=1, grupos_opciones_ids="[]", printer_target="cocina", categoria_id=None, page=None):
+    data = _datos_platillo(nombre, descripcion, precio, imagen, descuento, is_configurable, is_configurable_salsa, piezas, grupos_opciones_ids, printer_target, categoria_id)
+    try:
+        r = await get_async_http_client().put(f"/menu/{platillo_id}", json=data, headers=get_auth_headers(page))
         return r.status_code == 200
     except Exception as e:
         return False
 
+async def eliminar_platillo_async(platillo_id, page=None):
+    try:
+        r = await get_async_http_client().delete(f"/menu/{platillo_id}", headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+async def get_grupos_opciones_async(page=None):
+    try:
+        return await _get_catalogo_async("/opciones", page=page) or []
+    except Exception as e:
+        return []
+
+async def create_grupo_opciones_async(nombre, opciones, seleccion_multiple=0, obligatorio=0, page=None):
+    data = {"nombre": nombre, "opciones": opciones, "seleccion_multiple": seleccion_multiple, "obligatorio": obligatorio}
+    try:
+        r = await get_async_http_client().post("/opciones", json=data, headers=get_auth_headers(page))
+        return r.status_code in [200, 201]
+    except Exception as e:
+        return False
+
+async def delete_grupo_opciones_async(grupo_id, page=None):
+    try:
+        r = await get_async_http_client().delete(f"/opciones/{grupo_id}", headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+async def actualizar_visibilidad_platillo_async(platillo_id, is_active, page=None):
+    try:
+        r = await get_async_http_client().put(f"/menu/{platillo_id}/visibilidad", params={"is_active": is_active}, headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+async def ocultar_todos_los_platillos_async(page=None):
+    try:
+        r = await get_async_http_client().put("/admin/menu/visibilidad-global", params={"is_active": 0}, headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+async def mostrar_todos_los_platillos_async(page=None):
+    try:
+        r = await get_async_http_client().put("/admin/menu/visibilidad-global", params={"is_active": 1}, headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+async def obtener_menu_async(solo_activos=True, search_term=None, page=None):
+    params = {"solo_activos": solo_activos}
+    if search_term: params["search"] = search_term
+    try:
+        return await _get_catalogo_async("/menu", params=params, page=page) or []
+    except Exception as e:
+        return []
+
+async def get_configuracion_async(page=None):
+    try:
+        return await _get_catalogo_async("/configuracion", page=page) or {}
+    except Exception as e:
+        return {}
+
+async def update_configuracion_async(horario, codigos_postales, metodos_pago_activos=None, tipos_tarjeta=None, contactos=None, guisos_disponibles=None, salsas_disponibles=None, costo_envio=20.0, categorias_disponibles=None, page=None):
+    data = _datos_configuracion(horario, codigos_postales, metodos_pago_activos, tipos_tarjeta, contactos, guisos_disponibles, salsas_disponibles, costo_envio, categorias_disponibles)
+    try:
+        r = await get_async_http_client().put("/configuracion", json=data, headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+async def guardar_pedido_async(nombre, telefono, direccion, referencias, total, items, metodo_pago, paga_con, page=None):
+    orden_data = _datos_orden(nombre, telefono, direccion, referencias, total, items, metodo_pago, paga_con)
+    try:
+        response = await get_async_http_client().post("/pedidos", json=orden_data, headers=get_auth_headers(page))
+        if response.status_code == 200:
+            return True, response.json()["codigo_seguimiento"]
+        return False, None
+    except Exception as e:
+        return False, None
+
+async def obtener_pedido_por_codigo_async(telefono, codigo, page=None):
+    try:
+        response = await get_async_http_client().get("/pedidos/seguimiento", params={"telefono": telefono, "codigo": codigo}, headers=get_auth_headers(page))
+        return _formatear_pedido(response.json()) if response.status_code == 200 else None
+    except Exception as e:
+        return None
+
+async def obtener_pedidos_async(limit=100, offset=0, search_term=None, page=None):
+    params = {"skip": offset, "limit": limit}
+    if search_term: params["search"] = search_term
+    try:
+        response = await get_async_http_client().get("/pedidos", params=params, headers=get_auth_headers(page))
+        return [_formatear_pedido(p) for p in response.json()] if response.status_code == 200 else []
+    except Exception as e:
+        return []
+
+async def obtener_pagina_pedidos_async(limit=12, before_id=None, search_term=None, page=None):
+    try:
+        response = await get_async_http_client().get("/pedidos", params=_params_pagina(limit, before_id, search_term), headers=get_auth_headers(page))
+        return _resolver_pagina(response)
+    except Exception as e:
+        return [], 0
+
+async def obtener_total_pedidos_async(search_term=None, page=None):
+    params = {"search": search_term} if search_term else {}
+    try:
+        response = await get_async_http_client().get("/pedidos/count", params=params, headers=get_auth_headers(page))
+        return response.json().get("total", 0) if response.status_code == 200 else 0
+    except Exception as e:
+        return 0
+
+async def obtener_pedidos_sin_paginacion_async(search_term=None, page=None):
+    return await obtener_pedidos_async(limit=5000, search_term=search_term, page=page)
+
+async def obtener_url_exportacion_async(formato="csv", search_term=None, page=None):
+    try:
+        r = await get_async_http_client().post("/pedidos/export/token", headers=get_auth_headers(page))
+        if r.status_code != 200: return None
+        return _url_exportacion(r.json()["token"], formato, search_term)
+    except Exception as e:
+        return None
+
+async def descargar_exportacion_async(url, ruta_destino):
+    try:
+        async with get_async_http_client().stream("GET", url, timeout=120.0) as response:
+            if response.status_code != 200: return False
+            with open(ruta_destino, "wb") as f:
+                async for chunk in response.aiter_bytes():
+                    f.write(chunk)
+        return True
+    except Exception as e:
+        return False
+
+async def actualizar_estado_pedido_async(orden_id, nuevo_estado, motivo=None, page=None):
+    params = {"nuevo_estado": nuevo_estado}
+    if motivo: params["motivo"] = motivo
+    try:
+        r = await get_async_http_client().put(f"/pedidos/{orden_id}/estado", params=params, headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+async def actualizar_estado_pedidos_async(ids, nuevo_estado, motivo=None, page=None):
+    data = {"ids": list(ids), "nuevo_estado": nuevo_estado, "motivo": motivo}
+    try:
+        r = await get_async_http_client().put("/pedidos/estado", json=data, headers=get_auth_headers(page))
+        return r.json() if r.status_code == 200 else None
+    except Exception as e:
+        return None
+
+async def actualizar_pago_pedido_async(orden_id, metodo_pago, paga_con, page=None):
+    data = {"metodo_pago": metodo_pago, "paga_con": paga_con}
+    try:
+        r = await get_async_http_client().put(f"/pedidos/{orden_id}/pago", json=data, headers=get_auth_headers(page))
+        return r.status_code == 200
+    except Exception as e:
+        return False
+
+# --- EVENTOS DE PEDIDOS (SSE) ---
+EVENTOS_ESPERA_MAX = 30  # Segundos máximos entre reintentos de conexión
+
+async def escuchar_eventos_pedidos(on_evento, telefono=None, codigo=None, page=None):
+    """
+    Mantiene abierto el stream /pedidos/eventos y llama `await on_evento(tipo, datos)` por cada evento
+    ("pedido_creado", "estado_actualizado" o "reset"). Con `telefono` y `codigo` solo llegan los de ese
+    pedido. Se reconecta solo, con espera creciente, mandando el último id visto para no perder eventos;
+    "reset" avisa que hubo un hueco y el estado debe recargarse completo. Termina al cancelar la tarea
+    o si el servidor rechaza la sesión (401/403): reintentar no lo arreglaría.
+    """
+    params = {k: v for k, v in (("telefono", telefono), ("codigo", codigo)) if v}
+    ultimo_id = None
+    espera = 1
+    while True:
+        headers = get_auth_headers(page)
+        if ultimo_id:
+            headers["Last-Event-ID"] = ultimo_id
+        try:
+            async with get_stream_http_client().stream("GET", "/pedidos/eventos", params=params, headers=headers) as response:
+                if response.status_code in (401, 403):
+                    print(f"Eventos de pedidos rechazados ({response.status_code}): sin actualizaciones en vivo")
+                    return
+                if response.status_code == 200:
+                    espera = 1
+                    tipo, datos = None, []
+                    async for linea in response.aiter_lines():
+                        if linea.startswith("id:"):
+                            ultimo_id = linea[3:].strip()
+                        elif linea.startswith("event:"):
+                            tipo = linea[6:].strip()
+                        elif linea.startswith("data:"):
+                            datos.append(linea[5:].strip())
+                        elif not linea and tipo:
+                            try:
+                                datos = json.loads("\n".join(datos) or "{}")
+                                if tipo == "pedido_creado":
+                                    datos = _formatear_pedido(datos)  # Mismo formato que obtener_pedidos
+                                await on_evento(tipo, datos)
+                            except Exception as e:
+                                print(f"Error procesando evento {tipo}: {e}")
+                            tipo, datos = None, []
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            pass
+        await asyncio.sleep(espera)
+        espera = min(espera * 2, EVENTOS_ESPERA_MAX)
+
 def conectar(): pass
 def crear_tablas(): pass
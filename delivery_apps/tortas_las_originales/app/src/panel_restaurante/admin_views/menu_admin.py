@@ -1,4 +1,5 @@
 import flet as ft
+import asyncio
 import os
 import uuid
 import shutil
@@ -6,18 +7,23 @@ import json
 import httpx
 from config import IMAGES_URL
 from database import (
-    obtener_menu,
-    agregar_platillo,
-    actualizar_platillo,
-    eliminar_platillo,
-    actualizar_visibilidad_platillo,
-    ocultar_todos_los_platillos,
-    mostrar_todos_los_platillos,
-    get_grupos_opciones,
-    subir_imagen
+    obtener_menu_async,
+    agregar_platillo_async,
+    actualizar_platillo_async,
+    eliminar_platillo_async,
+    actualizar_visibilidad_platillo_async,
+    ocultar_todos_los_platillos_async,
+    mostrar_todos_los_platillos_async,
+    get_grupos_opciones_async,
+    get_configuracion_async,
+    subir_imagen_async,
+    url_imagen
 )
 from components.notifier import show_notification
 
+# Espera (segundos) tras la última tecla antes de buscar en el backend
+BUSQUEDA_DEBOUNCE = 0.25
+
 def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
     
     lista = ft.Column(scroll="auto", expand=True)
@@ -51,9 +57,7 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
         label_style=ft.TextStyle(color=ft.Colors.BLACK),
     )
 
-    def cargar_categorias():
-        from database import get_configuracion
-        config = get_configuracion(page=page)
+    def mostrar_categorias(config):
         categorias = []
         if config and config.get("categorias_disponibles"):
             try:
@@ -66,6 +70,9 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
             categoria_dd.options.append(ft.dropdown.Option(cat))
         page.update()
 
+    async def cargar_categorias():
+        mostrar_categorias(await get_configuracion_async(page=page))
+
     def sync_checkbox_color(chk: ft.Checkbox):
         chk.fill_color = ft.Colors.BROWN_700 if chk.value else ft.Colors.WHITE
     
@@ -87,10 +94,9 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
     grupos_opciones_container = ft.Column()
     grupos_opciones_checks = {} 
 
-    def cargar_checkboxes_grupos():
+    def mostrar_checkboxes_grupos(grupos):
         grupos_opciones_container.controls.clear()
         grupos_opciones_checks.clear()
-        grupos = get_grupos_opciones(page=page)
         
         if not grupos:
             grupos_opciones_container.controls.append(ft.Text("No hay grupos extras configurados (Ir a Configuración)", size=12, color=ft.Colors.GREY))
@@ -137,8 +143,8 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
         btn_accion.text = "Guardar"
         btn_accion.icon = ft.Icons.SAVE
         btn_accion.on_click = agregar_click
-        cargar_categorias() # Refrescar lista de categorias
         page.update()
+        page.run_task(cargar_categorias) # Refrescar lista de categorias
 
     def llenar_campos(platillo):
         pid = platillo['id']
@@ -185,8 +191,8 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
         btn_accion.text = "Actualizar"
         btn_accion.icon = ft.Icons.EDIT
         btn_accion.on_click = guardar_cambios_click
-        cargar_categorias() # Refrescar lista
         page.update()
+        page.run_task(cargar_categorias) # Refrescar lista
 
     # --- NUEVA LÓGICA DE MANEJO DE ARCHIVOS (HÍBRIDA) ---
     async def process_selected_file(file: ft.FilePickerFile):
@@ -213,7 +219,7 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
                 upload_status.value = "Subiendo al servidor..."
                 page.update()
                 
-                filename = subir_imagen(file.name, content, page=page)
+                filename = await subir_imagen_async(file.name, content, page=page)
                 
                 if filename:
                     imagen_path_guardado.value = filename
@@ -250,12 +256,12 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
 
     btn_subir_imagen.on_click = on_pick_files
 
-    def agregar_click(e):
+    async def agregar_click(e):
         data = validar_datos()
         if data:
-            if agregar_platillo(*data, page=page):
+            if await agregar_platillo_async(*data, page=page):
                 limpiar_campos()
-                cargar_lista()
+                await cargar_lista()
                 show_notification(page, "Platillo agregado correctamente", ft.Colors.GREEN)
             else:
                 show_notification(page, "Error al agregar platillo (Verificar Backend)", ft.Colors.RED)
@@ -264,12 +270,12 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
              show_notification(page, "Por favor revise los campos (Precio, Piezas)", ft.Colors.RED)
              page.update()
 
-    def guardar_cambios_click(e):
+    async def guardar_cambios_click(e):
         data = validar_datos()
         if data and edit_mode_id.value:
-            actualizar_platillo(int(edit_mode_id.value), *data, page=page)
+            await actualizar_platillo_async(int(edit_mode_id.value), *data, page=page)
             limpiar_campos()
-            cargar_lista()
+            await cargar_lista()
             show_notification(page, "Actualizado", ft.Colors.GREEN)
             page.update()
 
@@ -277,9 +283,12 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
     btn_cancelar = ft.FilledButton("Cancelar", icon=ft.Icons.CANCEL, on_click=lambda _: limpiar_campos(), style=ft.ButtonStyle(bgcolor=ft.Colors.RED, color=ft.Colors.WHITE))
 
     # --- LISTA DE PLATILLOS ---
-    def cargar_lista(search_term=""):
+    async def eliminar_y_recargar(platillo_id):
+        await eliminar_platillo_async(platillo_id, page=page)
+        await cargar_lista()
+
+    def mostrar_lista(platillos):
         lista.controls.clear()
-        platillos = obtener_menu(solo_activos=False, search_term=search_term, page=page)
         for p in platillos:
             pid = p['id']
             nom = p['nombre']
@@ -301,7 +310,7 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
             config_labels = f"({', '.join(extras)})" if extras else ""
 
             # Imagen del item
-            item_img_src = f"{IMAGES_URL}/{img}" if img else "/icon.png"
+            item_img_src = url_imagen(img, "thumb") if img else "/icon.png"
 
             item_row = ft.Container(
                 padding=10,
@@ -324,8 +333,8 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
                         ft.Text(f"${pre:.2f}", weight="bold", size=15, color=ft.Colors.BROWN_700),
                         ft.Row([
                             ft.IconButton(ft.Icons.EDIT, icon_color=ft.Colors.BROWN_700, icon_size=20, tooltip="Editar", on_click=lambda e, pl=p: llenar_campos(pl)),
-                            ft.IconButton(ft.Icons.DELETE, icon_color=ft.Colors.RED, icon_size=20, tooltip="Eliminar", on_click=lambda e, id=pid: [eliminar_platillo(id, page=page), cargar_lista()]),
-                            ft.Switch(value=bool(active), scale=0.8, active_color=ft.Colors.GREEN, on_change=lambda e, id=pid: [actualizar_visibilidad_platillo(id, 1 if e.control.value else 0, page=page)]),
+                            ft.IconButton(ft.Icons.DELETE, icon_color=ft.Colors.RED, icon_size=20, tooltip="Eliminar", on_click=lambda e, id=pid: page.run_task(eliminar_y_recargar, id)),
+                            ft.Switch(value=bool(active), scale=0.8, active_color=ft.Colors.GREEN, on_change=lambda e, id=pid: page.run_task(actualizar_visibilidad_platillo_async, id, 1 if e.control.value else 0, page=page)),
                         ], spacing=10, alignment=ft.MainAxisAlignment.START)
                     ], expand=True, spacing=2)
                 ], vertical_alignment=ft.CrossAxisAlignment.START)
@@ -333,6 +342,28 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
             lista.controls.append(item_row)
         page.update()
 
+    ultima_carga = 0
+    ultima_busqueda = 0
+
+    async def cargar_lista(search_term=""):
+        nonlocal ultima_carga
+        # Solo se muestra la respuesta de la última carga: una más lenta no pisa a la más reciente
+        ultima_carga += 1
+        carga = ultima_carga
+        platillos = await obtener_menu_async(solo_activos=False, search_term=search_term, page=page)
+        if carga == ultima_carga:
+            mostrar_lista(platillos)
+
+    async def handle_search_change(e):
+        nonlocal ultima_busqueda
+        # Debounce: solo busca la última tecla si no llegó otra dentro de la ventana
+        ultima_busqueda += 1
+        busqueda = ultima_busqueda
+        await asyncio.sleep(BUSQUEDA_DEBOUNCE)
+        if busqueda != ultima_busqueda:
+            return
+        await cargar_lista(search_bar.value)
+
     def validar_datos():
         if not nombre_field.value:
             nombre_field.error_text = "Requerido"
@@ -370,7 +401,7 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
         border_radius=20, height=40,
         text_size=14, content_padding=10, filled=True,
         text_style=ft.TextStyle(color=ft.Colors.BLACK),
-        on_change=lambda e: cargar_lista(e.control.value)
+        on_change=handle_search_change
     )
 
     global_confirm_dialog = ft.AlertDialog(title=ft.Text("Confirmación"))
@@ -379,13 +410,13 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
     def confirmar_accion_global(es_mostrar):
         accion_texto = "MOSTRAR" if es_mostrar else "OCULTAR"
         
-        def ejecutar_accion(e):
+        async def ejecutar_accion(e):
             if es_mostrar:
-                mostrar_todos_los_platillos(page=page)
+                await mostrar_todos_los_platillos_async(page=page)
             else:
-                ocultar_todos_los_platillos(page=page)
+                await ocultar_todos_los_platillos_async(page=page)
             
-            cargar_lista()
+            await cargar_lista()
             global_confirm_dialog.open = False
             show_notification(page, f"Acción '{accion_texto}' completada.", ft.Colors.GREEN)
             page.update()
@@ -398,9 +429,18 @@ def menu_admin_view(page: ft.Page, file_picker: ft.FilePicker):
         global_confirm_dialog.open = True
         page.update()
 
-    cargar_lista()
-    cargar_checkboxes_grupos()
-    cargar_categorias() 
+    async def cargar_datos_iniciales():
+        # Menú, grupos de opciones y configuración son independientes: se piden a la vez
+        platillos, grupos, config = await asyncio.gather(
+            obtener_menu_async(solo_activos=False, page=page),
+            get_grupos_opciones_async(page=page),
+            get_configuracion_async(page=page)
+        )
+        mostrar_checkboxes_grupos(grupos)
+        mostrar_categorias(config)
+        mostrar_lista(platillos)
+
+    page.run_task(cargar_datos_iniciales)
 
     content_container = ft.Container(
         padding=20,